@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, AppointmentNotification, AppointmentReminder
 
 # Register your models here.
-admin.site.register(Appointment)
\ No newline at end of file
+admin.site.register(Appointment)
+admin.site.register(AppointmentNotification)
+admin.site.register(AppointmentReminder)
@@ -0,0 +1,71 @@
+"""Slot reservation for booking and moving appointments.
+
+Bookings of one doctor and date are serialized on their ``BookingDay`` row,
+so checking the slot and inserting the appointment cannot interleave with
+another booking. The partial unique constraint on active appointments backs
+this up for writes that do not go through ``reserved_slot``.
+"""
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Appointment, BookingDay
+
+
+class SlotConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        "An appointment is already scheduled for this doctor at the specified "
+        "start time."
+    )
+    default_code = "slot_conflict"
+
+
+def active_appointments():
+    return Appointment.objects.exclude(status__in=Appointment.INACTIVE_STATUSES)
+
+
+def lock_doctor_day(doctor, date):
+    """Hold the booking lock of ``doctor`` on ``date`` until the transaction
+    ends."""
+    if connection.features.has_select_for_update:
+        day, _ = BookingDay.objects.get_or_create(doctor=doctor, date=date)
+        BookingDay.objects.select_for_update().get(pk=day.pk)
+        return
+
+    # SQLite has no row locks, but a transaction starting with a write holds
+    # the database write lock, which other bookings then wait for
+    now = timezone.now()
+    if not BookingDay.objects.filter(doctor=doctor, date=date).update(locked_at=now):
+        BookingDay.objects.create(doctor=doctor, date=date, locked_at=now)
+
+
+@contextmanager
+def reserved_slot(doctor, date, start_time, appointment=None):
+    """Run the block, which saves an active appointment in the slot, with the
+    slot reserved.
+
+    Raises ``SlotConflict`` when another active appointment of the doctor
+    starts at the same date and time; ``appointment`` is the one being moved,
+    if any.
+    """
+    with transaction.atomic():
+        lock_doctor_day(doctor, date)
+        conflicts = active_appointments().filter(
+            doctor=doctor, date=date, start_time=start_time
+        )
+        if appointment is not None:
+            conflicts = conflicts.exclude(pk=appointment.pk)
+        if conflicts.exists():
+            raise SlotConflict()
+
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError:
+            if conflicts.exists():
+                raise SlotConflict()
+            raise
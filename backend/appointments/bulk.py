@@ -0,0 +1,158 @@
+"""Status changes of many appointments in one transaction.
+
+The appointments are read in one query, changed in memory and written back
+with one ``bulk_update``. The status emails then go out from one batched
+worker through the notification outbox. ``bulk_update`` sends no model
+signals, so this module also records the notifications and enqueues the
+refresh of the doctors' next available slots.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from doctors.slots import parse_duration
+from doctors.tasks import enqueue_next_available_slot_refresh
+from .booking import active_appointments, lock_doctor_day
+from .models import Appointment
+from .notifications import record_status_changes
+from .tasks import enqueue_notification_dispatch
+
+Status = Appointment.Status
+
+# The statuses each bulk operation may move an appointment from
+TRANSITIONS = {
+    Status.CONFIRMED: (Status.PENDING, Status.RESCHEDULED),
+    Status.REJECTED: (Status.PENDING, Status.RESCHEDULED),
+    Status.CANCELLED: (Status.PENDING, Status.CONFIRMED, Status.RESCHEDULED),
+    Status.RESCHEDULED: (Status.PENDING, Status.CONFIRMED, Status.RESCHEDULED),
+}
+
+MAX_BULK_APPOINTMENTS = 500
+
+
+def end_time(doctor, date, start_time):
+    start = datetime.combine(date, start_time)
+    return (start + timedelta(minutes=parse_duration(doctor.time_duration))).time()
+
+
+def taken_slots(appointments):
+    """Active slots of other appointments among the new slots of
+    ``appointments``, as ``(doctor_id, date, start_time)``, in one query."""
+    slots = {(a.doctor_id, a.date, a.start_time) for a in appointments}
+    if not slots:
+        return set()
+    taken = (
+        active_appointments()
+        .filter(
+            doctor_id__in={doctor_id for doctor_id, _, _ in slots},
+            date__in={date for _, date, _ in slots},
+            start_time__in={start_time for _, _, start_time in slots},
+        )
+        .exclude(pk__in=[appointment.pk for appointment in appointments])
+        .values_list("doctor_id", "date", "start_time")
+    )
+    return set(taken) & slots
+
+
+@transaction.atomic
+def bulk_change_status(queryset, ids, status, reschedules=None, reason=None):
+    """Move the appointments of ``queryset`` with the given ids to ``status``.
+
+    ``reschedules`` maps the ids to their new ``(date, start_time)`` when
+    rescheduling. Appointments whose current status does not allow the
+    change (``invalid_transition``), or whose new slot is taken
+    (``slot_conflict``), are skipped. Returns the updated ids, the skipped
+    ones with the reason and the ids not found.
+    """
+    appointments = list(
+        queryset.filter(pk__in=ids)
+        .select_related("doctor")
+        .select_for_update(of=("self",))
+        .order_by("pk")
+    )
+    found = {appointment.pk for appointment in appointments}
+    result = {
+        "updated": [],
+        "skipped": [],
+        "not_found": [pk for pk in dict.fromkeys(ids) if pk not in found],
+    }
+
+    changed = []
+    for appointment in appointments:
+        if appointment.status in TRANSITIONS[status]:
+            changed.append(appointment)
+        else:
+            result["skipped"].append(
+                {
+                    "id": appointment.pk,
+                    "error": "invalid_transition",
+                    "status": appointment.status,
+                }
+            )
+
+    now = timezone.now()
+    fields = ["status", "updated_at"]
+    if status == Status.CONFIRMED:
+        fields.append("confirmed_at")
+    if reschedules is not None:
+        fields += ["date", "start_time", "end_time", "duration"]
+        fields += ["is_rescheduled", "reschedule_reason"]
+        days = {
+            (appointment.doctor_id, reschedules[appointment.pk][0]): appointment.doctor
+            for appointment in changed
+        }
+        # In a fixed order, so two batches cannot wait for each other
+        for doctor_id, date in sorted(days):
+            lock_doctor_day(days[doctor_id, date], date)
+        current_slots = {
+            (appointment.doctor_id, appointment.date, appointment.start_time): (
+                appointment.pk
+            )
+            for appointment in changed
+        }
+        for appointment in changed:
+            appointment.date, appointment.start_time = reschedules[appointment.pk]
+            appointment.end_time = end_time(
+                appointment.doctor, appointment.date, appointment.start_time
+            )
+            appointment.duration = timedelta(
+                minutes=parse_duration(appointment.doctor.time_duration)
+            )
+            appointment.is_rescheduled = True
+            appointment.reschedule_reason = reason
+
+        # Slots left by other appointments of the batch are not reused, the
+        # appointment leaving one may itself end up skipped
+        taken = taken_slots(changed)
+        claimed = set()
+        kept = []
+        for appointment in changed:
+            slot = (appointment.doctor_id, appointment.date, appointment.start_time)
+            if (
+                slot in taken
+                or slot in claimed
+                or current_slots.get(slot, appointment.pk) != appointment.pk
+            ):
+                result["skipped"].append(
+                    {"id": appointment.pk, "error": "slot_conflict"}
+                )
+            else:
+                claimed.add(slot)
+                kept.append(appointment)
+        changed = kept
+
+    for appointment in changed:
+        appointment.status = status
+        appointment.updated_at = now
+        if status == Status.CONFIRMED:
+            appointment.confirmed_at = now
+    Appointment.objects.bulk_update(changed, fields)
+
+    result["updated"] = [appointment.pk for appointment in changed]
+    if changed:
+        if record_status_changes(changed):
+            enqueue_notification_dispatch()
+        for doctor_id in {appointment.doctor_id for appointment in changed}:
+            enqueue_next_available_slot_refresh(doctor_id)
+    return result
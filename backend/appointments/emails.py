@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+STATUS_EMAILS = {
+    "confirmed": {
+        "email_subject": "Appointment Confirmed",
+        "email_template": "appointments/emails/appointment_confirmation_email.html",
+    },
+    "cancelled": {
+        "email_subject": "Appointment Cancelled",
+        "email_template": "appointments/emails/appointment_cancellation_email.html",
+    },
+    "rescheduled": {
+        "email_subject": "Appointment Rescheduled",
+        "email_template": "appointments/emails/appointment_rescheduled_email.html",
+    },
+    "rejected": {
+        "email_subject": "Appointment Rejected",
+        "email_template": "appointments/emails/appointment_rejected_email.html",
+    },
+}
+
+
+def render_status_email(appointment, address):
+    """(subject, body) of the email telling the patient about the current
+    status of ``appointment``, None for statuses without one."""
+    template_data = STATUS_EMAILS.get(appointment.status)
+    if template_data is None:
+        return None
+    body = render_to_string(
+        template_data["email_template"],
+        {"appointment": appointment, "address": address},
+    )
+    return template_data["email_subject"], body
+
+
+def status_email_message(appointment):
+    """EmailMessage for ``appointment`` with its doctor's address and patient's
+    user loaded, None if there is nothing to send."""
+    recipient = appointment.patient and appointment.patient.user.email
+    rendered = render_status_email(appointment, appointment.doctor.address)
+    if not recipient or rendered is None:
+        return None
+    subject, body = rendered
+    return EmailMessage(subject, body, settings.EMAIL_DEFAULT_FROM, [recipient])
+
+
+def reminder_email_message(appointment):
+    """EmailMessage reminding the patient of ``appointment``, loaded as for
+    ``status_email_message``, None without a recipient."""
+    recipient = appointment.patient and appointment.patient.user.email
+    if not recipient:
+        return None
+    body = render_to_string(
+        "appointments/emails/appointment_reminder_email.html",
+        {"appointment": appointment, "address": appointment.doctor.address},
+    )
+    return EmailMessage(
+        "Appointment Reminder", body, settings.EMAIL_DEFAULT_FROM, [recipient]
+    )
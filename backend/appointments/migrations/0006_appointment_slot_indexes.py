@@ -0,0 +1,65 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_active_appointments(apps, schema_editor):
+    """Stop before the constraint below when a slot already has several active
+    appointments, which have to be resolved by hand: they are real bookings."""
+    Appointment = apps.get_model("appointments", "Appointment")
+    active = Appointment.objects.filter(deleted_at__isnull=True).exclude(
+        status__in=["rejected", "cancelled"]
+    )
+    duplicated_slots = (
+        active.values("doctor_id", "date", "start_time")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    conflicts = []
+    for slot in duplicated_slots:
+        ids = active.filter(
+            doctor_id=slot["doctor_id"],
+            date=slot["date"],
+            start_time=slot["start_time"],
+        ).values_list("id", flat=True)
+        conflicts.append(
+            f"doctor {slot['doctor_id']} on {slot['date']} at {slot['start_time']}: "
+            f"appointments {sorted(ids)}"
+        )
+    if conflicts:
+        raise RuntimeError(
+            "Cannot add unique_active_appointment_slot, these slots have more "
+            "than one active appointment. Cancel, reject or reschedule all but "
+            "one of each and migrate again.\n" + "\n".join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("appointments", "0005_alter_appointment_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "date", "start_time"],
+                name="appointment_doctor_slot_idx",
+            ),
+        ),
+        migrations.RunPython(
+            check_duplicate_active_appointments, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("deleted_at__isnull", True),
+                    models.Q(("status__in", ["rejected", "cancelled"]), _negated=True),
+                ),
+                fields=("doctor", "date", "start_time"),
+                name="unique_active_appointment_slot",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doctors", "0005_doctor_lookup_indexes"),
+        ("appointments", "0006_appointment_slot_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_days",
+                        to="doctors.doctor",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("doctor", "date")},
+            },
+        ),
+    ]
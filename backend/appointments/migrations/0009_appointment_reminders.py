@@ -0,0 +1,57 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("appointments", "0008_appointmentnotification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppointmentReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("lead", models.PositiveIntegerField()),
+                (
+                    "channel",
+                    models.CharField(
+                        choices=[("sms", "Sms"), ("email", "Email")], max_length=10
+                    ),
+                ),
+                ("sent_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["date", "start_time", "status"], name="appointment_schedule_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="appointmentreminder",
+            name="appointment",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reminders",
+                to="appointments.appointment",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="appointmentreminder",
+            constraint=models.UniqueConstraint(
+                fields=("appointment", "lead", "channel"),
+                name="unique_appointment_reminder",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("appointments", "0009_appointment_reminders"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentnotification",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
 
@@ -52,8 +52,42 @@ class Appointment(BaseModel):
 
     is_paid = models.BooleanField(default=False)
 
+    # Rejected and cancelled appointments free their slot
+    INACTIVE_STATUSES = (Status.REJECTED, Status.CANCELLED)
+
     class Meta:
         ordering = ["-requested_at"]
+        indexes = [
+            models.Index(
+                fields=["doctor", "date", "start_time"],
+                name="appointment_doctor_slot_idx",
+            ),
+            # Range scans of upcoming appointments, e.g. for reminders
+            models.Index(
+                fields=["date", "start_time", "status"],
+                name="appointment_schedule_idx",
+            ),
+        ]
+        constraints = [
+            # One active appointment per doctor and slot (INACTIVE_STATUSES)
+            models.UniqueConstraint(
+                fields=["doctor", "date", "start_time"],
+                condition=models.Q(deleted_at__isnull=True)
+                & ~models.Q(status__in=["rejected", "cancelled"]),
+                name="unique_active_appointment_slot",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "status" not in instance.get_deferred_fields():
+            instance._loaded_status = instance.status
+        return instance
+
+    def status_changed(self):
+        """Whether the status differs from the one last loaded or saved."""
+        return getattr(self, "_loaded_status", None) != self.status
 
     def save(self, *args, **kwargs):
         if self.start_time and self.end_time:
@@ -63,7 +97,78 @@ class Appointment(BaseModel):
             # Calculate duration
             duration_timedelta = end_datetime - start_datetime
             self.duration = duration_timedelta
-        super().save(*args, **kwargs)
+        # The post_save outbox row is written in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
     def __str__(self):
         return f"{self.id} - {self.date} - {self.start_time} - {self.end_time} - {self.status} - {self.doctor}"
+
+
+class AppointmentNotification(models.Model):
+    """Outbox row of a status change still to be notified to the patient."""
+
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name="notifications"
+    )
+    status = models.CharField(max_length=20, choices=Appointment.Status.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the worker sending it, which may be retried after a lease
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="appointment_notification_idx",
+                condition=models.Q(sent_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.appointment_id} - {self.status} - {self.sent_at}"
+
+
+class AppointmentReminder(models.Model):
+    """Marker of a reminder sent, or being sent, for an appointment."""
+
+    class Channel(models.TextChoices):
+        SMS = "sms"
+        EMAIL = "email"
+
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name="reminders"
+    )
+    # Minutes before the start of the appointment
+    lead = models.PositiveIntegerField()
+    channel = models.CharField(max_length=10, choices=Channel.choices)
+    sent_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["appointment", "lead", "channel"],
+                name="unique_appointment_reminder",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.appointment_id} - {self.lead} - {self.channel} - {self.sent_at}"
+
+
+class BookingDay(models.Model):
+    """Lock row of one doctor and date, held while a slot of it is booked."""
+
+    doctor = models.ForeignKey(
+        Doctor, on_delete=models.CASCADE, related_name="booking_days"
+    )
+    date = models.DateField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("doctor", "date")
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date}"
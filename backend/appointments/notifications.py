@@ -0,0 +1,99 @@
+"""Outbox of the appointment status emails.
+
+Saving a status change records an ``AppointmentNotification`` row in the
+same transaction; the emails are rendered and sent later by a worker, in
+batches through ``core.mail``. The worker claims every pending row of an
+appointment at once and emails its current status, so rapid flips of one
+appointment end up as a single email.
+
+A claim is a lease: rows are only marked sent once their email went out.
+Rows whose email failed are released for the next run, and the rows of a
+worker that died mid-send are claimed again once ``NOTIFICATION_LEASE``
+expired, by the periodic sweep.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.mail import send_messages
+from .emails import STATUS_EMAILS, status_email_message
+from .models import Appointment, AppointmentNotification
+
+NOTIFICATION_BATCH_SIZE = 100
+# Longer than sending a batch takes
+NOTIFICATION_LEASE = timedelta(minutes=10)
+
+
+def record_status_changes(appointments):
+    """Outbox rows for the appointments whose status has an email."""
+    return AppointmentNotification.objects.bulk_create(
+        AppointmentNotification(appointment=appointment, status=appointment.status)
+        for appointment in appointments
+        if appointment.status in STATUS_EMAILS
+    )
+
+
+def claim_notifications(batch_size=NOTIFICATION_BATCH_SIZE, exclude=()):
+    """Lease up to ``batch_size`` unsent, unclaimed or expired notification
+    rows, and the other claimable rows of their appointments, for appointments
+    other than ``exclude``. Returns ``(appointment ids, claim time)``."""
+    with transaction.atomic():
+        claimed_at = timezone.now()
+        pending = (
+            AppointmentNotification.objects.filter(sent_at__isnull=True)
+            .filter(
+                Q(claimed_at__isnull=True)
+                | Q(claimed_at__lt=claimed_at - NOTIFICATION_LEASE)
+            )
+            .exclude(appointment_id__in=exclude)
+        )
+        appointment_ids = set(
+            pending.select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("appointment_id", flat=True)[:batch_size]
+        )
+        if appointment_ids:
+            pending.filter(appointment_id__in=appointment_ids).update(
+                claimed_at=claimed_at
+            )
+    return appointment_ids, claimed_at
+
+
+def send_status_emails(appointment_ids):
+    """Email the appointments' current status, returns the number of emails
+    sent and the ids of the appointments whose email failed."""
+    appointments = Appointment.objects.filter(pk__in=appointment_ids).select_related(
+        "doctor__address", "patient__user"
+    )
+    messages = {}
+    for appointment in appointments:
+        message = status_email_message(appointment)
+        if message is not None:
+            messages[appointment.pk] = message
+    failed = {id(message) for message in send_messages(list(messages.values()))}
+    failed_ids = [pk for pk, message in messages.items() if id(message) in failed]
+    return len(messages) - len(failed_ids), failed_ids
+
+
+def dispatch_notifications(batch_size=NOTIFICATION_BATCH_SIZE):
+    """Send the pending notifications, returns the number of emails sent."""
+    sent = 0
+    attempted = set()
+    while True:
+        appointment_ids, claimed_at = claim_notifications(batch_size, attempted)
+        if not appointment_ids:
+            return sent
+        attempted |= appointment_ids
+        claimed = AppointmentNotification.objects.filter(claimed_at=claimed_at)
+        failed_ids = appointment_ids
+        try:
+            batch_sent, failed_ids = send_status_emails(appointment_ids)
+            sent += batch_sent
+            claimed.filter(appointment_id__in=appointment_ids).exclude(
+                appointment_id__in=failed_ids
+            ).update(sent_at=timezone.now())
+        finally:
+            # Leave them for the next run
+            claimed.filter(appointment_id__in=failed_ids).update(claimed_at=None)
@@ -0,0 +1,13 @@
+from rest_framework import permissions
+
+
+class BulkAppointmentPermission(permissions.BasePermission):
+    """Bulk status changes are for staff and for doctors, on their own
+    appointments (see ``AppointmentViewSet.bulk_queryset``)."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user.is_authenticated
+            and (user.is_staff or user.is_superuser or hasattr(user, "doctor"))
+        )
@@ -0,0 +1,160 @@
+"""Reminders of upcoming confirmed appointments.
+
+A periodic worker sends a reminder ``lead`` minutes before each appointment,
+for every lead of ``APPOINTMENT_REMINDER_LEADS``, by SMS and by email. Each
+run only reads the appointments starting in the last
+``APPOINTMENT_REMINDER_CATCHUP`` minutes of a lead, walking the schedule
+index in chunks, so the cost follows the appointments due rather than the
+size of the table.
+
+An ``AppointmentReminder`` row is written per appointment, lead and channel
+before sending, in the transaction that locks the appointments, so reruns
+and concurrent workers do not send a reminder twice. Rows whose reminder
+failed are deleted and retried by the next run.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import dateformat, timezone
+
+from core.mail import send_messages
+from core.sms import send_bulk_sms
+from .emails import reminder_email_message
+from .models import Appointment, AppointmentReminder
+
+REMINDER_CHUNK_SIZE = 500
+
+
+def starts_between(start, end):
+    """Appointments starting after ``start`` and up to ``end``, both local
+    naive datetimes."""
+    if start.date() == end.date():
+        return Q(
+            date=start.date(), start_time__gt=start.time(), start_time__lte=end.time()
+        )
+    return (
+        Q(date=start.date(), start_time__gt=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), start_time__lte=end.time())
+    )
+
+
+def due_appointment_ids(start, end, chunk_size=REMINDER_CHUNK_SIZE):
+    """Yield the ids of the confirmed appointments starting after ``start``
+    and up to ``end`` in chunks, in order of start."""
+    confirmed = Appointment.objects.filter(status=Appointment.Status.CONFIRMED)
+    window = starts_between(start, end)
+    while True:
+        chunk = list(
+            confirmed.filter(window)
+            .order_by("date", "start_time", "id")
+            .values_list("id", "date", "start_time")[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield [pk for pk, _, _ in chunk]
+        # Continue after the last row: later ids at its start, then later starts
+        last_pk, last_date, last_time = chunk[-1]
+        last_start = datetime.combine(last_date, last_time)
+        window = Q(
+            date=last_date, start_time=last_time, id__gt=last_pk
+        ) | starts_between(last_start, end)
+
+
+def reminder_channels(appointment):
+    patient = appointment.patient
+    if patient is None:
+        return []
+    channels = []
+    if patient.phone:
+        channels.append(AppointmentReminder.Channel.SMS)
+    if patient.user.email:
+        channels.append(AppointmentReminder.Channel.EMAIL)
+    return channels
+
+
+def claim_reminders(appointment_ids, lead):
+    """Write the ``lead`` reminders not sent yet of the appointments that are
+    still confirmed and not locked by another worker, returns them."""
+    with transaction.atomic():
+        appointments = (
+            Appointment.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(pk__in=appointment_ids, status=Appointment.Status.CONFIRMED)
+            .select_related("doctor__address", "patient__user")
+        )
+        sent = set(
+            AppointmentReminder.objects.filter(
+                appointment_id__in=appointment_ids, lead=lead
+            ).values_list("appointment_id", "channel")
+        )
+        claimed_at = timezone.now()
+        reminders = [
+            AppointmentReminder(
+                appointment=appointment,
+                lead=lead,
+                channel=channel,
+                sent_at=claimed_at,
+            )
+            for appointment in appointments
+            for channel in reminder_channels(appointment)
+            if (appointment.pk, channel) not in sent
+        ]
+        return AppointmentReminder.objects.bulk_create(reminders)
+
+
+def reminder_sms_text(appointment):
+    return (
+        f"Reminder: your appointment with {appointment.doctor.full_name} is on "
+        f"{dateformat.format(appointment.date, 'd M, Y')} at "
+        f"{dateformat.time_format(appointment.start_time, 'g:i A')}."
+    )
+
+
+def send_reminders(reminders):
+    """Send ``reminders`` in one SMS and one email batch, returns the ones
+    that failed."""
+    sms = [r for r in reminders if r.channel == AppointmentReminder.Channel.SMS]
+    sms_messages = [
+        (reminder.appointment.patient.phone, reminder_sms_text(reminder.appointment))
+        for reminder in sms
+    ]
+    accepted = send_bulk_sms(sms_messages) if sms_messages else []
+    failed = [reminder for reminder, ok in zip(sms, accepted) if not ok]
+
+    emails = [r for r in reminders if r.channel == AppointmentReminder.Channel.EMAIL]
+    messages = [reminder_email_message(r.appointment) for r in emails]
+    failed_messages = {
+        id(message) for message in (send_messages(messages) if messages else [])
+    }
+    failed += [
+        reminder
+        for reminder, message in zip(emails, messages)
+        if id(message) in failed_messages
+    ]
+    return failed
+
+
+def send_due_reminders(now=None, chunk_size=REMINDER_CHUNK_SIZE):
+    """Send the reminders due at ``now``, returns the number sent."""
+    now = timezone.localtime(now).replace(tzinfo=None)
+    catchup = timedelta(minutes=settings.APPOINTMENT_REMINDER_CATCHUP)
+    sent = 0
+    for lead in settings.APPOINTMENT_REMINDER_LEADS:
+        end = now + timedelta(minutes=lead)
+        start = max(now, end - catchup)
+        for appointment_ids in due_appointment_ids(start, end, chunk_size):
+            reminders = claim_reminders(appointment_ids, lead)
+            if not reminders:
+                continue
+            failed = reminders
+            try:
+                failed = send_reminders(reminders)
+                sent += len(reminders) - len(failed)
+            finally:
+                # Leave them for the next run
+                AppointmentReminder.objects.filter(
+                    pk__in=[reminder.pk for reminder in failed]
+                ).delete()
+    return sent
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from users.serializers import User, UserSerializer
 from doctors.serializers import DoctorSerializer
 from patients.serializers import PatientSerializer
+from .booking import reserved_slot
+from .bulk import MAX_BULK_APPOINTMENTS
 from .models import Appointment
 from doctors.models import Doctor
 from establishments.serializers import EstablishmentSerializer 
@@ -43,16 +45,6 @@ class AppointmentSerializer(FlexFieldsModelSerializer):
 
         doctor_data = None
 
-        if doctor and start_time:
-            conflicting_appointments = Appointment.objects.filter(
-                doctor=doctor,date=date, start_time=start_time
-            )
-
-            if conflicting_appointments.exists():
-                raise serializers.ValidationError(
-                    "An appointment is already scheduled for this doctor at the specified start time."
-                )
-        
         if doctor:
             if isinstance(doctor, Doctor) and hasattr(doctor, "id"):
                 doctor_id = doctor.id
@@ -77,6 +69,13 @@ class AppointmentSerializer(FlexFieldsModelSerializer):
                 validated_data["status"] = "confirmed"
                 validated_data["confirmed_at"] = datetime.now()
 
+        if (
+            doctor
+            and start_time
+            and validated_data.get("status") not in Appointment.INACTIVE_STATUSES
+        ):
+            with reserved_slot(doctor, date, start_time):
+                return Appointment.objects.create(**validated_data)
         return Appointment.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
@@ -87,16 +86,6 @@ class AppointmentSerializer(FlexFieldsModelSerializer):
 
         doctor_data = None
 
-        if doctor and start_time:
-            conflicting_appointments = Appointment.objects.filter(
-                doctor=doctor,date=date, start_time=start_time
-            ).exclude(id=instance.id)
-
-            if conflicting_appointments.exists():
-                raise serializers.ValidationError(
-                    "An appointment is already scheduled for this doctor at the specified start time."
-                )
-        
         if doctor:
             if isinstance(doctor, Doctor) and hasattr(doctor, "id"):
                 doctor_id = doctor.id
@@ -123,9 +112,45 @@ class AppointmentSerializer(FlexFieldsModelSerializer):
                 validated_data["status"] = "confirmed"
                 validated_data["confirmed_at"] = datetime.now()
 
+        # Moving an appointment, or reactivating it, takes its slot again
+        slot_fields = ("doctor", "date", "start_time", "status")
+        if any(field in validated_data for field in slot_fields) and (
+            validated_data.get("status", instance.status)
+            not in Appointment.INACTIVE_STATUSES
+        ):
+            with reserved_slot(
+                validated_data.get("doctor", instance.doctor),
+                validated_data.get("date", instance.date),
+                validated_data.get("start_time", instance.start_time),
+                appointment=instance,
+            ):
+                return super().update(instance, validated_data)
         return super().update(instance, validated_data)
 
 
+class AppointmentBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_BULK_APPOINTMENTS,
+    )
+
+
+class AppointmentRescheduleSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    date = serializers.DateField()
+    start_time = serializers.TimeField()
+
+
+class AppointmentBulkRescheduleSerializer(serializers.Serializer):
+    appointments = AppointmentRescheduleSerializer(
+        many=True, min_length=1, max_length=MAX_BULK_APPOINTMENTS
+    )
+    reschedule_reason = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True
+    )
+
+
 # class AppointmentSerializer(FlexFieldsModelSerializer):
 #     class Meta:
 #         model = Appointment
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import transaction
+from huey import crontab
+from huey.contrib.djhuey import db_periodic_task, db_task
+
+from core.queues import DEFAULT_LANE, SLOW_LANE
+from .notifications import dispatch_notifications
+from .reminders import send_due_reminders
+
+
+@db_task(priority=DEFAULT_LANE)
+def dispatch_appointment_notifications_task():
+    return dispatch_notifications()
+
+
+@db_periodic_task(crontab(minute="*/5"), priority=SLOW_LANE)
+def sweep_appointment_notifications_task():
+    # Picks up what a lost dispatch task left behind
+    return dispatch_notifications()
+
+
+@db_periodic_task(crontab(minute="*/10"), priority=SLOW_LANE)
+def send_appointment_reminders_task():
+    return send_due_reminders()
+
+
+def enqueue_notification_dispatch():
+    # Delayed, so that quick successive changes are sent as one email
+    transaction.on_commit(
+        lambda: dispatch_appointment_notifications_task.schedule(
+            delay=settings.APPOINTMENT_NOTIFICATION_DELAY
+        )
+    )
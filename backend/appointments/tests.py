@@ -0,0 +1,499 @@
+import threading
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.core import mail
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from doctors.models import Doctor
+from doctors.slots import SlotCalendar
+from patients.models import Patient
+from users.models import User
+from .models import Appointment, AppointmentNotification, AppointmentReminder
+from .notifications import (
+    NOTIFICATION_LEASE,
+    claim_notifications,
+    dispatch_notifications,
+)
+from .reminders import send_due_reminders
+
+
+def create_doctor(phone="9000000001"):
+    user = User.objects.create(phone=phone, is_active=True)
+    return Doctor.objects.create(
+        full_name="Dr. Booking", user=user, phone=user.phone, gender="M"
+    )
+
+
+def create_patients(count, first_phone=8000000000):
+    patients = []
+    for index in range(count):
+        user = User.objects.create(phone=str(first_phone + index), is_active=True)
+        patients.append(
+            Patient.objects.create(
+                full_name=f"Booking Patient {index}",
+                user=user,
+                phone=user.phone,
+                gender="M",
+                age=30,
+            )
+        )
+    return patients
+
+
+class BookingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patients = create_patients(2)
+        cls.slot = {
+            "doctor": cls.doctor.pk,
+            "date": (date.today() + timedelta(days=1)).isoformat(),
+            "start_time": "09:00",
+        }
+
+    def book(self, patient, **data):
+        client = APIClient()
+        client.force_authenticate(patient.user)
+        return client.post("/api/appointments/", {**self.slot, **data})
+
+    def test_taken_slot_is_a_conflict(self):
+        self.assertEqual(self.book(self.patients[0]).status_code, 201)
+
+        response = self.book(self.patients[1])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["detail"].code, "slot_conflict")
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        response = self.book(self.patients[0])
+        Appointment.objects.filter(pk=response.data["id"]).update(
+            status=Appointment.Status.CANCELLED
+        )
+
+        self.assertEqual(self.book(self.patients[1]).status_code, 201)
+
+    def test_moving_into_a_taken_slot_is_a_conflict(self):
+        self.book(self.patients[0])
+        moved = self.book(self.patients[1], start_time="09:30")
+
+        client = APIClient()
+        client.force_authenticate(self.patients[1].user)
+        response = client.patch(
+            f"/api/appointments/{moved.data['id']}/",
+            {"doctor": self.doctor.pk, "start_time": "09:00"},
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_inactive_appointments_do_not_block_slots(self):
+        day = date.today() + timedelta(days=1)
+        for patient, status in zip(
+            self.patients, (Appointment.Status.CANCELLED, Appointment.Status.REJECTED)
+        ):
+            Appointment.objects.create(
+                doctor=self.doctor,
+                patient=patient,
+                date=day,
+                start_time=time(9, 0),
+                end_time=time(9, 10),
+                status=status,
+            )
+        self.assertEqual(SlotCalendar(self.doctor).booked_intervals(day, day), {})
+
+
+class BulkStatusTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patients = create_patients(30)
+        cls.patients[0].user.email = "patient@example.com"
+        cls.patients[0].user.save()
+        cls.day = date.today() + timedelta(days=2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor.user)
+
+    def create_appointments(self, count, **fields):
+        return [
+            Appointment.objects.create(
+                doctor=self.doctor,
+                patient=patient,
+                date=self.day,
+                start_time=time(9 + index // 6, index % 6 * 10),
+                **fields,
+            )
+            for index, patient in enumerate(self.patients[:count])
+        ]
+
+    def test_confirm_many(self):
+        pending = self.create_appointments(3)
+        cancelled = pending.pop()
+        Appointment.objects.filter(pk=cancelled.pk).update(
+            status=Appointment.Status.CANCELLED
+        )
+
+        response = self.client.post(
+            "/api/appointments/bulk-confirm/",
+            {"ids": [pending[0].pk, pending[1].pk, cancelled.pk, 999999]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], [pending[0].pk, pending[1].pk])
+        self.assertEqual(
+            response.data["skipped"],
+            [
+                {
+                    "id": cancelled.pk,
+                    "error": "invalid_transition",
+                    "status": "cancelled",
+                }
+            ],
+        )
+        self.assertEqual(response.data["not_found"], [999999])
+        for appointment in pending:
+            appointment.refresh_from_db()
+            self.assertEqual(appointment.status, Appointment.Status.CONFIRMED)
+            self.assertIsNotNone(appointment.confirmed_at)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def cancel(appointments):
+            self.client.force_authenticate(User.objects.get(pk=self.doctor.user_id))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/appointments/bulk-cancel/",
+                    {"ids": [appointment.pk for appointment in appointments]},
+                    format="json",
+                )
+            self.assertEqual(len(response.data["updated"]), len(appointments))
+            return len(queries)
+
+        appointments = self.create_appointments(30)
+        self.assertEqual(cancel(appointments[:2]), cancel(appointments[2:]))
+
+    def test_reschedule_skips_taken_slots(self):
+        first, second, third = self.create_appointments(3)
+        new_day = (self.day + timedelta(days=1)).isoformat()
+
+        response = self.client.post(
+            "/api/appointments/bulk-reschedule/",
+            {
+                "appointments": [
+                    {"id": first.pk, "date": new_day, "start_time": "11:00"},
+                    {"id": second.pk, "date": new_day, "start_time": "11:00"},
+                    {"id": third.pk, "date": self.day, "start_time": "09:00"},
+                ],
+                "reschedule_reason": "Doctor on leave",
+            },
+            format="json",
+        )
+
+        # The second takes the slot the first one takes, the third the slot
+        # the first one leaves in the same batch
+        self.assertEqual(response.data["updated"], [first.pk])
+        self.assertEqual(
+            response.data["skipped"],
+            [
+                {"id": second.pk, "error": "slot_conflict"},
+                {"id": third.pk, "error": "slot_conflict"},
+            ],
+        )
+        first.refresh_from_db()
+        self.assertEqual(
+            (first.status, first.start_time, first.end_time, first.is_rescheduled),
+            (Appointment.Status.RESCHEDULED, time(11, 0), time(11, 10), True),
+        )
+
+    def test_only_doctors_and_staff_change_in_bulk(self):
+        appointment = self.create_appointments(1)[0]
+
+        def cancel(user):
+            self.client.force_authenticate(user)
+            return self.client.post(
+                "/api/appointments/bulk-cancel/",
+                {"ids": [appointment.pk]},
+                format="json",
+            )
+
+        for user in (
+            self.patients[0].user,
+            User.objects.create(phone="9000000051", is_active=True),
+            User.objects.create(phone="9000000052", is_active=True, is_sale=True),
+        ):
+            with self.subTest(user=user.phone):
+                self.assertEqual(cancel(user).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertIn(
+            self.client.post(
+                "/api/appointments/bulk-confirm/", {"ids": [appointment.pk]}
+            ).status_code,
+            (401, 403),
+        )
+
+        # Other doctors do not see it
+        response = cancel(create_doctor("9000000053").user)
+        self.assertEqual(response.data["not_found"], [appointment.pk])
+
+        staff = User.objects.create(phone="9000000054", is_active=True, is_staff=True)
+        self.assertEqual(cancel(staff).data["updated"], [appointment.pk])
+
+    def test_status_emails_are_sent_in_one_batch(self):
+        appointments = self.create_appointments(3)
+        mail.outbox.clear()
+
+        self.client.post(
+            "/api/appointments/bulk-confirm/",
+            {"ids": [appointment.pk for appointment in appointments]},
+            format="json",
+        )
+        self.assertEqual(
+            AppointmentNotification.objects.filter(status="confirmed").count(), 3
+        )
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(dispatch_notifications(), 1)
+        self.assertEqual(mail.outbox[0].to, ["patient@example.com"])
+        self.assertEqual(mail.outbox[0].subject, "Appointment Confirmed")
+
+
+class NotificationOutboxTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patients(1)[0]
+        cls.patient.user.email = "patient@example.com"
+        cls.patient.user.save()
+
+    def setUp(self):
+        self.appointment = Appointment.objects.create(
+            doctor=self.doctor,
+            patient=self.patient,
+            date=date.today() + timedelta(days=1),
+            start_time=time(9, 0),
+        )
+        self.appointment.refresh_from_db()
+
+    def test_status_change_records_an_event(self):
+        self.appointment.status = Appointment.Status.CONFIRMED
+        # The update and the outbox row, without reading the old status
+        with self.assertNumQueries(4):
+            self.appointment.save()
+
+        self.assertEqual(
+            list(self.appointment.notifications.values_list("status", flat=True)),
+            ["confirmed"],
+        )
+
+    def test_saves_without_status_change_record_nothing(self):
+        self.appointment.reschedule_reason = "Traffic"
+        self.appointment.save()
+
+        self.assertFalse(self.appointment.notifications.exists())
+
+    def test_rapid_changes_are_sent_once(self):
+        for status in (Appointment.Status.CONFIRMED, Appointment.Status.CANCELLED):
+            self.appointment.status = status
+            self.appointment.save()
+        mail.outbox.clear()
+
+        self.assertEqual(dispatch_notifications(), 1)
+        self.assertEqual(mail.outbox[0].subject, "Appointment Cancelled")
+        self.assertFalse(
+            AppointmentNotification.objects.filter(sent_at__isnull=True).exists()
+        )
+        self.assertEqual(dispatch_notifications(), 0)
+
+    def test_failed_sends_are_retried(self):
+        self.appointment.status = Appointment.Status.CONFIRMED
+        self.appointment.save()
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=ConnectionError,
+        ), self.assertLogs("core.mail", "ERROR"):
+            self.assertEqual(dispatch_notifications(), 0)
+        mail.outbox.clear()
+
+        self.assertEqual(dispatch_notifications(), 1)
+        self.assertEqual(mail.outbox[0].subject, "Appointment Confirmed")
+
+    def test_claims_of_a_dead_worker_are_sent_after_their_lease(self):
+        self.appointment.status = Appointment.Status.CONFIRMED
+        self.appointment.save()
+        mail.outbox.clear()
+
+        # A worker claims the notification and dies before sending it
+        appointment_ids, claimed_at = claim_notifications()
+        self.assertEqual(appointment_ids, {self.appointment.pk})
+        self.assertFalse(
+            AppointmentNotification.objects.filter(sent_at__isnull=False).exists()
+        )
+        self.assertEqual(dispatch_notifications(), 0)
+
+        AppointmentNotification.objects.update(
+            claimed_at=claimed_at - NOTIFICATION_LEASE
+        )
+        self.assertEqual(dispatch_notifications(), 1)
+        self.assertEqual(mail.outbox[0].subject, "Appointment Confirmed")
+        self.assertFalse(
+            AppointmentNotification.objects.filter(sent_at__isnull=True).exists()
+        )
+
+
+class ReminderTests(APITestCase):
+    # 24 and 2 hour reminders, the due ones are sent until an hour late
+    NOW = timezone.make_aware(datetime(2030, 1, 1, 22, 0))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patients = create_patients(5)
+        for patient in cls.patients:
+            patient.user.email = f"{patient.phone}@example.com"
+            patient.user.save()
+
+        def appointment(patient, day, hour, minute=0, status="confirmed"):
+            return Appointment.objects.create(
+                doctor=cls.doctor,
+                patient=patient,
+                date=date(2030, 1, day),
+                start_time=time(hour, minute),
+                status=status,
+            )
+
+        cls.due = [
+            # 24 hours ahead, and less than an hour late
+            appointment(cls.patients[0], 2, 22),
+            appointment(cls.patients[1], 2, 21, 30),
+            # 2 hours ahead, across midnight
+            appointment(cls.patients[2], 1, 23, 30),
+            appointment(cls.patients[3], 2, 0),
+        ]
+        # Too early or too late for a reminder, or not confirmed
+        appointment(cls.patients[4], 2, 22, 15)
+        appointment(cls.patients[4], 2, 20, 45)
+        appointment(cls.patients[4], 2, 1)
+        appointment(cls.patients[4], 2, 21, 45, status="pending")
+
+    def setUp(self):
+        mail.outbox.clear()
+        patcher = mock.patch(
+            "appointments.reminders.send_bulk_sms",
+            side_effect=lambda messages: [True] * len(messages),
+        )
+        self.send_bulk_sms = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sms_phones(self, call=-1):
+        return sorted(
+            phone for phone, _ in self.send_bulk_sms.call_args_list[call][0][0]
+        )
+
+    def test_due_reminders_are_sent_once(self):
+        self.assertEqual(send_due_reminders(self.NOW, chunk_size=1), 8)
+
+        phones = sorted(appointment.patient.phone for appointment in self.due)
+        self.assertEqual(
+            sorted(phone for call in range(4) for phone in self.sms_phones(call)),
+            phones,
+        )
+        self.assertEqual(
+            sorted(message.to[0].split("@")[0] for message in mail.outbox), phones
+        )
+        self.assertEqual(mail.outbox[0].subject, "Appointment Reminder")
+
+        # A rerun within the hour finds nothing left to send
+        self.assertEqual(
+            send_due_reminders(self.NOW + timedelta(minutes=10), chunk_size=1), 0
+        )
+        self.assertEqual(self.send_bulk_sms.call_count, 4)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_failed_reminders_are_retried(self):
+        failing = self.due[0].patient.phone
+        self.send_bulk_sms.side_effect = lambda messages: [
+            phone != failing for phone, _ in messages
+        ]
+        self.assertEqual(send_due_reminders(self.NOW), 7)
+        self.assertFalse(
+            AppointmentReminder.objects.filter(
+                appointment=self.due[0], channel="sms"
+            ).exists()
+        )
+
+        self.send_bulk_sms.side_effect = lambda messages: [True] * len(messages)
+        self.assertEqual(send_due_reminders(self.NOW + timedelta(minutes=10)), 1)
+        self.assertEqual(self.sms_phones(), [failing])
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_results_are_matched_to_reminders_of_one_phone(self):
+        second = Appointment.objects.create(
+            doctor=self.doctor,
+            patient=self.patients[0],
+            date=date(2030, 1, 2),
+            start_time=time(21, 50),
+            status="confirmed",
+        )
+        phone = second.patient.phone
+
+        def reject_second(messages):
+            # Only the reminder of the later appointment is rejected
+            return [
+                not (number == phone and "9:50 PM" in text) for number, text in messages
+            ]
+
+        self.send_bulk_sms.side_effect = reject_second
+        self.assertEqual(send_due_reminders(self.NOW), 9)
+        sms_sent = AppointmentReminder.objects.filter(channel="sms")
+        self.assertTrue(sms_sent.filter(appointment=self.due[0]).exists())
+        self.assertFalse(sms_sent.filter(appointment=second).exists())
+
+        self.send_bulk_sms.side_effect = lambda messages: [True] * len(messages)
+        self.assertEqual(send_due_reminders(self.NOW + timedelta(minutes=10)), 1)
+        self.assertTrue(
+            AppointmentReminder.objects.filter(
+                appointment=second, channel="sms"
+            ).exists()
+        )
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Simultaneous bookings of one slot: exactly one of them may win."""
+
+    threads = 8
+
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patients = create_patients(self.threads)
+
+    def test_simultaneous_bookings_of_one_slot(self):
+        slot = {
+            "doctor": self.doctor.pk,
+            "date": (date.today() + timedelta(days=1)).isoformat(),
+            "start_time": "10:00",
+        }
+        barrier = threading.Barrier(self.threads)
+        statuses = []
+
+        def book(patient):
+            client = APIClient()
+            client.force_authenticate(patient.user)
+            try:
+                barrier.wait()
+                statuses.append(client.post("/api/appointments/", slot).status_code)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=book, args=(patient,)) for patient in self.patients
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(statuses), [201] + [409] * (self.threads - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
@@ -2,12 +2,18 @@ from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 
 
+from core.pagination import CursorSelectablePagination
+from .bulk import bulk_change_status
 from .models import Appointment
+from .permissions import BulkAppointmentPermission
 from .serializers import (
+    AppointmentBulkRescheduleSerializer,
+    AppointmentBulkSerializer,
     AppointmentSerializer,
 )
 
@@ -15,6 +21,7 @@ from .serializers import (
 class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.all().select_related("doctor", "patient")
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorSelectablePagination
     serializer_class = AppointmentSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('doctor', 'patient',)
@@ -32,7 +39,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     @action(methods=["GET"], detail=False, url_path="total_count")
     def total_count(self, request):
-        current_date = datetime.now()
+        current_date = timezone.now()
         one_month_ago = current_date - timedelta(days=30)
         total_users_count = self.queryset.count()
         last_month_users_count = self.queryset.filter(
@@ -54,4 +61,70 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             },
             status=status.HTTP_200_OK,
         )
-    
+
+    def bulk_queryset(self):
+        """Appointments the user may change in bulk: all of them for staff,
+        their own for doctors."""
+        user = self.request.user
+        if user.is_staff or user.is_superuser:
+            return Appointment.objects.all()
+        return Appointment.objects.filter(doctor=user.doctor)
+
+    def bulk_status_response(self, request, status_value):
+        if status_value == Appointment.Status.RESCHEDULED:
+            serializer = AppointmentBulkRescheduleSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            reschedules = {
+                item["id"]: (item["date"], item["start_time"])
+                for item in serializer.validated_data["appointments"]
+            }
+            result = bulk_change_status(
+                self.bulk_queryset(),
+                list(reschedules),
+                status_value,
+                reschedules=reschedules,
+                reason=serializer.validated_data.get("reschedule_reason"),
+            )
+        else:
+            serializer = AppointmentBulkSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            result = bulk_change_status(
+                self.bulk_queryset(), serializer.validated_data["ids"], status_value
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-confirm",
+        permission_classes=[BulkAppointmentPermission],
+    )
+    def bulk_confirm(self, request):
+        return self.bulk_status_response(request, Appointment.Status.CONFIRMED)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-reject",
+        permission_classes=[BulkAppointmentPermission],
+    )
+    def bulk_reject(self, request):
+        return self.bulk_status_response(request, Appointment.Status.REJECTED)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-cancel",
+        permission_classes=[BulkAppointmentPermission],
+    )
+    def bulk_cancel(self, request):
+        return self.bulk_status_response(request, Appointment.Status.CANCELLED)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-reschedule",
+        permission_classes=[BulkAppointmentPermission],
+    )
+    def bulk_reschedule(self, request):
+        return self.bulk_status_response(request, Appointment.Status.RESCHEDULED)
@@ -1,16 +1,19 @@
 from rest_framework import viewsets, status, filters
 from django.shortcuts import get_object_or_404
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 
+from core.cache import cache_response
+from core.conditional import ConditionalRetrieveMixin
 from .models import Blog
 from .serializers import BlogSerializer
 from .permissions import ReadOnlyOrAdminPermission
 
 
-class BlogViewSet(viewsets.ModelViewSet):
+class BlogViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Blog.objects.all()
     serializer_class = BlogSerializer
     permission_classes = [ReadOnlyOrAdminPermission]
@@ -36,9 +39,17 @@ class BlogViewSet(viewsets.ModelViewSet):
             return []
         return super().get_authenticators()
 
+    @cache_response("blogs")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response("blogs")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(methods=["GET"], detail=False, url_path="total_count")
     def total_count(self, request):
-        current_date = datetime.now()
+        current_date = timezone.now()
         one_month_ago = current_date - timedelta(days=30)
         total_users_count = self.queryset.count()
         last_month_users_count = self.queryset.filter(
@@ -14,7 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 import environ
 
-from huey import SqliteHuey
+from core.queues import huey_from_url
 
 
 # from corsheaders.defaults import default_headers
@@ -109,6 +109,21 @@ WSGI_APPLICATION = "cliniify_marketplace.wsgi.application"
 
 DATABASES = {"default": env.db_url("DATABASE_URL", default="sqlite:///db.sqlite3")}
 
+# Tests run on a per-process SQLite file instead of memory, see core.test_runner
+TEST_RUNNER = "core.test_runner.FileDatabaseTestRunner"
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmemcache://, filecache:///var/tmp/cliniify or redis://host:6379/1
+# Cache tag versions live in the cache, so with more than one gunicorn or
+# huey process this must be a shared cache (Redis or file), see core.cache
+
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+
+# Seconds the anonymous responses of the public endpoints stay cached
+PUBLIC_CACHE_TIMEOUT = env.int("PUBLIC_CACHE_TIMEOUT", default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,6 +166,14 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 # Media files
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# "x-accel-redirect" (nginx) or "x-sendfile" to have the web server send media
+# files, see core/media.py
+MEDIA_ACCEL = env("MEDIA_ACCEL", default="")
+MEDIA_ACCEL_PREFIX = env("MEDIA_ACCEL_PREFIX", default="/protected-media/")
+MEDIA_CACHE_MAX_AGE = env.int("MEDIA_CACHE_MAX_AGE", default=24 * 60 * 60)
+
+# index.html of the web app
+WEB_ENTRYPOINT = env("WEB_ENTRYPOINT", default=None)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -185,6 +208,22 @@ if env("EMAIL_ENABLED", default=True):
     EMAIL_USE_SSL = env.bool("EMAIL_USE_SSL", default=False)
 
 EMAIL_DEFAULT_FROM = env("EMAIL_DEFAULT_FROM", default="no-reply@cliniify.com")
+# Messages per second sent by a worker, 0 for no limit
+EMAIL_RATE_LIMIT = env.float("EMAIL_RATE_LIMIT", default=10)
+EMAIL_MAX_RETRIES = env.int("EMAIL_MAX_RETRIES", default=3)
+# Seconds before the first retry of failed recipients, doubled each time
+EMAIL_RETRY_DELAY = env.int("EMAIL_RETRY_DELAY", default=60)
+
+# Seconds appointment status emails wait in the outbox, changes of the same
+# appointment within that time are sent as one email
+APPOINTMENT_NOTIFICATION_DELAY = env.int("APPOINTMENT_NOTIFICATION_DELAY", default=30)
+# Minutes before an appointment its reminders are sent
+APPOINTMENT_REMINDER_LEADS = env.list(
+    "APPOINTMENT_REMINDER_LEADS", cast=int, default=[24 * 60, 2 * 60]
+)
+# Minutes a late reminder may still be sent, appointments confirmed later
+# than that only get the next reminder
+APPOINTMENT_REMINDER_CATCHUP = env.int("APPOINTMENT_REMINDER_CATCHUP", default=60)
 
 # djangorestframework
 REST_FRAMEWORK = {
@@ -207,8 +246,9 @@ SIMPLE_JWT = {
 }
 
 
-# Huey settings
-HUEY = SqliteHuey(filename=BASE_DIR / "tasks_db.sqlite3")
+# Huey settings, see core/queues.py
+HUEY_URL = env("HUEY_URL", default=f"sqlite:///{BASE_DIR / 'tasks_db.sqlite3'}")
+HUEY = huey_from_url(HUEY_URL)
 
 
 SPECTACULAR_SETTINGS = {
@@ -231,3 +271,10 @@ if env("SMS_ENABLED", default=True):
     SMS_DCS = env("SMS_DCS")
     SMS_FLASH_SMS = env("SMS_FLASH_SMS")
     SMS_ROUTE = env("SMS_ROUTE")
+SMS_CONNECT_TIMEOUT = env.float("SMS_CONNECT_TIMEOUT", default=3.05)
+SMS_READ_TIMEOUT = env.float("SMS_READ_TIMEOUT", default=10)
+SMS_MAX_RETRIES = env.int("SMS_MAX_RETRIES", default=3)
+SMS_RETRY_BACKOFF = env.float("SMS_RETRY_BACKOFF", default=0.5)
+# Concurrent connections to the gateway, and numbers per bulk request
+SMS_POOL_SIZE = env.int("SMS_POOL_SIZE", default=10)
+SMS_BATCH_SIZE = env.int("SMS_BATCH_SIZE", default=100)
@@ -1,3 +1,5 @@
 from django.contrib import admin
+from core.models import SearchDocument
 
-# Register your models here.
+
+admin.site.register(SearchDocument)
@@ -0,0 +1,125 @@
+"""Response cache for the public read endpoints.
+
+Responses are cached per path and normalized query string, only for
+anonymous GET requests. Every cached response belongs to one or more tags
+("doctors", "blogs", ...). Each tag has a version stored in the cache
+itself, and the versions are part of the cache key, so invalidating a tag
+(see ``core.signals``) makes every response carrying it unreachable. The
+stale entries then simply expire.
+
+This only holds across processes when they share the cache. With a
+process-local backend such as the default LocMemCache, each gunicorn and
+huey worker has its own tag versions, and an invalidation only reaches the
+process that made the write; the others serve stale responses and
+suggestions for up to ``PUBLIC_CACHE_TIMEOUT``. Deployments running more
+than one process must point ``CACHE_URL`` at Redis or a file cache, which
+``manage.py check --deploy`` warns about (see ``core.checks``).
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .conditional import cached_validators, conditional_response
+
+CACHE_TAG_KEY = "cache-tag:{}"
+RESPONSE_CACHE_KEY = "response:{}"
+# Backends whose entries, tag versions included, are private to a process
+PROCESS_LOCAL_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+CACHED_HEADERS = ("ETag", "Last-Modified")
+
+
+def new_tag_version():
+    # Not 0: a tag whose version got evicted must not come back to a
+    # version that has been used before
+    return time.time_ns()
+
+
+def get_tag_versions(tags):
+    keys = [CACHE_TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_tag_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_tag_version(tag):
+    return get_tag_versions([tag])[0]
+
+
+def invalidate_tags(*tags):
+    for tag in tags:
+        key = CACHE_TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_tag_version(), None)
+
+
+def response_cache_key(request, tags):
+    params = sorted(
+        (key, value) for key, values in request.query_params.lists() for value in values
+    )
+    # Responses embed absolute URLs, so the host is part of the key as well
+    raw = json.dumps(
+        [
+            request.scheme,
+            request.get_host(),
+            request.path,
+            params,
+            get_tag_versions(tags),
+        ]
+    )
+    return RESPONSE_CACHE_KEY.format(hashlib.sha256(raw.encode()).hexdigest())
+
+
+def cache_response(*tags, timeout=None):
+    """Cache the successful responses of a view for anonymous GET requests.
+
+    Works on function views (below ``@api_view``) and on viewset methods.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(*args, **kwargs)
+
+            key = response_cache_key(request, tags)
+            cached = cache.get(key)
+            if cached is not None:
+                data, headers = cached
+                if headers:
+                    response = conditional_response(
+                        request, *cached_validators(headers)
+                    )
+                    if response is not None:
+                        return response
+                return Response(data, headers=headers)
+
+            response = view(*args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                headers = {
+                    header: response[header]
+                    for header in CACHED_HEADERS
+                    if header in response
+                }
+                cache.set(
+                    key,
+                    (response.data, headers),
+                    settings.PUBLIC_CACHE_TIMEOUT if timeout is None else timeout,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import PROCESS_LOCAL_BACKENDS
+from .media import MEDIA_ACCEL_MODES
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cache tag invalidation only reaches the processes sharing the cache."""
+    if settings.CACHES["default"]["BACKEND"] in PROCESS_LOCAL_BACKENDS:
+        return [
+            Warning(
+                "The default cache is local to each process, so cached public "
+                "responses and suggestions stay stale in the workers that did "
+                "not make a write.",
+                hint="Set CACHE_URL to a shared cache, e.g. redis://host:6379/1 "
+                "or filecache:///var/tmp/cliniify.",
+                id="core.W001",
+            )
+        ]
+    return []
+
+
+@register(deploy=True)
+def check_media_accel(app_configs, **kwargs):
+    """Without a front web server sending media files, workers stream them."""
+    if not settings.DEBUG and settings.MEDIA_ACCEL not in MEDIA_ACCEL_MODES:
+        return [
+            Warning(
+                "Media files are streamed by the Django workers, holding one "
+                "worker for every download.",
+                hint="Set MEDIA_ACCEL to x-accel-redirect (nginx, with an "
+                "internal MEDIA_ACCEL_PREFIX location) or x-sendfile, see "
+                "core/media.py.",
+                id="core.W002",
+            )
+        ]
+    return []
@@ -0,0 +1,196 @@
+"""Resized copies of uploaded images.
+
+Uploads are stored as they are; a worker then writes the renditions of
+``RENDITIONS``, each as JPEG and WebP, and records their storage names in
+the model's renditions JSON field:
+
+    {"source": "images/avatar/a.jpg",
+     "card": {"width": 400, "height": 300, "jpeg": "...", "webp": "..."}, ...}
+
+``source`` is the image the renditions were made from, so a changed image
+is noticed without loading the old row.
+
+API responses do not list renditions but the uses of ``IMAGE_USES``, each
+with the ``src`` and ``srcset`` of an ``<img>``, so clients pick the size
+for their screen.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+# Longest side of each rendition, in pixels
+RENDITIONS = {
+    "thumbnail": 150,
+    "thumbnail_2x": 300,
+    "card": 400,
+    "card_2x": 800,
+    "full": 1200,
+    "full_2x": 2400,
+}
+
+# The renditions each use picks from; the first one is the ``src``
+IMAGE_USES = {
+    "thumbnail": ("thumbnail", "thumbnail_2x"),
+    "card": ("card", "thumbnail_2x", "card_2x"),
+    "hero": ("full", "card_2x", "full_2x"),
+}
+
+FORMATS = {
+    "jpeg": {"format": "JPEG", "quality": 80, "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "quality": 75, "method": 4},
+}
+
+RENDITIONS_DIR = "renditions"
+
+# (model, image field, renditions field) of the images with renditions
+IMAGE_FIELDS = (
+    ("doctors.Doctor", "avatar", "avatar_renditions"),
+    ("doctors.DoctorImages", "image", "image_renditions"),
+    ("establishments.Establishment", "logo", "logo_renditions"),
+    ("establishments.EstablishmentImage", "image", "image_renditions"),
+    ("patients.Patient", "avatar", "avatar_renditions"),
+)
+
+
+def needs_renditions(name, renditions):
+    """Whether the image stored as ``name`` lacks some of its renditions."""
+    renditions = renditions or {}
+    return bool(name) and (
+        renditions.get("source") != name or not RENDITIONS.keys() <= renditions.keys()
+    )
+
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def flatten(image, background="white"):
+    """``image`` as RGB, with transparent areas on ``background``."""
+    if image.mode != "RGBA":
+        return image
+    flat = Image.new("RGB", image.size, background)
+    flat.paste(image, mask=image.getchannel("A"))
+    return flat
+
+
+def render(image_file):
+    """Yield ``(name, image)`` for every rendition, largest first. Images
+    with transparency are RGBA, others RGB."""
+    with Image.open(image_file) as image:
+        largest = max(RENDITIONS.values())
+        # Let JPEG decode at a reduced scale instead of at full size
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        mode = "RGBA" if has_alpha(image) else "RGB"
+        if image.mode != mode:
+            image = image.convert(mode)
+
+        for name, size in sorted(RENDITIONS.items(), key=lambda item: -item[1]):
+            # Each rendition is made from the previous, larger one
+            image = image.copy()
+            image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+            yield name, image
+
+
+def generate_renditions(image_file, storage=default_storage):
+    """Write the renditions of ``image_file`` and return their JSON.
+
+    The file names carry a hash of the content, so they can be cached
+    forever (see core.media).
+    """
+    stem = os.path.splitext(image_file.name)[0]
+    renditions = {"source": image_file.name}
+    for name, image in render(image_file):
+        rendition = {"width": image.width, "height": image.height}
+        for extension, options in FORMATS.items():
+            output = BytesIO()
+            # WebP keeps the alpha channel, JPEG has none
+            (image if extension == "webp" else flatten(image)).save(output, **options)
+            content = output.getvalue()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            path = f"{RENDITIONS_DIR}/{stem}/{name}.{digest}.{extension}"
+            if not storage.exists(path):
+                path = storage.save(path, ContentFile(content))
+            rendition[extension] = path
+        renditions[name] = rendition
+    return renditions
+
+
+def update_renditions(model_label, pk, field_name, renditions_field):
+    """Generate the renditions of an instance's image and store them, unless
+    the image changed in the meantime."""
+    model = apps.get_model(model_label)
+    instance = model._base_manager.filter(pk=pk).first()
+    image = instance and getattr(instance, field_name)
+    if not image:
+        return
+    with image.open("rb"):
+        renditions = generate_renditions(image)
+
+    with transaction.atomic():
+        instance = (
+            model._base_manager.select_for_update()
+            .filter(pk=pk, **{field_name: image.name})
+            .first()
+        )
+        if instance is not None:
+            setattr(instance, renditions_field, renditions)
+            # Saved, not updated, so that cached responses are invalidated
+            instance.save(update_fields=[renditions_field, "updated_at"])
+
+
+def image_sources(renditions, uses=tuple(IMAGE_USES), request=None):
+    """``src``, size and JPEG and WebP ``srcset`` of each of ``uses`` of an
+    image, from its renditions JSON. Uses without renditions yet are left
+    out."""
+
+    def url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    renditions = renditions or {}
+    sources = {}
+    for use in uses:
+        candidates = [
+            renditions[name] for name in IMAGE_USES[use] if name in renditions
+        ]
+        if not candidates:
+            continue
+        # Small images have renditions of the same size
+        by_width = {}
+        for rendition in candidates:
+            by_width.setdefault(rendition["width"], rendition)
+        src = candidates[0]
+        sources[use] = {
+            "src": url(src["jpeg"]),
+            "width": src["width"],
+            "height": src["height"],
+            **{
+                f"{extension}_srcset": ", ".join(
+                    f"{url(rendition[extension])} {width}w"
+                    for width, rendition in sorted(by_width.items())
+                )
+                for extension in FORMATS
+            },
+        }
+    return sources
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """The ``image_sources`` of ``uses`` from a renditions JSON field."""
+
+    def __init__(self, uses=tuple(IMAGE_USES), **kwargs):
+        self.uses = uses
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return image_sources(value, self.uses, self.context.get("request"))
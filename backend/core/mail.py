@@ -0,0 +1,74 @@
+"""Batched email sending.
+
+Messages are sent over one backend connection per batch instead of one SMTP
+session each, at most ``EMAIL_RATE_LIMIT`` messages per second. A message
+that fails is split per recipient, so one refused address does not hold back
+the others, and is handed back to the caller to retry.
+"""
+import copy
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def per_recipient(message):
+    recipients = message.recipients()
+    if len(recipients) <= 1:
+        return [message]
+
+    messages = []
+    for recipient in recipients:
+        single = copy.copy(message)
+        single.to, single.cc, single.bcc = [recipient], [], []
+        messages.append(single)
+    return messages
+
+
+def send_messages(messages):
+    """Send ``messages`` over one connection, returns the ones that failed.
+
+    Failed messages with a single recipient are returned as they are.
+    """
+    failed = []
+    limiter = RateLimiter(settings.EMAIL_RATE_LIMIT)
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception("Could not connect to the email backend")
+        return [single for message in messages for single in per_recipient(message)]
+
+    try:
+        for message in messages:
+            limiter.wait()
+            try:
+                connection.send_messages([message])
+            except Exception:
+                logger.exception("Could not send email to %s", message.recipients())
+                failed.extend(per_recipient(message))
+                # The connection may be broken, the next message gets a new one
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+    finally:
+        connection.close()
+    return failed
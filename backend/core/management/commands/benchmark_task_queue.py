@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from huey import PriorityRedisHuey
+
+from core.queues import FAST_LANE, SLOW_LANE, huey_from_url
+
+
+def fake_redis_huey(name):
+    try:
+        import fakeredis
+        import redis
+    except ImportError:
+        raise CommandError("--fake-redis needs fakeredis, see requirements/local.txt")
+
+    pool = redis.ConnectionPool(
+        server=fakeredis.FakeServer(), connection_class=fakeredis.FakeConnection
+    )
+    return PriorityRedisHuey(name, connection_pool=pool)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many tasks per second web workers can enqueue to the task "
+        "queue and a consumer can dequeue, and that fast lane tasks come first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=settings.HUEY_URL)
+        parser.add_argument(
+            "--fake-redis", action="store_true", help="Use an in-process Redis."
+        )
+        parser.add_argument("--tasks", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--fast-ratio",
+            type=float,
+            default=0.1,
+            help="Share of the tasks enqueued on the fast lane.",
+        )
+
+    def handle(self, *args, **options):
+        # A queue of its own, so real tasks are neither run nor flushed
+        name = "benchmark"
+        huey = (
+            fake_redis_huey(name)
+            if options["fake_redis"]
+            else huey_from_url(options["url"], name)
+        )
+
+        @huey.task()
+        def noop():
+            pass
+
+        tasks, threads = options["tasks"], options["threads"]
+        fast_every = round(1 / options["fast_ratio"]) if options["fast_ratio"] else 0
+
+        def enqueue(worker):
+            for index in range(worker, tasks, threads):
+                fast = fast_every and index % fast_every == 0
+                noop(priority=FAST_LANE if fast else SLOW_LANE)
+
+        huey.flush()
+        try:
+            workers = [
+                threading.Thread(target=enqueue, args=(worker,))
+                for worker in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            enqueue_time = time.perf_counter() - started
+
+            pending = huey.pending_count()
+            priorities = []
+            started = time.perf_counter()
+            for _ in range(pending):
+                priorities.append(huey.dequeue().priority)
+            dequeue_time = time.perf_counter() - started
+        finally:
+            huey.flush()
+
+        self.stdout.write(
+            f"{huey.storage.__class__.__name__}: {tasks} tasks, {threads} threads"
+        )
+        self.stdout.write(f"enqueue: {tasks / enqueue_time:.0f} tasks/s")
+        self.stdout.write(f"dequeue: {pending / dequeue_time:.0f} tasks/s")
+        fast = priorities.count(FAST_LANE)
+        if pending != tasks or priorities[:fast] != [FAST_LANE] * fast:
+            raise CommandError("Tasks were lost or fast lane tasks did not come first")
+        self.stdout.write(self.style.SUCCESS(f"{fast} fast lane tasks came first"))
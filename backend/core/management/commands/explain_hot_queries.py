@@ -0,0 +1,100 @@
+import re
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments.booking import active_appointments
+from appointments.models import Appointment
+from doctors.models import Doctor, DoctorEstablishment
+from establishments.models import EstablishmentStaffInvitation
+from feedbacks.models import Feedback
+from users.models import PhoneVerification
+
+# Plan lines showing that a query reads a whole table or sorts its rows
+FULL_SCAN = re.compile(r"\bSCAN \w+$|Seq Scan on", re.MULTILINE)
+SORT = re.compile(r"TEMP B-TREE|^\W*Sort\b", re.MULTILINE)
+
+
+def hot_queries():
+    """The lookups run on every booking, login and profile page.
+
+    Lookups run through ``exists()`` or ``get()`` drop the default ordering,
+    so they are explained unordered as well.
+    """
+    today = timezone.localdate()
+    phone = "9000000000"
+    return (
+        (
+            "appointment slot conflict",
+            Appointment.objects.filter(
+                doctor_id=1, date=today, start_time=time(9)
+            ).order_by(),
+        ),
+        (
+            "booked intervals",
+            active_appointments()
+            .filter(doctor_id=1, date__range=(today, today + timedelta(days=14)))
+            .order_by()
+            .values_list("date", "start_time", "end_time"),
+        ),
+        (
+            "establishment owner",
+            DoctorEstablishment.objects.filter(establishment_id=1, is_owner=True),
+        ),
+        (
+            "owned establishment",
+            DoctorEstablishment.objects.filter(doctor_id=1, is_owner=True),
+        ),
+        (
+            "phone verification code",
+            PhoneVerification.objects.filter(
+                phone=phone,
+                code="000000",
+                created_at__gte=timezone.now() - timedelta(minutes=10),
+            ),
+        ),
+        (
+            "staff invitation token",
+            EstablishmentStaffInvitation.objects.filter(token="token").order_by(),
+        ),
+        ("doctor by phone", Doctor.objects.filter(phone=phone).order_by()),
+        ("doctor by registration", Doctor.objects.filter(reg_no="KMC1").order_by()),
+        ("doctor feedbacks", Feedback.objects.filter(doctor_id=1)),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot lookup queries and fail when one of them scans a "
+        "whole table or sorts instead of using an index."
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # Tiny tables are cheaper to scan; ask whether an index *can*
+                # serve the query
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, queryset in hot_queries():
+                plan = queryset.explain()
+                problems = [
+                    problem
+                    for problem, pattern in (("full scan", FULL_SCAN), ("sort", SORT))
+                    if pattern.search(plan)
+                ]
+                if problems:
+                    failures.append(name)
+                    status = self.style.ERROR(", ".join(problems).upper())
+                else:
+                    status = self.style.SUCCESS("OK")
+                self.stdout.write(f"{name}: {status}")
+                if options["verbosity"] > 1 or problems:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"Not served by an index: {', '.join(failures)}")
@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_FIELDS, needs_renditions
+from core.tasks import generate_renditions_task
+
+
+class Command(BaseCommand):
+    help = "Queue the renditions of the images that have none or stale ones."
+
+    def handle(self, *args, **options):
+        for model_label, field_name, renditions_field in IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            images = (
+                model._base_manager.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .values_list("pk", field_name, renditions_field)
+            )
+            queued = 0
+            for pk, name, renditions in images.iterator(chunk_size=500):
+                if needs_renditions(name, renditions):
+                    generate_renditions_task(
+                        model_label, pk, field_name, renditions_field
+                    )
+                    queued += 1
+            self.stdout.write(f"{model_label}.{field_name}: {queued} queued")
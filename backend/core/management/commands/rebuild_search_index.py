@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents of all doctors and establishments."
+
+    def handle(self, *args, **options):
+        documents = rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {len(documents)} search documents.")
+        )
@@ -0,0 +1,130 @@
+"""Delivery of uploaded media files.
+
+With ``MEDIA_ACCEL`` set, the view only resolves the file and sets its
+headers; the front web server sends the bytes through ``X-Accel-Redirect``
+(nginx) or ``X-Sendfile`` (Apache, lighttpd), so a worker is not held for
+the download. For nginx, ``MEDIA_ACCEL_PREFIX`` is an internal location
+aliasing ``MEDIA_ROOT``:
+
+    location /protected-media/ {
+        internal;
+        alias /srv/cliniify/media/;
+    }
+
+Otherwise the file is streamed by Django, with single range requests, which
+``manage.py check --deploy`` warns about (see ``core.checks``).
+Content-hashed names (renditions) are cached for a year, other files for
+``MEDIA_CACHE_MAX_AGE`` seconds.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# name.<12 hex digits>.ext, as written by core.images
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Values of MEDIA_ACCEL handing the download to the web server
+MEDIA_ACCEL_MODES = ("x-accel-redirect", "x-sendfile")
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """``(start, end)`` of a single byte range, inclusive, None when the
+    header is missing or not a single range, and ``()`` when it cannot be
+    satisfied."""
+    match = RANGE.match(header or "")
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # The last ``end`` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return ()
+    return start, end
+
+
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, last_modified=last_modified)
+    if response is None:
+        response = media_response(request, path, full_path, stat.st_size)
+    response["Last-Modified"] = http_date(last_modified)
+    if HASHED_NAME.search(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def media_response(request, path, full_path, size):
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL == "x-accel-redirect":
+        # nginx answers range requests itself
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+        return response
+    if settings.MEDIA_ACCEL == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return response
+
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range == ():
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            RangeReader(file, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+class RangeReader:
+    """File-like reading at most ``length`` bytes from ``file``'s position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("doctors", "0004_doctornextavailableslot"),
+        ("establishments", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("doctor", "Doctor"),
+                            ("establishment", "Establishment"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("search_text", models.TextField(default="")),
+                ("location_text", models.TextField(default="")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "doctor",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_document",
+                        to="doctors.doctor",
+                    ),
+                ),
+                (
+                    "establishment",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_document",
+                        to="establishments.establishment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Search Documents",
+            },
+        ),
+    ]
@@ -0,0 +1,148 @@
+from django.db import migrations
+
+FTS_TABLE = "core_searchdocument_fts"
+
+SQLITE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        search_text, location_text,
+        content='core_searchdocument', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text, location_text)
+        VALUES (new.id, new.search_text, new.location_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text, location_text)
+        VALUES ('delete', old.id, old.search_text, old.location_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text, location_text)
+        VALUES ('delete', old.id, old.search_text, old.location_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text, location_text)
+        VALUES (new.id, new.search_text, new.location_text);
+    END
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRESQL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_searchdocument_search_trgm "
+    "ON core_searchdocument USING gin (search_text gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_searchdocument_location_trgm "
+    "ON core_searchdocument USING gin (location_text gin_trgm_ops)",
+]
+
+POSTGRESQL_DROP_SQL = [
+    "DROP INDEX IF EXISTS core_searchdocument_location_trgm",
+    "DROP INDEX IF EXISTS core_searchdocument_search_trgm",
+]
+
+
+def sqlite_has_fts5(cursor):
+    cursor.execute("PRAGMA compile_options")
+    return any(option == "ENABLE_FTS5" for (option,) in cursor.fetchall())
+
+
+def create_search_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            statements = POSTGRESQL_SQL
+        elif connection.vendor == "sqlite" and sqlite_has_fts5(cursor):
+            statements = SQLITE_FTS_SQL
+        else:
+            return
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            statements = POSTGRESQL_DROP_SQL
+        elif connection.vendor == "sqlite":
+            statements = SQLITE_DROP_SQL
+        else:
+            return
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def normalize(*parts):
+    return "\n".join(part.strip().lower() for part in parts if part and part.strip())
+
+
+def populate_search_documents(apps, schema_editor):
+    SearchDocument = apps.get_model("core", "SearchDocument")
+    Doctor = apps.get_model("doctors", "Doctor")
+    Establishment = apps.get_model("establishments", "Establishment")
+
+    documents = []
+    doctors = (
+        Doctor.objects.filter(deleted_at__isnull=True)
+        .select_related("address")
+        .prefetch_related("specializations")
+    )
+    for doctor in doctors:
+        address = doctor.address
+        documents.append(
+            SearchDocument(
+                kind="doctor",
+                doctor=doctor,
+                search_text=normalize(
+                    doctor.full_name,
+                    *[spec.name for spec in doctor.specializations.all()],
+                ),
+                location_text=normalize(address.city, address.state) if address else "",
+            )
+        )
+
+    establishments = (
+        Establishment.objects.filter(deleted_at__isnull=True)
+        .select_related("address")
+        .prefetch_related("establishment_services")
+    )
+    for establishment in establishments:
+        address = establishment.address
+        documents.append(
+            SearchDocument(
+                kind="establishment",
+                establishment=establishment,
+                search_text=normalize(
+                    establishment.name,
+                    establishment.establishment_category,
+                    *[
+                        service.name
+                        for service in establishment.establishment_services.all()
+                    ],
+                ),
+                location_text=normalize(address.city, address.state) if address else "",
+            )
+        )
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_backend, drop_search_backend),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
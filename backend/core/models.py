@@ -12,3 +12,38 @@ class BaseModel(SafeDeleteModel):
 
     class Meta:
         abstract = True
+
+
+class SearchDocument(models.Model):
+    """Denormalized, lower-cased text of a doctor or establishment for search."""
+
+    class Kind(models.TextChoices):
+        DOCTOR = "doctor"
+        ESTABLISHMENT = "establishment"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    doctor = models.OneToOneField(
+        "doctors.Doctor",
+        on_delete=models.CASCADE,
+        related_name="search_document",
+        null=True,
+        blank=True,
+    )
+    establishment = models.OneToOneField(
+        "establishments.Establishment",
+        on_delete=models.CASCADE,
+        related_name="search_document",
+        null=True,
+        blank=True,
+    )
+    # Names, specializations, categories and services, one per line
+    search_text = models.TextField(default="")
+    # City and state, one per line
+    location_text = models.TextField(default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Search Documents"
+
+    def __str__(self):
+        return f"{self.kind} - {self.doctor_id or self.establishment_id}"
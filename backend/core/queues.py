@@ -0,0 +1,27 @@
+"""Task queue backends and priorities.
+
+``HUEY_URL`` picks the backend: ``redis://``, ``rediss://`` or ``unix://``
+for a Redis queue, which web workers enqueue to without contending for a
+file lock, or ``sqlite:///path`` for the SQLite file used in development.
+
+Both backends dequeue the highest priority first, so a task on the fast
+lane overtakes the slow lane tasks queued before it.
+"""
+from huey import PriorityRedisHuey, SqliteHuey
+
+# OTP SMS and other messages a user is waiting for to log in
+FAST_LANE = 100
+# Work following a user action: notifications, renditions, slot refreshes
+DEFAULT_LANE = 50
+# Bulk mail, campaigns and reminders
+SLOW_LANE = 0
+
+REDIS_SCHEMES = ("redis://", "rediss://", "unix://")
+
+
+def huey_from_url(url, name="huey", **kwargs):
+    if url.startswith(REDIS_SCHEMES):
+        return PriorityRedisHuey(name, url=url, **kwargs)
+    if url.startswith("sqlite:///"):
+        return SqliteHuey(name, filename=url[len("sqlite:///") :], **kwargs)
+    raise ValueError(f"Unsupported task queue URL: {url}")
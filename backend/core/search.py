@@ -0,0 +1,187 @@
+"""Search index over doctors and establishments.
+
+Every doctor and establishment has one ``SearchDocument`` row holding its
+searchable text lower-cased, kept up to date by the signals in
+``core.signals``. Lookups run against that single table:
+
+* PostgreSQL: ``LIKE '%term%'`` served by ``pg_trgm`` GIN indexes.
+* SQLite: the ``core_searchdocument_fts`` FTS5 table (trigram tokenizer),
+  falling back to ``LIKE`` for terms shorter than three characters.
+* Anything else: plain ``LIKE`` scans of the denormalized table.
+"""
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+
+FTS_TABLE = "core_searchdocument_fts"
+# The FTS5 trigram tokenizer can only match terms of at least three characters
+FTS_MIN_TERM_LENGTH = 3
+
+
+def normalize(*parts):
+    return "\n".join(part.strip().lower() for part in parts if part and part.strip())
+
+
+class SearchBackend:
+    def filter(self, queryset, query, locations):
+        location_filters = Q()
+        for location in locations:
+            location_filters |= Q(location_text__contains=location)
+        return queryset.filter(location_filters, search_text__contains=query)
+
+
+class TrigramSearchBackend(SearchBackend):
+    """PostgreSQL; the LIKE lookups are answered by gin_trgm_ops indexes."""
+
+
+class FTS5SearchBackend(SearchBackend):
+    def filter(self, queryset, query, locations):
+        expressions = []
+        if len(query) >= FTS_MIN_TERM_LENGTH:
+            expressions.append(f"search_text : {self.quote(query)}")
+        else:
+            queryset = queryset.filter(search_text__contains=query)
+
+        if all(len(location) >= FTS_MIN_TERM_LENGTH for location in locations):
+            terms = " OR ".join(self.quote(location) for location in locations)
+            expressions.append(f"location_text : ({terms})")
+        else:
+            queryset = super().filter(queryset, "", locations)
+
+        if not expressions:
+            return queryset
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [" AND ".join(expressions)],
+            )
+        )
+
+    def quote(self, term):
+        return '"' + term.replace('"', '""') + '"'
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == "postgresql":
+            _backend = TrigramSearchBackend()
+        elif (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        ):
+            _backend = FTS5SearchBackend()
+        else:
+            _backend = SearchBackend()
+    return _backend
+
+
+def search_queryset(query, locations):
+    """Documents containing ``query`` located in any of ``locations``."""
+    query = query.strip().lower()
+    locations = [location.strip().lower() for location in locations]
+    locations = [location for location in locations if location] or [""]
+
+    return get_search_backend().filter(SearchDocument.objects.all(), query, locations)
+
+
+def doctor_document(doctor):
+    address = doctor.address
+    return SearchDocument(
+        kind=SearchDocument.Kind.DOCTOR,
+        doctor=doctor,
+        search_text=normalize(
+            doctor.full_name,
+            *[specialization.name for specialization in doctor.specializations.all()],
+        ),
+        location_text=normalize(address.city, address.state) if address else "",
+    )
+
+
+def establishment_document(establishment):
+    address = establishment.address
+    return SearchDocument(
+        kind=SearchDocument.Kind.ESTABLISHMENT,
+        establishment=establishment,
+        search_text=normalize(
+            establishment.name,
+            establishment.establishment_category,
+            *[service.name for service in establishment.establishment_services.all()],
+        ),
+        location_text=normalize(address.city, address.state) if address else "",
+    )
+
+
+def update_doctor_document(doctor_id):
+    from doctors.models import Doctor
+
+    doctor = (
+        Doctor.all_objects.select_related("address")
+        .prefetch_related("specializations")
+        .filter(pk=doctor_id)
+        .first()
+    )
+    if doctor is None or doctor.deleted_at:
+        SearchDocument.objects.filter(doctor_id=doctor_id).delete()
+        return
+    document = doctor_document(doctor)
+    SearchDocument.objects.update_or_create(
+        doctor_id=doctor_id,
+        defaults={
+            "kind": document.kind,
+            "search_text": document.search_text,
+            "location_text": document.location_text,
+        },
+    )
+
+
+def update_establishment_document(establishment_id):
+    from establishments.models import Establishment
+
+    establishment = (
+        Establishment.all_objects.select_related("address")
+        .prefetch_related("establishment_services")
+        .filter(pk=establishment_id)
+        .first()
+    )
+    if establishment is None or establishment.deleted_at:
+        SearchDocument.objects.filter(establishment_id=establishment_id).delete()
+        return
+    document = establishment_document(establishment)
+    SearchDocument.objects.update_or_create(
+        establishment_id=establishment_id,
+        defaults={
+            "kind": document.kind,
+            "search_text": document.search_text,
+            "location_text": document.location_text,
+        },
+    )
+
+
+@transaction.atomic
+def rebuild_search_index():
+    from doctors.models import Doctor
+    from establishments.models import Establishment
+
+    doctors = Doctor.objects.select_related("address").prefetch_related(
+        "specializations"
+    )
+    establishments = Establishment.objects.select_related("address").prefetch_related(
+        "establishment_services"
+    )
+    documents = [doctor_document(doctor) for doctor in doctors]
+    documents += [
+        establishment_document(establishment) for establishment in establishments
+    ]
+
+    SearchDocument.objects.all().delete()
+    documents = SearchDocument.objects.bulk_create(documents, batch_size=500)
+    if isinstance(get_search_backend(), FTS5SearchBackend):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return documents
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from blogs.models import Blog
+from doctors.models import Doctor, DoctorAddress, DoctorEstablishment, DoctorImages
+from establishments.models import (
+    Establishment,
+    EstablishmentAddress,
+    EstablishmentImage,
+    EstablishmentService,
+)
+from feedbacks.models import Feedback
+from specializations.models import Specialization
+from .cache import invalidate_tags
+from .search import update_doctor_document, update_establishment_document
+from .suggestions import SUGGESTION_CACHE_TAG
+
+
+def reindex_doctor(doctor_id):
+    transaction.on_commit(lambda: update_doctor_document(doctor_id))
+
+
+def reindex_establishment(establishment_id):
+    transaction.on_commit(lambda: update_establishment_document(establishment_id))
+
+
+# Soft deletes and undeletes go through save(), so post_save covers them too.
+@receiver(post_save, sender=Doctor)
+def index_doctor(sender, instance, **kwargs):
+    reindex_doctor(instance.pk)
+
+
+@receiver(post_save, sender=DoctorAddress)
+def index_doctor_address(sender, instance, **kwargs):
+    for doctor_id in Doctor.objects.filter(address=instance).values_list(
+        "id", flat=True
+    ):
+        reindex_doctor(doctor_id)
+
+
+@receiver(m2m_changed, sender=Doctor.specializations.through)
+def index_doctor_specializations(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        reindex_doctor(instance.pk)
+    elif pk_set:
+        for doctor_id in pk_set:
+            reindex_doctor(doctor_id)
+
+
+@receiver(post_save, sender=Specialization)
+def index_specialization_doctors(sender, instance, created, **kwargs):
+    if created:
+        return
+    for doctor_id in instance.doctor_set.values_list("id", flat=True):
+        reindex_doctor(doctor_id)
+
+
+@receiver(post_save, sender=Establishment)
+def index_establishment(sender, instance, **kwargs):
+    reindex_establishment(instance.pk)
+
+
+@receiver(post_save, sender=EstablishmentAddress)
+def index_establishment_address(sender, instance, **kwargs):
+    for establishment_id in Establishment.objects.filter(address=instance).values_list(
+        "id", flat=True
+    ):
+        reindex_establishment(establishment_id)
+
+
+@receiver(post_save, sender=EstablishmentService)
+def index_establishment_service(sender, instance, **kwargs):
+    reindex_establishment(instance.establishment_id)
+
+
+# Cache tags of the public responses that embed each model
+CACHE_TAGS = {
+    Doctor: ("doctors", "establishments", "search", SUGGESTION_CACHE_TAG),
+    DoctorAddress: ("doctors", "establishments", "search"),
+    DoctorImages: ("doctors",),
+    DoctorEstablishment: ("doctors", "establishments", "search"),
+    Establishment: ("establishments", "doctors", "search", SUGGESTION_CACHE_TAG),
+    EstablishmentAddress: ("establishments", "doctors", "search"),
+    EstablishmentImage: ("establishments",),
+    EstablishmentService: ("establishments", "search"),
+    Feedback: ("doctors", "establishments", "search"),
+    Specialization: (
+        "specializations",
+        "doctors",
+        "establishments",
+        "search",
+        SUGGESTION_CACHE_TAG,
+    ),
+    Blog: ("blogs",),
+}
+
+
+def invalidate_cache(sender, **kwargs):
+    tags = CACHE_TAGS[sender]
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+for model in CACHE_TAGS:
+    post_save.connect(invalidate_cache, sender=model)
+    post_delete.connect(invalidate_cache, sender=model)
+
+
+@receiver(m2m_changed, sender=Doctor.specializations.through)
+@receiver(m2m_changed, sender=Establishment.specializations.through)
+def invalidate_specializations_cache(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_cache(Specialization)
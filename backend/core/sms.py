@@ -1,29 +1,154 @@
-from django.conf import settings
+"""SMS gateway client.
+
+One client per process keeps a pooled HTTP session to the gateway, so OTPs
+do not pay for a new TCP and TLS handshake each. Connection failures and
+429/5xx answers are retried with exponential backoff; read timeouts are not,
+as the gateway may already have sent the message.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-def send_sms(phone_number: str, message: str):
-    if settings.SMS_BACKEND == "console":
+
+class ConsoleSMSClient:
+    def send(self, phone_number: str, message: str):
         print("------------------------------ SMS ------------------------------------")
         print(f"Phone Number: {phone_number}")
         print(f"Message: {message}")
         print("-----------------------------------------------------------------------")
         return True
 
-    params = {
-        "apikey": settings.SMS_API_KEY,
-        "senderid": settings.SMS_SENDER_ID,
-        "channel": settings.SMS_CHANNEL,
-        "dcs": settings.SMS_DCS,
-        "flashsms": settings.SMS_FLASH_SMS,
-        "route": settings.SMS_ROUTE,
-        "number": phone_number,
-        "text": message,
-    }
-    response = requests.get(settings.SMS_API_URL, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        if data["ErrorCode"] == "000":
-            return True
-
-    return False
+    def send_many(self, messages):
+        return [self.send(phone_number, message) for phone_number, message in messages]
+
+
+class SMSClient:
+    """Client of the HTTP gateway.
+
+    ``params`` are the query parameters sent with every message. ``send_many``
+    sends one request per ``batch_size`` numbers sharing a text, as the
+    gateway takes comma separated numbers, and up to ``pool_size`` requests
+    at once.
+    """
+
+    def __init__(
+        self,
+        url,
+        params=None,
+        timeout=(3.05, 10),
+        max_retries=3,
+        backoff_factor=0.5,
+        pool_size=10,
+        batch_size=100,
+    ):
+        self.url = url
+        self.params = params or {}
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=("GET",),
+            backoff_factor=backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, phone_number: str, message: str):
+        try:
+            response = self.session.get(
+                self.url,
+                params={**self.params, "number": phone_number, "text": message},
+                timeout=self.timeout,
+            )
+            if response.status_code == 200:
+                return response.json().get("ErrorCode") == "000"
+        except (requests.RequestException, ValueError):
+            pass
+        return False
+
+    def send_many(self, messages):
+        """Send ``(phone number, message)`` pairs, returns whether each pair
+        was accepted, in the order of ``messages``."""
+        messages = list(messages)
+        # Indexes of the pairs of each message and phone number
+        indexes = {}
+        for index, (phone_number, message) in enumerate(messages):
+            indexes.setdefault(message, {}).setdefault(phone_number, []).append(index)
+
+        batches = []
+        for message, by_phone_number in indexes.items():
+            phone_numbers = list(by_phone_number)
+            for start in range(0, len(phone_numbers), self.batch_size):
+                batch = phone_numbers[start : start + self.batch_size]
+                batches.append(
+                    (
+                        batch,
+                        message,
+                        [index for phone in batch for index in by_phone_number[phone]],
+                    )
+                )
+
+        accepted = [False] * len(messages)
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            sent = executor.map(
+                lambda batch: self.send(",".join(batch[0]), batch[1]), batches
+            )
+            for (_, _, batch_indexes), batch_accepted in zip(batches, sent):
+                for index in batch_indexes:
+                    accepted[index] = batch_accepted
+        return accepted
+
+
+@lru_cache(maxsize=None)
+def get_sms_client():
+    if settings.SMS_BACKEND == "console":
+        return ConsoleSMSClient()
+
+    return SMSClient(
+        settings.SMS_API_URL,
+        params={
+            "apikey": settings.SMS_API_KEY,
+            "senderid": settings.SMS_SENDER_ID,
+            "channel": settings.SMS_CHANNEL,
+            "dcs": settings.SMS_DCS,
+            "flashsms": settings.SMS_FLASH_SMS,
+            "route": settings.SMS_ROUTE,
+        },
+        timeout=(settings.SMS_CONNECT_TIMEOUT, settings.SMS_READ_TIMEOUT),
+        max_retries=settings.SMS_MAX_RETRIES,
+        backoff_factor=settings.SMS_RETRY_BACKOFF,
+        pool_size=settings.SMS_POOL_SIZE,
+        batch_size=settings.SMS_BATCH_SIZE,
+    )
+
+
+@receiver(setting_changed)
+def reset_sms_client(setting, **kwargs):
+    if setting.startswith("SMS_"):
+        get_sms_client.cache_clear()
+
+
+def send_sms(phone_number: str, message: str):
+    return get_sms_client().send(phone_number, message)
+
+
+def send_bulk_sms(messages):
+    return get_sms_client().send_many(messages)
@@ -0,0 +1,131 @@
+"""In-memory autocomplete index for the ``suggestions`` endpoint.
+
+A suggestion matches when one of its words starts with the search term,
+case-insensitively; the term may run on over the following words ("john sm"
+matches "Dr. John Smith"), but does not match inside a word ("ardio" does not
+match "Cardiology").
+
+Each worker keeps the lower-cased word suffixes of every suggestion ("dr.
+john smith" is indexed as "dr. john smith", "john smith" and "smith") sorted
+by rank group, then alphabetically. A lookup binary searches the term in
+every group, best group first, and stops as soon as ``limit`` suggestions
+were found, so short terms matching most of the index cost no more than long
+ones. Writes to the indexed models invalidate the "suggestions" cache tag; a
+worker rebuilds its index when the tag version moved or the index is older
+than ``SUGGESTION_INDEX_MAX_AGE`` seconds, so serving suggestions never
+touches the database.
+"""
+import re
+import time
+from bisect import bisect_left
+from itertools import groupby
+
+from core.cache import get_tag_version
+
+SUGGESTION_CATEGORIES = ("Doctor", "Specialization", "Establishment", "Type")
+SUGGESTION_CACHE_TAG = "suggestions"
+SUGGESTION_INDEX_MAX_AGE = 5 * 60
+
+DEFAULT_SUGGESTION_LIMIT = 10
+MAX_SUGGESTION_LIMIT = 50
+
+WORD_START = re.compile(r"\b\w")
+
+
+class SuggestionIndex:
+    __slots__ = ("version", "built_at", "entries", "keys", "key_entries", "groups")
+
+    def __init__(self, suggestions, version=0):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = list(dict.fromkeys(item for item in suggestions if item[1]))
+
+        keys = []
+        for entry_id, (category, text) in enumerate(self.entries):
+            lowered = text.lower()
+            category_rank = SUGGESTION_CATEGORIES.index(category)
+            keys.append(((False, category_rank, len(text)), lowered, entry_id))
+            for match in WORD_START.finditer(lowered):
+                if match.start():
+                    keys.append(
+                        (
+                            (True, category_rank, len(text)),
+                            lowered[match.start() :],
+                            entry_id,
+                        )
+                    )
+        keys.sort()
+        self.keys = [key for _, key, _ in keys]
+        self.key_entries = [entry_id for _, _, entry_id in keys]
+
+        # (first, last exclusive) position of each rank group in ``keys``
+        self.groups = []
+        position = 0
+        for _, group in groupby(keys, key=lambda key: key[0]):
+            size = sum(1 for _ in group)
+            self.groups.append((position, position + size))
+            position += size
+
+    def search(self, term, limit=DEFAULT_SUGGESTION_LIMIT):
+        """Top ``limit`` suggestions having a word starting with ``term``.
+
+        Suggestions that start with the term rank before those matching on
+        a later word, then doctors before specializations, establishments
+        and types, then shorter suggestions first, then alphabetically from
+        the matching word.
+        """
+        term = term.strip().lower()
+        if not term or limit < 1:
+            return []
+
+        found = {}
+        for first, last in self.groups:
+            index = bisect_left(self.keys, term, first, last)
+            while index < last and self.keys[index].startswith(term):
+                found.setdefault(self.key_entries[index], None)
+                if len(found) == limit:
+                    break
+                index += 1
+            if len(found) == limit:
+                break
+
+        return [
+            {
+                "category": self.entries[entry_id][0],
+                "suggestion": self.entries[entry_id][1],
+            }
+            for entry_id in found
+        ]
+
+
+def load_suggestions():
+    from doctors.models import Doctor
+    from establishments.models import Establishment
+    from specializations.models import Specialization
+
+    for name in Doctor.objects.filter(is_verified=True).values_list(
+        "full_name", flat=True
+    ):
+        yield "Doctor", name
+    for name in Specialization.objects.values_list("name", flat=True):
+        yield "Specialization", name
+    for name, category in Establishment.objects.values_list(
+        "name", "establishment_category"
+    ):
+        yield "Establishment", name
+        yield "Type", category
+
+
+_index = None
+
+
+def get_suggestion_index():
+    global _index
+    version = get_tag_version(SUGGESTION_CACHE_TAG)
+    if (
+        _index is None
+        or _index.version != version
+        or time.monotonic() - _index.built_at > SUGGESTION_INDEX_MAX_AGE
+    ):
+        _index = SuggestionIndex(load_suggestions(), version)
+    return _index
@@ -1,25 +1,55 @@
 from django.conf import settings
-from django.core.mail import EmailMessage
-from huey.contrib.djhuey import task
+from django.db import transaction
+from huey.contrib.djhuey import db_task, task
 
-from .sms import send_sms
+from .images import needs_renditions, update_renditions
+from .mail import send_messages
+from .queues import DEFAULT_LANE, FAST_LANE, SLOW_LANE
+from .sms import send_bulk_sms, send_sms
 
 
-@task()
-def send_email_task(
-    subject,
-    body,
-    recipient_list,
-    from_email=settings.EMAIL_DEFAULT_FROM,
-    attachments=[],
-):
-    try:
-        email = EmailMessage(subject, body, from_email, recipient_list)
-        email.send()
-    except Exception as e:
-        raise Exception(e)
+@task(priority=SLOW_LANE, context=True)
+def send_emails_task(messages, attempt=0, task=None):
+    """Send the ``EmailMessage`` list over one connection, retrying the
+    recipients that failed with an exponential delay on the task's lane."""
+    failed = send_messages(messages)
+    if failed and attempt < settings.EMAIL_MAX_RETRIES:
+        send_emails_task.schedule(
+            (failed, attempt + 1),
+            delay=settings.EMAIL_RETRY_DELAY * 2**attempt,
+            priority=task.priority if task is not None else SLOW_LANE,
+        )
+    return len(messages) - len(failed)
 
 
-@task()
+def enqueue_emails(messages, priority=SLOW_LANE):
+    """Send ``messages`` in one task once the transaction commits."""
+    messages = list(messages)
+    if messages:
+        transaction.on_commit(lambda: send_emails_task(messages, priority=priority))
+
+
+@db_task(priority=DEFAULT_LANE)
+def generate_renditions_task(model_label, pk, field_name, renditions_field):
+    update_renditions(model_label, pk, field_name, renditions_field)
+
+
+def enqueue_renditions(instance, field_name, renditions_field):
+    """Generate the renditions of ``instance``'s image after commit, if the
+    image changed since they were last made."""
+    if needs_renditions(
+        getattr(instance, field_name).name, getattr(instance, renditions_field)
+    ):
+        args = (instance._meta.label, instance.pk, field_name, renditions_field)
+        transaction.on_commit(lambda: generate_renditions_task(*args))
+
+
+@task(priority=FAST_LANE)
 def send_sms_task(phone_number: str, message: str):
     return send_sms(phone_number, message)
+
+
+@task(priority=SLOW_LANE)
+def send_bulk_sms_task(messages):
+    """Send ``(phone number, message)`` pairs, e.g. campaigns and reminders."""
+    return send_bulk_sms(messages)
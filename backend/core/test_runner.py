@@ -0,0 +1,26 @@
+"""Test runner keeping the SQLite test database in a file.
+
+Writers of an in-memory SQLite database fail at once when another connection
+holds the lock, instead of waiting for it as they do on a file, and the
+concurrent booking tests need them to wait. The file is named after the
+process, so test runs started side by side (or ``--parallel`` workers, which
+clone it) never share one.
+"""
+import os
+import tempfile
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class FileDatabaseTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if settings_dict["ENGINE"] != "django.db.backends.sqlite3":
+                continue
+            if not settings_dict["TEST"].get("NAME"):
+                settings_dict["TEST"]["NAME"] = os.path.join(
+                    tempfile.gettempdir(), f"test_{alias}_{os.getpid()}.sqlite3"
+                )
+        return super().setup_databases(**kwargs)
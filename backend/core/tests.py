@@ -0,0 +1,1765 @@
+"""Query-count budgets for the REST API.
+
+Every GET endpoint of ``api_router`` and ``api_urls`` is requested against a
+synthetic dataset and has to stay within its query budget; a blown budget
+almost always means an N+1 query crept into a serializer or view.
+
+The dataset is multiplied by the ``QUERY_BUDGET_SCALE`` environment variable
+(default 1). Set ``QUERY_BUDGET_REPORT`` to a file path to have the query
+count and wall time of every endpoint written there as JSON.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from datetime import date, time as clock, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from smtplib import SMTPRecipientsRefused
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db import connection
+from django.db.models import Avg, Max, Min, Q
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from appointments.models import Appointment
+from blogs.models import Blog
+from core.checks import check_media_accel, check_shared_cache
+from core.images import generate_renditions, update_renditions
+from core.mail import send_messages
+from core.management.commands.benchmark_task_queue import fake_redis_huey
+from core.queues import FAST_LANE, huey_from_url
+from core.tasks import send_bulk_sms_task, send_emails_task, send_sms_task
+from core.views import (
+    ranked_search_results,
+    serialize_doctor,
+    serialize_search_page,
+    web_entrypoint,
+)
+from core.models import SearchDocument
+from core.search import (
+    FTS5SearchBackend,
+    SearchBackend,
+    get_search_backend,
+    rebuild_search_index,
+    search_queryset,
+)
+from core.sms import SMSClient
+from core.suggestions import (
+    DEFAULT_SUGGESTION_LIMIT,
+    MAX_SUGGESTION_LIMIT,
+    SuggestionIndex,
+)
+from doctors.models import Doctor, DoctorAddress, DoctorEstablishment
+from doctors.slots import refresh_next_available_slots
+from establishments.models import (
+    Establishment,
+    EstablishmentAddress,
+    EstablishmentService,
+)
+from establishments.serializers import EstablishmentSearchSerializer
+from feedbacks.models import DoctorRatingSummary, Feedback
+from feedbacks.utils import get_establishment_average_rating
+from patients.models import Patient
+from specializations.models import Specialization
+from users.models import User
+
+QUERY_BUDGET_SCALE = int(os.environ.get("QUERY_BUDGET_SCALE", 1))
+
+CITIES = ("Kochi", "Thrissur", "Kozhikode", "Kannur", "Kollam")
+TIMINGS = {
+    day: [{"start_time": "09:00", "end_time": "13:00"}]
+    for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+}
+
+
+def seed_dataset(scale=1):
+    """Bulk create a synthetic marketplace and return a few handy objects."""
+    doctor_count = 1000 * scale
+    establishment_count = 200 * scale
+    patient_count = 500 * scale
+    password = make_password(None)
+
+    specializations = Specialization.objects.bulk_create(
+        Specialization(name=name, slug=name.lower())
+        for name in (
+            "Cardiology",
+            "Dermatology",
+            "Neurology",
+            "Orthopedics",
+            "Pediatrics",
+            "Psychiatry",
+        )
+    )
+
+    superuser = User.objects.create(
+        phone="9000000000", is_active=True, is_staff=True, is_superuser=True
+    )
+    sale_user = User.objects.create(phone="9000000001", is_active=True, is_sale=True)
+
+    users = User.objects.bulk_create(
+        User(phone=f"8{index:09d}", password=password, is_active=True)
+        for index in range(doctor_count + patient_count)
+    )
+    doctor_users, patient_users = users[:doctor_count], users[doctor_count:]
+
+    addresses = DoctorAddress.objects.bulk_create(
+        DoctorAddress(
+            address_line_1="1 Main Road",
+            address_line_2="Town",
+            city=CITIES[index % len(CITIES)],
+            state="Kerala",
+            pincode="682001",
+        )
+        for index in range(doctor_count)
+    )
+    doctors = Doctor.objects.bulk_create(
+        Doctor(
+            full_name=f"Dr. Synthetic Doctor {index}",
+            slug=f"synthetic-doctor-{index}",
+            user=user,
+            phone=user.phone,
+            gender=Doctor.GenderChoices.MALE,
+            address=address,
+            fee=300 + index % 8 * 100,
+            experience_years=index % 25,
+            is_verified=index % 10 != 0,
+            onboarded_by=sale_user if index % 20 == 0 else None,
+        )
+        for index, (user, address) in enumerate(zip(doctor_users, addresses))
+    )
+    Doctor.specializations.through.objects.bulk_create(
+        Doctor.specializations.through(
+            doctor=doctor,
+            specialization=specializations[index % len(specializations)],
+        )
+        for index, doctor in enumerate(doctors)
+    )
+
+    establishment_addresses = EstablishmentAddress.objects.bulk_create(
+        EstablishmentAddress(
+            address_line_1="2 Hospital Road",
+            address_line_2="Town",
+            city=CITIES[index % len(CITIES)],
+            state="Kerala",
+            pincode="682001",
+        )
+        for index in range(establishment_count)
+    )
+    establishments = Establishment.objects.bulk_create(
+        Establishment(
+            name=f"Synthetic Clinic {index}",
+            slug=f"synthetic-clinic-{index}",
+            establishment_category=Establishment.EstablishmentCategory.GENERAL,
+            address=address,
+            onboarded_by=sale_user if index % 20 == 0 else None,
+        )
+        for index, address in enumerate(establishment_addresses)
+    )
+    EstablishmentService.objects.bulk_create(
+        EstablishmentService(name="Consultation", establishment=establishment)
+        for establishment in establishments
+    )
+    DoctorEstablishment.objects.bulk_create(
+        DoctorEstablishment(
+            doctor=doctor,
+            establishment=establishments[index % establishment_count],
+            is_owner=index < establishment_count,
+            timings=TIMINGS,
+        )
+        for index, doctor in enumerate(doctors)
+    )
+
+    patients = Patient.objects.bulk_create(
+        Patient(
+            full_name=f"Synthetic Patient {index}",
+            slug=f"synthetic-patient-{index}",
+            user=user,
+            phone=user.phone,
+            gender="M",
+            age=30,
+        )
+        for index, user in enumerate(patient_users)
+    )
+
+    today = date.today()
+    Appointment.objects.bulk_create(
+        Appointment(
+            doctor=doctors[index % doctor_count],
+            patient=patients[index % patient_count],
+            establishment=establishments[index % doctor_count % establishment_count],
+            date=today + timedelta(days=index % 14),
+            start_time=clock(9 + index % 4, 0),
+            end_time=clock(9 + index % 4, 10),
+        )
+        for index in range(3 * doctor_count)
+    )
+    Feedback.objects.bulk_create(
+        Feedback(
+            doctor=doctors[index % doctor_count],
+            patient=patients[index % patient_count],
+            rating=index % 5 + 1,
+            comment="Synthetic feedback",
+        )
+        for index in range(3 * doctor_count)
+    )
+    Blog.objects.bulk_create(
+        Blog(
+            title=f"Synthetic Blog {index}",
+            slug=f"synthetic-blog-{index}",
+            content="Synthetic content",
+        )
+        for index in range(50 * scale)
+    )
+
+    DoctorRatingSummary.rebuild()
+    rebuild_search_index()
+
+    return {
+        "superuser": superuser,
+        "sale_user": sale_user,
+        "doctor": doctors[1],
+        "patient": patients[0],
+        "establishment": establishments[1],
+        "appointment": Appointment.objects.first(),
+        "feedback": Feedback.objects.first(),
+        "blog": Blog.objects.first(),
+        "specialization": specializations[0],
+    }
+
+
+class QueryBudgetTests(APITestCase):
+    # (name, user, url, maximum number of queries). Endpoints whose query
+    # count still grows with the data have no budget yet; they are measured
+    # and reported but not asserted. Retrieve endpoints include the ETag and
+    # Last-Modified queries, which are all a revalidated request costs.
+    ENDPOINTS = (
+        ("users-list", "superuser", "/api/users/", 2),
+        ("users-me", "doctor_user", "/api/users/me/", 1),
+        ("users-sale-user-list", "superuser", "/api/users/sale_user_list/", 2),
+        ("doctors-list", None, "/api/doctors/", 6),
+        ("doctors-list-cursor", None, "/api/doctors/?pagination=cursor", 5),
+        (
+            "doctors-list-cursor-approximate-count",
+            None,
+            "/api/doctors/?pagination=cursor&count=approximate",
+            6,
+        ),
+        ("doctors-retrieve", None, "/api/doctors/{doctor.id}/", 7),
+        ("doctors-retrieve-slug", None, "/api/doctors/{doctor.slug}/", 7),
+        ("doctors-time-slots", None, "/api/doctors/{doctor.id}/time_slots/", 3),
+        ("doctors-availability", None, "/api/doctors/{doctor.id}/availability/", 3),
+        ("doctors-total-count", "superuser", "/api/doctors/total_count/", 2),
+        (
+            "doctors-profile-completion",
+            "superuser",
+            "/api/doctors/{doctor.id}/profile_completion/",
+            2,
+        ),
+        ("doctors-sale-list", "sale_user", "/api/doctors/sale_list_doctor/", 6),
+        (
+            "doctors-associated-establishment",
+            "superuser",
+            "/api/doctors/associated-establishment/",
+            1,
+        ),
+        ("patients-list", "superuser", "/api/patients/", 2),
+        ("patients-retrieve", "superuser", "/api/patients/{patient.id}/", 1),
+        ("patients-total-count", "superuser", "/api/patients/total_count/", 2),
+        (
+            "patients-profile-completion",
+            "superuser",
+            "/api/patients/{patient.id}/profile_completion/",
+            1,
+        ),
+        ("specializations-list", None, "/api/specializations/", 2),
+        (
+            "specializations-retrieve",
+            None,
+            "/api/specializations/{specialization.id}/",
+            1,
+        ),
+        ("appointments-list", "superuser", "/api/appointments/", 3),
+        (
+            "appointments-list-cursor",
+            "superuser",
+            "/api/appointments/?pagination=cursor",
+            1,
+        ),
+        (
+            "appointments-retrieve",
+            "superuser",
+            "/api/appointments/{appointment.id}/",
+            1,
+        ),
+        ("appointments-total-count", "superuser", "/api/appointments/total_count/", 2),
+        ("feedbacks-list", None, "/api/feedbacks/", 2),
+        ("feedbacks-retrieve", None, "/api/feedbacks/{feedback.id}/", 1),
+        ("feedbacks-ratings", None, "/api/feedbacks/{doctor.id}/ratings/", 2),
+        ("blogs-list", None, "/api/blogs/", 2),
+        ("blogs-retrieve", None, "/api/blogs/{blog.slug}/", 2),
+        ("blogs-total-count", "superuser", "/api/blogs/total_count/", 2),
+        ("establishments-list", None, "/api/establishments/", None),
+        (
+            "establishments-retrieve",
+            None,
+            "/api/establishments/{establishment.id}/",
+            24,
+        ),
+        (
+            "establishments-sale-list",
+            "sale_user",
+            "/api/establishments/sale_list_establishment/",
+            None,
+        ),
+        (
+            "establishments-available-staff-doctors",
+            "superuser",
+            "/api/establishments/available_staff_doctors/"
+            "?establishment_id={establishment.id}",
+            13,
+        ),
+        (
+            "establishments-available-owner-doctors",
+            "superuser",
+            "/api/establishments/available_owner_doctors/",
+            10,
+        ),
+        (
+            "establishments-invitations-invitation",
+            None,
+            "/api/establishments-invitations/invitation/?token=missing",
+            1,
+        ),
+        (
+            "onboard-request-search-establishment",
+            "doctor_user",
+            "/api/establishments/onboard-requests/search-establishment/" "?city=Kochi",
+            None,
+        ),
+        (
+            "onboard-request-get-request",
+            "doctor_user",
+            "/api/establishments/onboard-requests/get-request/",
+            6,
+        ),
+        ("search", None, "/api/search/?q=synthetic&location=Kochi,Thrissur", 7),
+        ("suggestions", None, "/api/suggestions/?q=synth", 3),
+    )
+
+    measurements = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(QUERY_BUDGET_SCALE)
+        cls.data["doctor_user"] = cls.data["doctor"].user
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report = os.environ.get("QUERY_BUDGET_REPORT")
+        if report:
+            with open(report, "w") as file:
+                json.dump(cls.measurements, file, indent=2, sort_keys=True)
+
+    def setUp(self):
+        # Budgets are for cache misses
+        cache.clear()
+
+    def request(self, user, url):
+        client = APIClient()
+        if user:
+            client.force_authenticate(self.data[user])
+
+        # The query log is a bounded deque; start every request with room in it
+        connection.queries_log.clear()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url.format(**self.data))
+        elapsed = time.perf_counter() - start
+        return response, len(queries), elapsed
+
+    def test_query_budgets(self):
+        for name, user, url, budget in self.ENDPOINTS:
+            with self.subTest(endpoint=name):
+                response, query_count, elapsed = self.request(user, url)
+                self.measurements[name] = {
+                    "status": response.status_code,
+                    "queries": query_count,
+                    "budget": budget,
+                    "seconds": round(elapsed, 4),
+                }
+                self.assertLess(response.status_code, 500, response.content[:500])
+                if budget is None:
+                    continue
+                self.assertLessEqual(
+                    query_count,
+                    budget,
+                    f"{name} ran {query_count} queries, the budget is {budget}",
+                )
+
+
+class CursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(phone=f"8{index:09d}", is_active=True) for index in range(25)
+        )
+        cls.doctors = Doctor.objects.bulk_create(
+            Doctor(
+                full_name=f"Dr. Cursor {index}",
+                slug=f"cursor-{index}",
+                user=user,
+                phone=user.phone,
+                gender=Doctor.GenderChoices.MALE,
+            )
+            for index, user in enumerate(users)
+        )
+        # Ties on created_at have to be broken by id
+        Doctor.objects.filter(
+            pk__in=[doctor.pk for doctor in cls.doctors[5:15]]
+        ).update(created_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data["next"]
+        return pages
+
+    def test_walks_every_doctor_once_newest_first(self):
+        pages = self.walk("/api/doctors/?pagination=cursor&page_size=4")
+
+        ids = [doctor["id"] for page in pages for doctor in page["results"]]
+        expected = list(
+            Doctor.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 7)
+        self.assertNotIn("count", pages[0])
+        self.assertIsNone(pages[0]["previous"])
+
+    def test_previous_link_returns_the_previous_page(self):
+        pages = self.walk("/api/doctors/?pagination=cursor&page_size=4")
+
+        response = self.client.get(pages[3]["previous"])
+        self.assertEqual(
+            [doctor["id"] for doctor in response.data["results"]],
+            [doctor["id"] for doctor in pages[2]["results"]],
+        )
+
+    def test_approximate_count(self):
+        response = self.client.get("/api/doctors/?pagination=cursor&count=approximate")
+        self.assertEqual(response.data["count"], len(self.doctors))
+        self.assertTrue(response.data["count_is_approximate"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/doctors/?pagination=cursor&cursor=bogus")
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get("/api/doctors/?page=2")
+        self.assertEqual(response.data["count"], len(self.doctors))
+
+
+class ResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.blog = Blog.objects.create(title="Cached Blog", content="Cached")
+        cls.specialization = Specialization.objects.create(name="Cached")
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_responses_are_cached(self):
+        first = self.get("/api/blogs/?search=cached&page=1", 2)
+        second = self.get("/api/blogs/?page=1&search=cached", 0)
+        self.assertEqual(first.data, second.data)
+        self.get(f"/api/blogs/{self.blog.slug}/", 2)
+        self.get(f"/api/blogs/{self.blog.slug}/", 0)
+
+    def test_save_invalidates_the_tagged_responses(self):
+        self.get("/api/blogs/", 2)
+        self.get("/api/specializations/", 2)
+
+        self.blog.title = "Renamed Blog"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.save()
+
+        response = self.get("/api/blogs/", 2)
+        self.assertEqual(response.data["results"][0]["title"], "Renamed Blog")
+        self.get("/api/specializations/", 0)
+
+    def test_delete_invalidates_the_tagged_responses(self):
+        self.get("/api/specializations/", 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.specialization.delete()
+        response = self.get("/api/specializations/", 1)
+        self.assertEqual(response.data["results"], [])
+
+    def test_authenticated_requests_are_not_cached(self):
+        user = User.objects.create(phone="9000000099", is_active=True)
+        self.client.force_authenticate(user)
+        self.get("/api/blogs/", 2)
+        self.get("/api/blogs/", 2)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        for backend, warnings in (
+            ("locmem.LocMemCache", ["core.W001"]),
+            ("filebased.FileBasedCache", []),
+            ("redis.RedisCache", []),
+        ):
+            backend = f"django.core.cache.backends.{backend}"
+            with override_settings(CACHES={"default": {"BACKEND": backend}}):
+                self.assertEqual(
+                    [message.id for message in check_shared_cache(None)], warnings
+                )
+
+
+class ConditionalRetrieveTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(phone="9000000010", is_active=True)
+        patient_user = User.objects.create(phone="9000000011", is_active=True)
+        cls.doctor = Doctor.objects.create(
+            full_name="Dr. Conditional", user=user, phone=user.phone, gender="M"
+        )
+        cls.establishment = Establishment.objects.create(
+            name="Conditional Clinic",
+            establishment_category=Establishment.EstablishmentCategory.GENERAL,
+        )
+        cls.link = DoctorEstablishment.objects.create(
+            doctor=cls.doctor, establishment=cls.establishment, is_owner=True
+        )
+        cls.patient = Patient.objects.create(
+            full_name="Conditional Patient",
+            user=patient_user,
+            phone=patient_user.phone,
+            gender="M",
+            age=30,
+        )
+        cls.blog = Blog.objects.create(title="Conditional Blog", content="Content")
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return (
+            f"/api/doctors/{self.doctor.slug}/",
+            f"/api/doctors/{self.doctor.pk}/",
+            f"/api/establishments/{self.establishment.slug}/",
+            f"/api/blogs/{self.blog.slug}/",
+        )
+
+    def assertNotModified(self, url, **headers):
+        cache.clear()
+        # The validators only, the object is neither loaded nor serialized
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        self.assertLessEqual(len(queries), 2)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        return response
+
+    def test_matching_validators_return_not_modified(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("ETag", response)
+                self.assertIn("Last-Modified", response)
+
+                not_modified = self.assertNotModified(
+                    url, HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+                self.assertEqual(not_modified["ETag"], response["ETag"])
+                self.assertNotModified(
+                    url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+                )
+
+    def test_cached_responses_are_validated_without_queries(self):
+        url = f"/api/doctors/{self.doctor.slug}/"
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+
+    def assertETagChanges(self, url, change):
+        etag = self.client.get(url)["ETag"]
+        change()
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_dependent_rows_change_the_doctor_etag(self):
+        url = f"/api/doctors/{self.doctor.slug}/"
+        self.assertETagChanges(url, lambda: self.establishment.save())
+        self.assertETagChanges(
+            url,
+            lambda: DoctorEstablishment.objects.filter(pk=self.link.pk).update(
+                timings=TIMINGS
+            ),
+        )
+        self.assertETagChanges(
+            url,
+            lambda: Feedback.objects.create(
+                doctor=self.doctor, patient=self.patient, rating=4
+            ),
+        )
+
+    def test_dependent_rows_change_the_establishment_etag(self):
+        url = f"/api/establishments/{self.establishment.slug}/"
+        self.assertETagChanges(
+            url,
+            lambda: Feedback.objects.create(
+                doctor=self.doctor, patient=self.patient, rating=5
+            ),
+        )
+        self.assertETagChanges(
+            url,
+            lambda: DoctorEstablishment.objects.filter(pk=self.link.pk).update(
+                is_owner=False
+            ),
+        )
+
+    def test_missing_object_is_not_found(self):
+        response = self.client.get("/api/doctors/missing-doctor/")
+        self.assertEqual(response.status_code, 404)
+
+
+class IndexTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        output = StringIO()
+        call_command("explain_hot_queries", stdout=output)
+        self.assertNotIn("SCAN", output.getvalue())
+
+    def test_one_active_appointment_per_slot(self):
+        user = User.objects.create(phone="9000000020", is_active=True)
+        doctor = Doctor.objects.create(
+            full_name="Dr. Slot", user=user, phone=user.phone, gender="M"
+        )
+        patient_user = User.objects.create(phone="9000000021", is_active=True)
+        patient = Patient.objects.create(
+            full_name="Slot Patient",
+            user=patient_user,
+            phone=patient_user.phone,
+            gender="M",
+            age=30,
+        )
+        data = {
+            "doctor": doctor,
+            "patient": patient,
+            "date": date.today(),
+            "start_time": clock(9),
+        }
+        Appointment.objects.create(**data, status=Appointment.Status.CANCELLED)
+        Appointment.objects.create(**data)
+        with self.assertRaises(IntegrityError):
+            Appointment.objects.create(**data)
+
+
+def old_search_matches(query, locations):
+    """(doctor ids, establishment ids) the search view matched before it had
+    a search index."""
+    doctors, establishments = set(), set()
+    for loc in locations:
+        location_filters = Q(address__city__icontains=loc.strip()) | Q(
+            address__state__icontains=loc.strip()
+        )
+        doctors.update(
+            Doctor.objects.filter(
+                location_filters,
+                Q(specializations__name__icontains=query)
+                | Q(full_name__icontains=query),
+            ).values_list("id", flat=True)
+        )
+        establishments.update(
+            Establishment.objects.filter(
+                location_filters,
+                Q(name__icontains=query)
+                | Q(establishment_category__icontains=query)
+                | Q(establishment_services__name__icontains=query),
+            ).values_list("id", flat=True)
+        )
+    return doctors, establishments
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Specialization.objects.create(
+            name="Cardiology", slug="cardiology"
+        )
+        cls.dermatology = Specialization.objects.create(
+            name="Dermatology", slug="dermatology"
+        )
+        cls.doctors = []
+        for index, (name, city, specialization) in enumerate(
+            (
+                ("Dr. Anita Menon", "Kochi", cls.cardiology),
+                ("Dr. Rahul Nair", "Thrissur", cls.dermatology),
+                ("Dr. Anand Pillai", "Chennai", cls.cardiology),
+            )
+        ):
+            user = User.objects.create(phone=f"900000004{index}", is_active=True)
+            address = DoctorAddress.objects.create(
+                address_line_1="1 Main Road",
+                city=city,
+                state="Tamil Nadu" if city == "Chennai" else "Kerala",
+                pincode="682001",
+            )
+            doctor = Doctor.objects.create(
+                full_name=name,
+                user=user,
+                phone=user.phone,
+                gender="M",
+                address=address,
+            )
+            doctor.specializations.add(specialization)
+            cls.doctors.append(doctor)
+
+        cls.establishments = []
+        for name, city, service in (
+            ("Heart Care Clinic", "Kochi", "Echocardiography"),
+            ("Skin Studio", "Thrissur", "Laser Therapy"),
+        ):
+            address = EstablishmentAddress.objects.create(
+                address_line_1="2 Hospital Road",
+                city=city,
+                state="Kerala",
+                pincode="682001",
+            )
+            establishment = Establishment.objects.create(
+                name=name,
+                establishment_category=Establishment.EstablishmentCategory.GENERAL,
+                address=address,
+            )
+            EstablishmentService.objects.create(
+                name=service, establishment=establishment
+            )
+            cls.establishments.append(establishment)
+        rebuild_search_index()
+
+    def document(self, instance):
+        if isinstance(instance, Doctor):
+            return SearchDocument.objects.filter(doctor=instance).first()
+        return SearchDocument.objects.filter(establishment=instance).first()
+
+    def assertIndexed(self, instance, search_text, location_text):
+        document = self.document(instance)
+        self.assertIsNotNone(document)
+        self.assertEqual(
+            (document.search_text, document.location_text),
+            (search_text, location_text),
+        )
+        # Found through the FTS5 table too, which follows through triggers
+        for term in search_text.split("\n"):
+            self.assertIn(document, search_queryset(term, location_text.split("\n")))
+
+    def test_doctor_documents_follow_saves(self):
+        doctor = self.doctors[0]
+        self.assertIndexed(doctor, "dr. anita menon\ncardiology", "kochi\nkerala")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.full_name = "Dr. Anita M"
+            doctor.save()
+        self.assertIndexed(doctor, "dr. anita m\ncardiology", "kochi\nkerala")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.address.city = "Ernakulam"
+            doctor.address.save()
+        self.assertIndexed(doctor, "dr. anita m\ncardiology", "ernakulam\nkerala")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.specializations.add(self.dermatology)
+        self.assertIndexed(
+            doctor, "dr. anita m\ncardiology\ndermatology", "ernakulam\nkerala"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dermatology.doctor_set.remove(doctor)
+        self.assertIndexed(doctor, "dr. anita m\ncardiology", "ernakulam\nkerala")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cardiology.name = "Cardiac Sciences"
+            self.cardiology.save()
+        self.assertIndexed(doctor, "dr. anita m\ncardiac sciences", "ernakulam\nkerala")
+        self.assertIndexed(
+            self.doctors[2],
+            "dr. anand pillai\ncardiac sciences",
+            "chennai\ntamil nadu",
+        )
+
+    def test_establishment_documents_follow_saves(self):
+        establishment = self.establishments[0]
+        self.assertIndexed(
+            establishment,
+            "heart care clinic\ngeneral\nechocardiography",
+            "kochi\nkerala",
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            establishment.name = "Heart Institute"
+            establishment.save()
+            establishment.address.city = "Aluva"
+            establishment.address.save()
+            EstablishmentService.objects.create(
+                name="Angiography", establishment=establishment
+            )
+        self.assertIndexed(
+            establishment,
+            "heart institute\ngeneral\nangiography\nechocardiography",
+            "aluva\nkerala",
+        )
+
+    def test_soft_deleted_rows_are_dropped(self):
+        doctor, establishment = self.doctors[1], self.establishments[1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.delete()
+            establishment.delete()
+        self.assertIsNone(self.document(doctor))
+        self.assertIsNone(self.document(establishment))
+        self.assertEqual(search_queryset("skin", ["thrissur"]).count(), 0)
+        self.assertEqual(search_queryset("rahul", ["thrissur"]).count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.undelete()
+        self.assertIndexed(doctor, "dr. rahul nair\ndermatology", "thrissur\nkerala")
+
+    def test_search_matches_the_old_lookups(self):
+        cases = (
+            ("anita", ["Kochi"]),
+            ("Dr.", ["Kochi", "Thrissur"]),
+            ("CARDIO", ["Kochi", "Chennai"]),
+            ("dermatology", ["kerala"]),
+            ("laser", ["Thrissur"]),
+            ("general", ["Kochi", " Thrissur"]),
+            ("an", ["Kochi", "Thrissur", "Chennai"]),
+            ("care", ["Chennai"]),
+            ("ech", ["ko"]),
+        )
+        for backend in (FTS5SearchBackend(), SearchBackend()):
+            if isinstance(backend, FTS5SearchBackend) and not isinstance(
+                get_search_backend(), FTS5SearchBackend
+            ):
+                continue
+            for query, locations in cases:
+                with self.subTest(
+                    backend=type(backend).__name__, query=query, locations=locations
+                ), mock.patch("core.search._backend", backend):
+                    documents = search_queryset(query, locations)
+                    self.assertEqual(
+                        (
+                            {d.doctor_id for d in documents if d.doctor_id},
+                            {
+                                d.establishment_id
+                                for d in documents
+                                if d.establishment_id
+                            },
+                        ),
+                        old_search_matches(query, locations),
+                    )
+
+    def test_rebuild_search_index(self):
+        # Drifted, e.g. after queryset updates that send no signals
+        SearchDocument.objects.filter(doctor=self.doctors[0]).delete()
+        SearchDocument.objects.filter(establishment=self.establishments[0]).update(
+            search_text="stale"
+        )
+        Doctor.objects.filter(pk=self.doctors[1].pk).delete()
+
+        output = StringIO()
+        call_command("rebuild_search_index", stdout=output)
+
+        self.assertIn("Indexed 4 search documents.", output.getvalue())
+        self.assertIndexed(
+            self.doctors[0], "dr. anita menon\ncardiology", "kochi\nkerala"
+        )
+        self.assertIndexed(
+            self.establishments[0],
+            "heart care clinic\ngeneral\nechocardiography",
+            "kochi\nkerala",
+        )
+        self.assertIsNone(self.document(self.doctors[1]))
+        self.assertEqual(
+            [d.establishment_id for d in search_queryset("heart", ["kochi"])],
+            [self.establishments[0].pk],
+        )
+        self.assertFalse(search_queryset("stale", [""]).exists())
+
+
+def seed_search_dataset():
+    """Doctors and establishments matching "general", with rating ties across
+    types and locations."""
+    general = Specialization.objects.create(
+        name="General Medicine", slug="general-medicine"
+    )
+    patient_user = User.objects.create(phone="9000000060", is_active=True)
+    patient = Patient.objects.create(
+        full_name="Search Patient",
+        user=patient_user,
+        phone=patient_user.phone,
+        gender="M",
+        age=30,
+    )
+
+    doctors = []
+    for index, (name, city, ratings, is_verified) in enumerate(
+        (
+            ("Dr. Asha", "Kochi", (5, 4, 5), True),
+            ("Dr. Bina", "Thrissur", (5, 4, 5), True),
+            ("Dr. Chitra", "Kochi", (3,), True),
+            ("Dr. Devi", "Thrissur", (), True),
+            ("Dr. Esha", "Kollam", (4,), True),
+            ("Dr. Fathima", "Kochi", (5,), False),
+            ("Dr. Gita", "Kochi", (), True),
+        )
+    ):
+        user = User.objects.create(phone=f"900000007{index}", is_active=True)
+        address = DoctorAddress.objects.create(
+            address_line_1="1 Main Road", city=city, state="Kerala", pincode="682001"
+        )
+        doctor = Doctor.objects.create(
+            full_name=name,
+            user=user,
+            phone=user.phone,
+            gender="F",
+            address=address,
+            is_verified=is_verified,
+        )
+        doctor.specializations.add(general)
+        for rating in ratings:
+            Feedback.objects.create(
+                doctor=doctor, patient=patient, rating=rating, comment="Search"
+            )
+        doctors.append(doctor)
+
+    establishments = []
+    for name, city, staff in (
+        ("General Hospital", "Kochi", (0, 2)),
+        ("Thrissur Clinic", "Thrissur", (1,)),
+        ("Care Centre", "Kochi", (3,)),
+        ("Point Clinic", "Thrissur", ()),
+        ("Kollam Clinic", "Kollam", (4,)),
+    ):
+        address = EstablishmentAddress.objects.create(
+            address_line_1="2 Hospital Road",
+            city=city,
+            state="Kerala",
+            pincode="682001",
+        )
+        establishment = Establishment.objects.create(
+            name=name,
+            establishment_category=Establishment.EstablishmentCategory.GENERAL,
+            address=address,
+        )
+        EstablishmentService.objects.create(
+            name="Consultation", establishment=establishment
+        )
+        for index in staff:
+            DoctorEstablishment.objects.create(
+                doctor=doctors[index], establishment=establishment, timings=TIMINGS
+            )
+        establishments.append(establishment)
+
+    rebuild_search_index()
+    return doctors, establishments
+
+
+def old_search_order(query, locations):
+    """(kind, id) of the results in the order the search view returned them
+    before ranking moved into the database.
+
+    The old view collected results in sets, so ties it did not break by
+    location came in no particular order; here they are in search document
+    id order, which is how the database breaks them now.
+    """
+    doctor_ids, establishment_ids = old_search_matches(query, locations)
+    document_ids = {
+        (document.kind, document.doctor_id or document.establishment_id): document.id
+        for document in SearchDocument.objects.all()
+    }
+
+    def old_rating(doctor):
+        return doctor.doctor_feedbacks.aggregate(Avg("rating"))["rating__avg"]
+
+    def location_position(city):
+        return locations.index(city) if city in locations else len(locations)
+
+    establishments = []
+    for establishment in Establishment.objects.filter(id__in=establishment_ids):
+        ratings = [
+            rating
+            for rating in (
+                old_rating(doctor_establishment.doctor)
+                for doctor_establishment in DoctorEstablishment.objects.filter(
+                    establishment=establishment
+                )
+            )
+            if rating
+        ]
+        establishment.average_rating = sum(ratings) / len(ratings) if ratings else 0
+        establishments.append(establishment)
+    establishments.sort(
+        key=lambda establishment: (
+            location_position(establishment.address.city),
+            document_ids["establishment", establishment.id],
+        )
+    )
+
+    doctors = []
+    for doctor in Doctor.objects.filter(id__in=doctor_ids, is_verified=True):
+        rating = old_rating(doctor)
+        doctor.average_rating = round(rating, 1) if rating else 0
+        doctors.append(doctor)
+    doctors.sort(key=lambda doctor: document_ids["doctor", doctor.id])
+    # sort_doctors_by_location
+    sorted_doctors = []
+    for loc in locations:
+        sorted_doctors.extend(
+            sorted(
+                [doctor for doctor in doctors if doctor.address.city == loc],
+                key=lambda doctor: -doctor.average_rating,
+            )
+        )
+    sorted_doctors += [
+        doctor
+        for doctor in doctors
+        if doctor.address.city not in locations and doctor not in sorted_doctors
+    ]
+
+    # combine_results and sort_combined_results
+    combined = [("establishment", item) for item in establishments] + [
+        ("doctor", item) for item in sorted_doctors
+    ]
+    combined.sort(key=lambda result: -result[1].average_rating)
+    return [(kind, item.id) for kind, item in combined]
+
+
+class SearchRankingTests(APITestCase):
+    CASES = (
+        ("general", ["Thrissur", "Kochi"]),
+        ("general", ["Kochi"]),
+        ("general", ["Kerala"]),
+        ("general", ["Thrissur", " Kochi"]),
+        ("dr", ["Kochi", "Kollam"]),
+        ("clinic", ["Kollam", "Thrissur"]),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors, cls.establishments = seed_search_dataset()
+
+    def setUp(self):
+        cache.clear()
+
+    def ranked(self, query, locations):
+        request = RequestFactory().get(
+            "/api/search/", {"q": query, "location": ",".join(locations)}
+        )
+        return [
+            (document.kind, document.doctor_id or document.establishment_id)
+            for document in ranked_search_results(request, query, locations)
+        ]
+
+    def test_order_matches_the_old_sort(self):
+        for query, locations in self.CASES:
+            with self.subTest(query=query, locations=locations):
+                expected = old_search_order(query, locations)
+                self.assertTrue(expected)
+                self.assertEqual(self.ranked(query, locations), expected)
+
+        # Rated doctors first, an establishment before a doctor of the same
+        # rating, then the location order
+        doctors, establishments = self.doctors, self.establishments
+        self.assertEqual(
+            self.ranked("general", ["Thrissur", "Kochi"]),
+            [
+                ("doctor", doctors[1].pk),
+                ("doctor", doctors[0].pk),
+                ("establishment", establishments[1].pk),
+                ("establishment", establishments[0].pk),
+                ("doctor", doctors[2].pk),
+                ("establishment", establishments[3].pk),
+                ("establishment", establishments[2].pk),
+                ("doctor", doctors[3].pk),
+                ("doctor", doctors[6].pk),
+            ],
+        )
+
+    def test_only_the_requested_page_is_loaded(self):
+        expected = old_search_order("general", ["Thrissur", "Kochi"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/search/?q=general&location=Thrissur,Kochi&page_size=3&page=2"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], len(expected))
+        self.assertEqual(
+            [(item["type"], item["id"]) for item in response.json()["results"]],
+            expected[3:6],
+        )
+        document_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "core_searchdocument" in query["sql"] and "COUNT(" not in query["sql"]
+        ]
+        self.assertEqual(len(document_queries), 1)
+        self.assertIn("LIMIT 3 OFFSET 3", document_queries[0])
+
+
+class QueryPerFieldEstablishmentSerializer(EstablishmentSearchSerializer):
+    """EstablishmentSearchSerializer as it was before it read prefetched
+    associations, running queries per establishment."""
+
+    def get_fee_range(self, obj):
+        fees = DoctorEstablishment.objects.filter(establishment=obj).values_list(
+            "doctor__fee", flat=True
+        )
+        min_fee = fees.aggregate(Min("doctor__fee"))["doctor__fee__min"]
+        max_fee = fees.aggregate(Max("doctor__fee"))["doctor__fee__max"]
+        if min_fee == max_fee:
+            return f"₹{min_fee}"
+        return f"₹{min_fee} - ₹{max_fee}"
+
+    def get_average_doctors_rating(self, obj):
+        return round(get_establishment_average_rating(obj), 1)
+
+    def get_doctor_count(self, obj):
+        return DoctorEstablishment.objects.filter(establishment=obj).count()
+
+
+class SearchPageSerializationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctors, _ = seed_search_dataset()
+        doctors[0].fee = 500
+        doctors[0].save()
+        doctors[2].fee = 800
+        doctors[2].save()
+        for doctor in doctors:
+            refresh_next_available_slots(doctor)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_serialized_page_is_unchanged(self):
+        request = RequestFactory().get(
+            "/api/search/", {"q": "general", "location": "Thrissur,Kochi"}
+        )
+        documents = list(
+            ranked_search_results(request, "general", ["Thrissur", "Kochi"])
+        )
+
+        # Each result loaded on its own, without any prefetching
+        expected = []
+        for document in documents:
+            if document.doctor_id:
+                doctor = Doctor.objects.get(pk=document.doctor_id)
+                doctor.average_rating = document.average_rating
+                expected.append(serialize_doctor(doctor, request))
+            else:
+                expected.append(
+                    QueryPerFieldEstablishmentSerializer(
+                        Establishment.objects.get(pk=document.establishment_id),
+                        context={"request": request},
+                    ).data
+                )
+
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(serialize_search_page(documents, request)),
+            renderer.render(expected),
+        )
+        # Not trivially equal: fee ranges, ratings and slots are filled in
+        establishment = next(
+            item for item in expected if item["type"] == "establishment"
+        )
+        self.assertTrue(establishment["associated_doctors"])
+        self.assertIn(" - ", "".join(item.get("fee_range", "") for item in expected))
+
+    def test_query_count_does_not_depend_on_the_page_size(self):
+        def count_queries(query, page_size):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    f"/api/search/?q={query}&location=Thrissur,Kochi"
+                    f"&page_size={page_size}"
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                len(response.json()["results"]),
+                min(page_size, response.json()["count"]),
+            )
+            return len(queries)
+
+        # Doctors only, establishments only, then both kinds on every page
+        for query in ("dr", "clinic"):
+            with self.subTest(query=query):
+                self.assertEqual(count_queries(query, 1), count_queries(query, 10))
+        self.assertEqual(count_queries("general", 3), count_queries("general", 10))
+
+
+class SuggestionTests(APITestCase):
+    SUGGESTIONS = (
+        ("Specialization", "Interventional Cardiology"),
+        ("Doctor", "Dr. Ann Cardoso"),
+        ("Type", "Cardiac"),
+        ("Specialization", "Pediatric Cardiology"),
+        ("Establishment", "Cardio Care Centre"),
+        ("Doctor", "Dr. Card Smith"),
+        ("Specialization", "Cardiology"),
+        ("Doctor", "Dr. Anand Menon"),
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def suggestions(self, term, limit=DEFAULT_SUGGESTION_LIMIT, index=None):
+        index = index or SuggestionIndex(self.SUGGESTIONS)
+        return [item["suggestion"] for item in index.search(term, limit)]
+
+    def test_ranking(self):
+        # Starting with the term, then matching on a later word; doctors
+        # first, then specializations, establishments and types; shorter first
+        self.assertEqual(
+            self.suggestions("card"),
+            [
+                "Cardiology",
+                "Cardio Care Centre",
+                "Cardiac",
+                "Dr. Card Smith",
+                "Dr. Ann Cardoso",
+                "Pediatric Cardiology",
+                "Interventional Cardiology",
+            ],
+        )
+        self.assertEqual(self.suggestions("  CARDIOLOGY "), self.suggestions("cardiol"))
+        self.assertEqual(self.suggestions("ann card"), ["Dr. Ann Cardoso"])
+        # Same length, then alphabetically
+        self.assertEqual(self.suggestions("an"), ["Dr. Anand Menon", "Dr. Ann Cardoso"])
+        # Words are matched from their start only
+        self.assertEqual(self.suggestions("ardio"), [])
+        self.assertEqual(self.suggestions(" "), [])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.suggestions("card", 3), ["Cardiology", "Cardio Care Centre", "Cardiac"]
+        )
+        self.assertEqual(self.suggestions("card", 0), [])
+
+        Specialization.objects.bulk_create(
+            Specialization(name=f"Surgery {index:02d}", slug=f"surgery-{index:02d}")
+            for index in range(MAX_SUGGESTION_LIMIT + 10)
+        )
+        for limit, expected in (
+            ("", DEFAULT_SUGGESTION_LIMIT),
+            ("many", DEFAULT_SUGGESTION_LIMIT),
+            ("0", 1),
+            ("20", 20),
+            ("1000", MAX_SUGGESTION_LIMIT),
+        ):
+            with self.subTest(limit=limit):
+                response = self.client.get(f"/api/suggestions/?q=surg&limit={limit}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()), expected)
+                self.assertEqual(response.json()[0]["suggestion"], "Surgery 00")
+
+    def test_duplicates_are_suggested_once(self):
+        index = SuggestionIndex(
+            [
+                ("Type", "General"),
+                ("Type", "General"),
+                ("Establishment", "General"),
+                ("Doctor", "Dr. Sam Samuel"),
+                ("Doctor", ""),
+            ]
+        )
+        self.assertEqual(
+            index.search("general"),
+            [
+                {"category": "Establishment", "suggestion": "General"},
+                {"category": "Type", "suggestion": "General"},
+            ],
+        )
+        # Matching on two of its words
+        self.assertEqual(self.suggestions("sam", index=index), ["Dr. Sam Samuel"])
+
+    def test_rebuilt_after_a_tag_version_bump(self):
+        Specialization.objects.create(name="Nephrology", slug="nephrology")
+        self.assertEqual(
+            self.client.get("/api/suggestions/?q=neph").json()[0]["suggestion"],
+            "Nephrology",
+        )
+
+        Specialization.objects.create(name="Neurology", slug="neurology")
+        # Served from the index without queries until it is invalidated
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/suggestions/?q=ne")
+        self.assertEqual(
+            [item["suggestion"] for item in response.json()], ["Nephrology"]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Specialization.objects.filter(name="Neurology").first().save()
+        response = self.client.get("/api/suggestions/?q=ne")
+        self.assertEqual(
+            [item["suggestion"] for item in response.json()],
+            ["Neurology", "Nephrology"],
+        )
+
+
+class StubSMSGateway:
+    """Local HTTP server answering like the SMS gateway.
+
+    Records the query of every request and the client port it came on;
+    ``failures`` are status codes answered to the first requests.
+    """
+
+    def __init__(self, failures=()):
+        self.requests = []
+        self.failures = list(failures)
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = {
+                    key: value[0]
+                    for key, value in parse_qs(urlsplit(self.path).query).items()
+                }
+                gateway.requests.append((self.client_address[1], query))
+                status = gateway.failures.pop(0) if gateway.failures else 200
+                body = json.dumps({"ErrorCode": "000"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/sms"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SMSClientTests(TestCase):
+    def client_for(self, gateway, **kwargs):
+        return SMSClient(
+            gateway.url, params={"apikey": "key"}, backoff_factor=0, **kwargs
+        )
+
+    def test_messages_reuse_the_connection(self):
+        with StubSMSGateway() as gateway:
+            client = self.client_for(gateway)
+            for _ in range(3):
+                self.assertTrue(client.send("9000000001", "Your code is 123456"))
+
+        self.assertEqual(len({port for port, _ in gateway.requests}), 1)
+        self.assertEqual(
+            gateway.requests[0][1],
+            {"apikey": "key", "number": "9000000001", "text": "Your code is 123456"},
+        )
+
+    def test_transient_failures_are_retried(self):
+        with StubSMSGateway(failures=[503, 502]) as gateway:
+            self.assertTrue(self.client_for(gateway).send("9000000001", "Hello"))
+        self.assertEqual(len(gateway.requests), 3)
+
+        with StubSMSGateway(failures=[503] * 3) as gateway:
+            client = self.client_for(gateway, max_retries=2)
+            self.assertFalse(client.send("9000000001", "Hello"))
+        self.assertEqual(len(gateway.requests), 3)
+
+    def test_bulk_send_groups_numbers_by_message(self):
+        messages = [(f"90000000{index:02}", "Camp on Sunday") for index in range(5)]
+        messages.append(("9100000000", "Your appointment is at 09:00"))
+
+        with StubSMSGateway() as gateway:
+            sent = self.client_for(gateway, batch_size=2).send_many(messages)
+
+        self.assertEqual(sent, [True] * len(messages))
+        self.assertEqual(
+            sorted(query["number"] for _, query in gateway.requests),
+            [
+                "9000000000,9000000001",
+                "9000000002,9000000003",
+                "9000000004",
+                "9100000000",
+            ],
+        )
+
+    def test_bulk_send_results_follow_the_messages(self):
+        messages = [("9000000001", "Camp on Sunday"), ("9000000001", "Reminder")]
+
+        with StubSMSGateway(failures=[400]) as gateway:
+            client = self.client_for(gateway, pool_size=1, max_retries=0)
+            self.assertEqual(client.send_many(messages), [False, True])
+
+
+class RefusingEmailBackend(EmailBackend):
+    """Counts the connections opened and refuses ``refused@example.com``."""
+
+    opened = 0
+
+    def open(self):
+        RefusingEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if "refused@example.com" in message.recipients():
+                raise SMTPRecipientsRefused({"refused@example.com": (550, b"")})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="core.tests.RefusingEmailBackend", EMAIL_RATE_LIMIT=0)
+class MailDispatchTests(TestCase):
+    def setUp(self):
+        RefusingEmailBackend.opened = 0
+
+    def message(self, *recipients):
+        return EmailMessage("Subject", "Body", "from@example.com", list(recipients))
+
+    def test_messages_share_one_connection(self):
+        messages = [self.message(f"staff{index}@example.com") for index in range(5)]
+
+        self.assertEqual(send_messages(messages), [])
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(RefusingEmailBackend.opened, 1)
+
+    def test_failed_messages_are_split_per_recipient(self):
+        with self.assertLogs("core.mail", "ERROR"):
+            failed = send_messages(
+                [self.message("ok@example.com", "refused@example.com")]
+            )
+        self.assertEqual(
+            [message.to for message in failed],
+            [["ok@example.com"], ["refused@example.com"]],
+        )
+
+        # The retry only fails for the refused address
+        with self.assertLogs("core.mail", "ERROR"):
+            failed = send_messages(failed)
+        self.assertEqual([message.to for message in failed], [["refused@example.com"]])
+        self.assertEqual(mail.outbox[0].to, ["ok@example.com"])
+
+    @override_settings(EMAIL_RATE_LIMIT=20)
+    def test_sending_is_rate_limited(self):
+        started = time.monotonic()
+        send_messages([self.message("staff@example.com") for _ in range(3)])
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_retries_stay_on_the_lane_of_the_task(self):
+        task = send_emails_task.s(
+            [self.message("refused@example.com")], priority=FAST_LANE
+        )
+        with mock.patch.object(
+            send_emails_task, "schedule"
+        ) as schedule, self.assertLogs("core.mail", "ERROR"):
+            task.execute()
+
+        self.assertEqual(schedule.call_args.kwargs["priority"], FAST_LANE)
+
+
+def jpeg_upload(name, size):
+    output = BytesIO()
+    Image.new("RGB", size, "teal").save(output, format="JPEG")
+    return SimpleUploadedFile(name, output.getvalue(), content_type="image/jpeg")
+
+
+def rendition_callbacks(callbacks):
+    return [
+        callback
+        for callback in callbacks
+        if callback.__qualname__.startswith("enqueue_renditions.")
+    ]
+
+
+class ImageRenditionTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        user = User.objects.create(phone="9000000099", is_active=True)
+        self.doctor = Doctor.objects.create(
+            full_name="Dr. Photo", user=user, phone=user.phone, gender="M"
+        )
+
+    def upload_avatar(self):
+        self.doctor.avatar = jpeg_upload("phone.jpg", (3000, 2000))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.save()
+        return rendition_callbacks(callbacks)
+
+    def test_upload_is_stored_as_is_and_renditions_queued(self):
+        # Without loading the old row to compare the avatar
+        with self.assertNumQueries(1):
+            callbacks = self.upload_avatar()
+
+        self.assertEqual(len(callbacks), 1)
+        with Image.open(self.doctor.avatar.path) as original:
+            self.assertEqual(original.size, (3000, 2000))
+
+    def test_renditions_are_generated_in_both_formats(self):
+        self.upload_avatar()
+        update_renditions(
+            "doctors.Doctor", self.doctor.pk, "avatar", "avatar_renditions"
+        )
+
+        self.doctor.refresh_from_db()
+        renditions = self.doctor.avatar_renditions
+        self.assertEqual(renditions["source"], self.doctor.avatar.name)
+        self.assertEqual(
+            (renditions["card"]["width"], renditions["card"]["height"]), (400, 267)
+        )
+        self.assertEqual(renditions["full_2x"]["width"], 2400)
+        with default_storage.open(renditions["card"]["webp"]) as webp:
+            self.assertEqual(Image.open(webp).format, "WEBP")
+
+        # Saving again does not regenerate them
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.save()
+        self.assertEqual(rendition_callbacks(callbacks), [])
+
+    def test_transparency_is_white_in_jpeg_and_kept_in_webp(self):
+        logo = Image.new("RGBA", (600, 300), (0, 0, 0, 0))
+        logo.paste((200, 0, 0, 255), (0, 0, 300, 300))
+        output = BytesIO()
+        logo.save(output, format="PNG")
+        upload = SimpleUploadedFile("logo.png", output.getvalue())
+
+        card = generate_renditions(upload)["card"]
+        with default_storage.open(card["jpeg"]) as jpeg:
+            pixel = Image.open(jpeg).getpixel((350, 100))
+            self.assertTrue(all(channel > 245 for channel in pixel), pixel)
+        with default_storage.open(card["webp"]) as webp:
+            webp = Image.open(webp)
+            self.assertEqual(webp.mode, "RGBA")
+            self.assertEqual(webp.getpixel((350, 100))[3], 0)
+
+    def test_responses_have_srcsets_per_use(self):
+        self.upload_avatar()
+        update_renditions(
+            "doctors.Doctor", self.doctor.pk, "avatar", "avatar_renditions"
+        )
+        renditions = Doctor.objects.get(pk=self.doctor.pk).avatar_renditions
+
+        def url(rendition, extension="jpeg"):
+            return "http://testserver/media/" + renditions[rendition][extension]
+
+        response = self.client.get(f"/api/doctors/{self.doctor.pk}/")
+        sources = response.data["avatar_renditions"]
+        self.assertEqual(set(sources), {"thumbnail", "card", "hero"})
+        self.assertEqual(
+            sources["card"],
+            {
+                "src": url("card"),
+                "width": 400,
+                "height": 267,
+                "jpeg_srcset": (
+                    f"{url('thumbnail_2x')} 300w, {url('card')} 400w, "
+                    f"{url('card_2x')} 800w"
+                ),
+                "webp_srcset": (
+                    f"{url('thumbnail_2x', 'webp')} 300w, {url('card', 'webp')} 400w, "
+                    f"{url('card_2x', 'webp')} 800w"
+                ),
+            },
+        )
+        self.assertEqual(
+            sources["hero"]["jpeg_srcset"],
+            f"{url('card_2x')} 800w, {url('full')} 1200w, {url('full_2x')} 2400w",
+        )
+
+
+class MediaDeliveryTests(TestCase):
+    content = bytes(range(100))
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        for name in ("images/photo.jpg", "renditions/photo/card.0123456789ab.jpeg"):
+            default_storage.save(name, ContentFile(self.content))
+
+    def test_files_are_served_with_cache_headers(self):
+        response = self.client.get("/media/images/photo.jpg")
+
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=86400")
+
+        response = self.client.get(
+            "/media/images/photo.jpg",
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_hashed_files_are_immutable(self):
+        response = self.client.get("/media/renditions/photo/card.0123456789ab.jpeg")
+        self.assertEqual(
+            response["Cache-Control"], "public, max-age=31536000, immutable"
+        )
+
+    def test_range_requests(self):
+        response = self.client.get("/media/images/photo.jpg", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get("/media/images/photo.jpg", HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[95:])
+
+        response = self.client.get("/media/images/photo.jpg", HTTP_RANGE="bytes=100-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */100")
+
+    @override_settings(MEDIA_ACCEL="x-accel-redirect")
+    def test_web_server_sends_the_file(self):
+        response = self.client.get("/media/images/photo.jpg")
+
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/images/photo.jpg"
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_only_files_in_media_root_are_served(self):
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 400)
+        self.assertEqual(self.client.get("/media/images").status_code, 404)
+        self.assertEqual(self.client.get("/media/images/missing.jpg").status_code, 404)
+
+    def test_deploy_check_requires_a_web_server_sending_media(self):
+        for debug, accel, warnings in (
+            (False, "", ["core.W002"]),
+            (False, "x-sendfile-typo", ["core.W002"]),
+            (False, "x-accel-redirect", []),
+            (False, "x-sendfile", []),
+            (True, "", []),
+        ):
+            with override_settings(DEBUG=debug, MEDIA_ACCEL=accel):
+                self.assertEqual(
+                    [message.id for message in check_media_accel(None)], warnings
+                )
+
+
+class WebEntrypointTests(TestCase):
+    def test_entrypoint_is_read_again_only_when_changed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "index.html")
+        self.enterContext(override_settings(WEB_ENTRYPOINT=path))
+        request = RequestFactory().get("/")
+
+        def write(content, mtime):
+            with open(path, "w") as file:
+                file.write(content)
+            os.utime(path, (mtime, mtime))
+
+        write("<html>v1</html>", 1_000_000)
+        self.assertEqual(web_entrypoint(request).content, b"<html>v1</html>")
+
+        # Same modification time, served from memory
+        write("<html>v2</html>", 1_000_000)
+        self.assertEqual(web_entrypoint(request).content, b"<html>v1</html>")
+
+        write("<html>v2</html>", 2_000_000)
+        response = web_entrypoint(request)
+        self.assertEqual(response.content, b"<html>v2</html>")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+
+class TaskQueueTests(TestCase):
+    def queues(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        yield huey_from_url(f"sqlite:///{directory.name}/tasks.db", "test")
+        if fakeredis is not None:
+            yield fake_redis_huey("test")
+
+    def test_queue_url_picks_the_backend(self):
+        self.assertEqual(
+            huey_from_url("sqlite:////tmp/tasks.db").storage.filename, "/tmp/tasks.db"
+        )
+        self.assertEqual(
+            type(huey_from_url("redis://localhost:6379/0")).__name__,
+            "PriorityRedisHuey",
+        )
+        with self.assertRaises(ValueError):
+            huey_from_url("amqp://localhost")
+
+    def test_otp_sms_overtakes_queued_bulk_tasks(self):
+        for huey in self.queues():
+            with self.subTest(storage=type(huey.storage).__name__):
+                tasks = [send_bulk_sms_task.s([("9000000001", "Camp")])] * 3
+                tasks.append(send_sms_task.s("9000000002", "Your code is 123456"))
+                for task in tasks:
+                    huey.storage.enqueue(
+                        settings.HUEY.serialize_task(task), task.priority
+                    )
+
+                task = settings.HUEY.deserialize_task(huey.storage.dequeue())
+                self.assertEqual(task.priority, FAST_LANE)
+                self.assertEqual(task.args, ("9000000002", "Your code is 123456"))
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    def test_benchmark(self):
+        stdout = StringIO()
+        call_command(
+            "benchmark_task_queue", "--fake-redis", "--tasks=100", stdout=stdout
+        )
+        self.assertIn("10 fast lane tasks came first", stdout.getvalue())
@@ -1,6 +1,19 @@
+import os
+
 from django.conf import settings
-from django.db.models import Avg, Q
+from django.db.models import (
+    Avg,
+    Case,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
 from django.http import HttpResponse, Http404
+from django.utils.cache import patch_cache_control
 from rest_framework import status
 from rest_framework.decorators import (
     api_view,
@@ -10,27 +23,62 @@ from rest_framework.decorators import (
 from rest_framework.response import Response
 from doctors.filters import DoctorFilter
 
+from core.cache import cache_response
+from core.images import image_sources
 from core.pagination import StandardResultsSetPagination
-from doctors.models import Doctor, DoctorEstablishment
-from specializations.models import Specialization
+from core.models import SearchDocument
+from core.search import search_queryset
+from core.suggestions import (
+    DEFAULT_SUGGESTION_LIMIT,
+    MAX_SUGGESTION_LIMIT,
+    get_suggestion_index,
+)
+from doctors.models import Doctor
 from establishments.models import Establishment
 from establishments.serializers import (
     EstablishmentSearchSerializer,
 )
 from doctors.serializers import DoctorAddressSerializer
+from doctors.slots import next_available_slot_data
+from feedbacks.models import DoctorRatingSummary
+
+# Search results carry the next available slot, which moves without any save
+# (slots are refreshed in bulk), so they are kept for less than other pages
+SEARCH_CACHE_TIMEOUT = 60
+
+
+# (path, modification time, content) of the last entrypoint read
+_entrypoint = (None, None, None)
+
+
+def read_entrypoint():
+    """The entrypoint HTML, read again only when the file changed."""
+    global _entrypoint
+    path = settings.WEB_ENTRYPOINT
+    mtime = os.stat(path).st_mtime_ns
+    cached_path, cached_mtime, content = _entrypoint
+    if (cached_path, cached_mtime) != (path, mtime):
+        with open(path) as file:
+            content = file.read()
+        _entrypoint = (path, mtime, content)
+    return content
 
 
 def web_entrypoint(request):
     try:
-        with open(settings.WEB_ENTRYPOINT) as file:
-            return HttpResponse(file.read())
-    except Exception:
+        content = read_entrypoint()
+    except (OSError, TypeError):
         raise Http404
+    response = HttpResponse(content)
+    # Always revalidated, as it names the current bundles
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 @api_view(["GET"])
 @authentication_classes([])
 @permission_classes([])
+@cache_response("search", timeout=SEARCH_CACHE_TIMEOUT)
 def search(request):
     query = request.GET.get("q")
     location = request.GET.get("location")
@@ -41,79 +89,101 @@ def search(request):
 
     location_list = location.split(",")
 
-    establishments_by_location = search_establishments(query, location_list)
-
-    doctors_by_location = search_doctors(
-        request=request, query=query, location_list=location_list
-    )
-
-    combined_results = combine_results(establishments_by_location, doctors_by_location)
-
-    combined_results = sort_combined_results(combined_results)
+    results = ranked_search_results(request, query, location_list)
 
     paginator = StandardResultsSetPagination()
-    result_page = paginator.paginate_queryset(combined_results, request)
-    serialized_data = [serialize_combined(item, request) for item in result_page]
+    result_page = paginator.paginate_queryset(results, request)
+    serialized_data = serialize_search_page(result_page, request)
 
     return paginator.get_paginated_response(serialized_data)
 
 
-def search_establishments(query, location_list):
+def ranked_search_results(request, query, location_list):
+    """Matching search documents, highest rated first.
 
-    unique_establishments = set()
-    for loc in location_list:
-        location_filters = Q(address__city__icontains=loc.strip()) | Q(
-            address__state__icontains=loc.strip()
-        )
-        name_filters = Q(name__icontains=query)
-        category_filters = Q(establishment_category__icontains=query)
-        services_filters = Q(establishment_services__name__icontains=query)
-        filters = location_filters & (name_filters | category_filters | services_filters)
-        filtered_establishments = Establishment.objects.filter(filters).distinct()
-        unique_establishments.update(filtered_establishments)
-
-
-    establishments_by_location = []
-    for establishment in unique_establishments:
-        establishment.average_rating = get_average_rating_for_establishment(
-            establishment
+    Ties are broken by type (establishments first), then by the position of
+    the result's city in ``location_list``.
+    """
+    doctor_filter = DoctorFilter(
+        request.GET, queryset=Doctor.objects.filter(is_verified=True)
+    )
+    establishment_rating = (
+        DoctorRatingSummary.objects.filter(
+            doctor__associated_doctors__establishment=OuterRef("establishment_id"),
+            rating_count__gt=0,
         )
-        establishment.associated_doctors = get_associated_doctors(establishment)
-        establishments_by_location.append(establishment)
-
-    return establishments_by_location
-
-def search_doctors(request, query, location_list):
+        .values("doctor__associated_doctors__establishment")
+        .annotate(average=Avg("average_rating"))
+        .values("average")
+    )
+    doctor_rating = Round("doctor__rating_summary__average_rating", 1)
+
+    location_rank = Case(
+        *[
+            When(
+                Q(doctor__address__city=loc) | Q(establishment__address__city=loc),
+                then=Value(position),
+            )
+            for position, loc in enumerate(location_list)
+        ],
+        default=Value(len(location_list)),
+    )
 
-    doctor_filter = DoctorFilter(request.GET, queryset=Doctor.objects.all())
-    unique_doctors = set()
-    for loc in location_list:
-        location_filters = Q(address__city__icontains=loc.strip()) | Q(
-            address__state__icontains=loc.strip()
+    return (
+        search_queryset(query, location_list)
+        .filter(
+            Q(kind=SearchDocument.Kind.ESTABLISHMENT)
+            | Q(doctor__in=doctor_filter.qs.values("id"))
         )
-        specialization_filters = Q(specializations__name__icontains=query)
-        name_filters = Q(full_name__icontains=query)
-        filters = location_filters & (specialization_filters | name_filters)
-        filtered_doctors = doctor_filter.qs.filter(filters, is_verified=True).distinct()
-        unique_doctors.update(filtered_doctors)
-
-
-    doctors_by_location = list(unique_doctors)
-
-    highest_rated_doctors = get_highest_rated_doctors(doctors_by_location)
-
-    sorted_doctors = sort_doctors_by_location(highest_rated_doctors, location_list)
+        .annotate(
+            average_rating=Coalesce(
+                Case(
+                    When(kind=SearchDocument.Kind.DOCTOR, then=doctor_rating),
+                    default=Subquery(establishment_rating),
+                ),
+                Value(0.0),
+                output_field=FloatField(),
+            ),
+            type_rank=Case(
+                When(kind=SearchDocument.Kind.ESTABLISHMENT, then=Value(0)),
+                default=Value(1),
+            ),
+            location_rank=location_rank,
+        )
+        .order_by("-average_rating", "type_rank", "location_rank", "id")
+    )
 
-    return sorted_doctors
 
-def get_associated_doctors(establishment):
-    doctor_establishments = DoctorEstablishment.objects.filter(
-        establishment=establishment
-    )
-    doctors = [
-        doctor_establishment.doctor for doctor_establishment in doctor_establishments
+def serialize_search_page(documents, request):
+    """Serialize one page of search documents with a fixed number of queries."""
+    doctor_ids = [document.doctor_id for document in documents if document.doctor_id]
+    establishment_ids = [
+        document.establishment_id for document in documents if document.establishment_id
     ]
-    return doctors
+    doctors = (
+        Doctor.objects.select_related("user", "address")
+        .prefetch_related("specializations", "next_available_slots")
+        .in_bulk(doctor_ids)
+    )
+    establishments = EstablishmentSearchSerializer.setup_eager_loading(
+        Establishment.objects.all()
+    ).in_bulk(establishment_ids)
+
+    serialized_data = []
+    for document in documents:
+        if document.doctor_id:
+            doctor = doctors[document.doctor_id]
+            doctor.average_rating = document.average_rating
+            serialized_data.append(serialize_doctor(doctor, request))
+        else:
+            serialized_data.append(
+                EstablishmentSearchSerializer(
+                    establishments[document.establishment_id],
+                    context={"request": request},
+                ).data
+            )
+    return serialized_data
+
 
 def validate_search_params(query, location):
     errors = {}
@@ -123,67 +193,6 @@ def validate_search_params(query, location):
         errors["location"] = "location query parameter is required."
     return errors
 
-def get_highest_rated_doctors(doctors_by_location):
-    highest_rated_doctors = []
-    for doctor in doctors_by_location:
-        average_rating = doctor.doctor_feedbacks.aggregate(Avg("rating"))["rating__avg"]
-        doctor.average_rating = round(average_rating, 1) if average_rating else 0
-        highest_rated_doctors.append(doctor)
-    return highest_rated_doctors
-
-def get_average_rating_for_establishment(establishment):
-    doctor_establishments = DoctorEstablishment.objects.filter(
-        establishment=establishment
-    )
-    total_rating = 0
-    num_doctors = 0
-    for doctor_establishment in doctor_establishments:
-        doctor = doctor_establishment.doctor
-        average_rating = doctor.doctor_feedbacks.aggregate(Avg("rating"))["rating__avg"]
-        if average_rating:
-            total_rating += average_rating
-            num_doctors += 1
-    average_rating_for_establishment = (
-        total_rating / num_doctors if num_doctors > 0 else 0
-    )
-    return average_rating_for_establishment
-
-def sort_doctors_by_location(doctors, location_list):
-    sorted_doctors = []
-    for loc in location_list:
-        doctors_in_city = [doctor for doctor in doctors if doctor.address.city == loc]
-        sorted_doctors.extend(sorted(doctors_in_city, key=lambda x: -x.average_rating))
-    other_doctors = [
-        doctor
-        for doctor in doctors
-        if doctor.address.city not in location_list and doctor not in sorted_doctors
-    ]
-    sorted_doctors.extend(other_doctors)
-    return sorted_doctors
-
-def combine_results(establishments, doctors):
-    combined_results = []
-    for establishment in establishments:
-        combined_results.append({"type": "establishment", "data": establishment})
-    for doctor in doctors:
-        combined_results.append({"type": "doctor", "data": doctor})
-    return combined_results
-
-
-def sort_combined_results(combined_results):
-    sorted_results = sorted(combined_results, key=lambda x: -x["data"].average_rating)
-    return sorted_results
-
-
-def serialize_combined(item, request):
-    if item["type"] == "establishment":
-        serialized = EstablishmentSearchSerializer(
-            item["data"], context={"request": request}
-        ).data
-    elif item["type"] == "doctor":
-        serialized = serialize_doctor(item["data"], request)
-    return serialized
-
 
 def serialize_doctor(doctor, request):
     serialized = {
@@ -198,6 +207,9 @@ def serialize_doctor(doctor, request):
         "avatar": (
             request.build_absolute_uri(doctor.avatar.url) if doctor.avatar else None
         ),
+        "avatar_renditions": image_sources(
+            doctor.avatar_renditions, ("card",), request
+        ),
         "specializations": [
             specialization.name for specialization in doctor.specializations.all()
         ],
@@ -206,6 +218,9 @@ def serialize_doctor(doctor, request):
         "fee": doctor.fee,
         "is_verified": doctor.is_verified,
         "average_rating": doctor.average_rating,
+        "next_available_slot": next_available_slot_data(
+            doctor.next_available_slots.all()
+        ),
     }
     return serialized
 
@@ -216,39 +231,12 @@ def serialize_doctor(doctor, request):
 def suggestions(request):
     search_term = request.GET.get("q")
     if search_term:
-        doctors = Doctor.objects.filter(
-            Q(full_name__icontains=search_term), is_verified=True
-        )
-        doctors_data = [
-            {"category": "Doctor", "suggestion": doctor.full_name} for doctor in doctors
-        ]
-
-        specializations = Specialization.objects.filter(Q(name__icontains=search_term))
-        specialization_data = [
-            {"category": "Specialization", "suggestion": specialization.name}
-            for specialization in specializations
-        ]
-
-        establishments = Establishment.objects.filter(Q(name__icontains=search_term))
-        establishments_data = [
-            {"category": "Establishment", "suggestion": establishment.name}
-            for establishment in establishments
-        ]
-
-        estab = Establishment.objects.filter(Q(name__icontains=search_term))
-        establishments_category_data = [
-            {
-                "category": "Type",
-                "suggestion": establishment_type.establishment_category,
-            }
-            for establishment_type in estab
-        ]
-
-        return Response(
-            doctors_data
-            + specialization_data
-            + establishments_data
-            + establishments_category_data
-        )
+        try:
+            limit = int(request.GET.get("limit", DEFAULT_SUGGESTION_LIMIT))
+        except ValueError:
+            limit = DEFAULT_SUGGESTION_LIMIT
+        limit = min(max(limit, 1), MAX_SUGGESTION_LIMIT)
+
+        return Response(get_suggestion_index().search(search_term, limit))
     else:
         return Response({"status": False, "msg": "Invalid search terms"})
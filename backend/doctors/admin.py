@@ -1,8 +1,15 @@
 from django.contrib import admin
-from doctors.models import Doctor, DoctorEstablishment, DoctorAddress, DoctorImages
+from doctors.models import (
+    Doctor,
+    DoctorEstablishment,
+    DoctorAddress,
+    DoctorImages,
+    DoctorNextAvailableSlot,
+)
 
 
 admin.site.register(Doctor)
 admin.site.register(DoctorEstablishment)
 admin.site.register(DoctorAddress)
 admin.site.register(DoctorImages)
+admin.site.register(DoctorNextAvailableSlot)
@@ -1,7 +1,6 @@
 import django_filters 
 from django_filters import OrderingFilter
 from .models import Doctor
-from django.db.models import Avg, Case, When, Value, FloatField
 
 class DoctorFilter(django_filters.FilterSet):
     FEE_CHOICES = [
@@ -94,25 +93,19 @@ class DoctorFilter(django_filters.FilterSet):
        return queryset
 
     def filter_average_rating(self, queryset, name, value):
-    # Annotate the queryset with the calculated average_rating
-        annotated_qs = queryset.annotate(
-            average_rating=Case(
-                When(doctor_feedbacks__rating__isnull=True, then=Value(0.0)),
-                default=Avg('doctor_feedbacks__rating'),
-                output_field=FloatField()
-            )
-        )
+        # Doctors without a rating summary have no ratings and never match
+        average_rating = 'rating_summary__average_rating'
         if value == '5':
-            return annotated_qs.filter(average_rating=5.0)
+            return queryset.filter(**{average_rating: 5.0})
         elif value == '4':
-            return annotated_qs.filter(average_rating__gte=4.0)
+            return queryset.filter(**{f'{average_rating}__gte': 4.0})
         elif value == '3':
-            return annotated_qs.filter(average_rating__gte=3.0)
+            return queryset.filter(**{f'{average_rating}__gte': 3.0})
         elif value == '2':
-            return annotated_qs.filter(average_rating__gte=2.0)
+            return queryset.filter(**{f'{average_rating}__gte': 2.0})
         elif value == '1':
-            return annotated_qs.filter(average_rating__gte=1.0)
-        return annotated_qs
+            return queryset.filter(**{f'{average_rating}__gte': 1.0})
+        return queryset
 
     def filter_gender(self, queryset, name, value):
         if value in ['M', 'F', 'O']:
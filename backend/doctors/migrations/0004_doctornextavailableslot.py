@@ -0,0 +1,52 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("establishments", "0002_initial"),
+        ("doctors", "0003_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorNextAvailableSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(blank=True, null=True)),
+                ("start_time", models.TimeField(blank=True, null=True)),
+                ("refreshed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="next_available_slots",
+                        to="doctors.doctor",
+                    ),
+                ),
+                (
+                    "establishment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="next_available_slots",
+                        to="establishments.establishment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Doctor Next Available Slots",
+                "ordering": ("date", "start_time"),
+                "unique_together": {("doctor", "establishment")},
+            },
+        ),
+    ]
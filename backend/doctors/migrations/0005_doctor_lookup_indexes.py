@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doctors", "0004_doctornextavailableslot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(fields=["phone"], name="doctor_phone_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(
+                condition=models.Q(("reg_no__isnull", False)),
+                fields=["reg_no"],
+                name="doctor_reg_no_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctorestablishment",
+            index=models.Index(
+                fields=["establishment", "is_owner"], name="doctor_estab_owner_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctorestablishment",
+            index=models.Index(
+                condition=models.Q(("is_owner", True)),
+                fields=["doctor"],
+                name="doctor_estab_owned_idx",
+            ),
+        ),
+    ]
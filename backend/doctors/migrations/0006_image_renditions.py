@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doctors", "0005_doctor_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="doctor",
+            name="avatar_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="doctorimages",
+            name="image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
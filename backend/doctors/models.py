@@ -83,6 +83,8 @@ class Doctor(BaseModel):
     )
     slug = models.CharField(max_length=255, unique=True)
     avatar = models.ImageField(upload_to="images/avatar", null=True, blank=True)
+    # Written by core.images, not part of the profile
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     phone = models.CharField(
         max_length=10,
         validators=[phone_validator],
@@ -156,13 +158,25 @@ class Doctor(BaseModel):
     class Meta:
         verbose_name_plural = "Doctors"
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["phone"], name="doctor_phone_idx"),
+            models.Index(
+                fields=["reg_no"],
+                name="doctor_reg_no_idx",
+                condition=models.Q(reg_no__isnull=False),
+            ),
+        ]
 
     @property
     def owned_establishment(self):
-        doc_esta = DoctorEstablishment.objects.filter(
-            doctor=self.pk, is_owner=True
-        ).first()
-        return doc_esta.establishment.id
+        # Reads prefetched associated_doctors when the caller provided them
+        owners = [
+            doctor_establishment
+            for doctor_establishment in self.associated_doctors.all()
+            if doctor_establishment.is_owner
+        ]
+        doc_esta = min(owners, key=lambda item: item.pk, default=None)
+        return doc_esta.establishment_id
 
     def make_slug(self):
         specializations = ""
@@ -177,11 +191,25 @@ class Doctor(BaseModel):
             slug = f"{slug}-{get_random_string(4)}"
         return slug
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "time_duration" not in instance.get_deferred_fields():
+            instance._loaded_time_duration = instance.time_duration
+        return instance
+
+    def time_duration_changed(self):
+        """Whether the slot duration differs from the one last loaded or saved."""
+        return getattr(self, "_loaded_time_duration", None) != self.time_duration
+
     def save(self, *args, **kwargs):
         self.full_name = self.format_full_name()
         if not self.slug:
             self.slug = get_random_string(10)
         super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "time_duration" in update_fields:
+            self._loaded_time_duration = self.time_duration
 
     def format_full_name(self):
         variations_to_check = ["dr.", "dr", "Dr.", "Dr"]
@@ -213,6 +241,7 @@ class Doctor(BaseModel):
 
 class DoctorImages(BaseModel):
     image = models.ImageField(upload_to="images/doctors")
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     doctor = models.ForeignKey(
         Doctor, on_delete=models.CASCADE, related_name="doctor_images"
     )
@@ -239,6 +268,40 @@ class DoctorEstablishment(models.Model):
 
     class Meta:
         unique_together = ("doctor", "establishment")
+        indexes = [
+            models.Index(
+                fields=["establishment", "is_owner"],
+                name="doctor_estab_owner_idx",
+            ),
+            models.Index(
+                fields=["doctor"],
+                name="doctor_estab_owned_idx",
+                condition=models.Q(is_owner=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.doctor} - {self.establishment}"
+
+
+class DoctorNextAvailableSlot(models.Model):
+    doctor = models.ForeignKey(
+        Doctor, on_delete=models.CASCADE, related_name="next_available_slots"
+    )
+    establishment = models.ForeignKey(
+        "establishments.Establishment",
+        on_delete=models.CASCADE,
+        related_name="next_available_slots",
+    )
+    # Both empty when there is no free slot within the refresh horizon
+    date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Doctor Next Available Slots"
+        unique_together = ("doctor", "establishment")
+        ordering = ("date", "start_time")
+
+    def __str__(self):
+        return f"{self.doctor} - {self.establishment} - {self.date} {self.start_time}"
@@ -4,7 +4,7 @@ from establishments.models import Establishment
 
 class DoctorPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        excluded_actions = ["list", "retrieve", "time_slots"]
+        excluded_actions = ["list", "retrieve", "time_slots", "availability"]
         if view.action in excluded_actions:
             return True
 
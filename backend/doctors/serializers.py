@@ -4,8 +4,9 @@ from rest_framework import serializers
 from rest_flex_fields import FlexFieldsModelSerializer
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Avg
+from django.db.models import Prefetch
 
+from core.images import ImageRenditionsField, image_sources
 from .models import Doctor, DoctorAddress, DoctorEstablishment, DoctorImages
 from users.serializers import UserSerializer
 from users.models import User
@@ -13,6 +14,7 @@ from specializations.serializers import SpecializationSerializer
 from specializations.models import Specialization
 from establishments.serializers import EstablishmentAddressSerializer
 from establishments.models import Establishment
+from feedbacks.utils import get_doctor_average_rating
 
 
 class DoctorAddressSerializer(serializers.ModelSerializer):
@@ -30,9 +32,11 @@ class DoctorAddressSerializer(serializers.ModelSerializer):
         )
 
 class DoctorImagesSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(uses=("card", "hero"))
+
     class Meta:
         model = DoctorImages
-        fields = ("id", "image")
+        fields = ("id", "image", "image_renditions")
 
 class DoctorUpdateSerializer(serializers.ModelSerializer):
     specializations = serializers.PrimaryKeyRelatedField(
@@ -222,6 +226,7 @@ class DoctorSerializer(FlexFieldsModelSerializer):
     average_rating = serializers.DecimalField(
         max_digits=5, decimal_places=2, read_only=True
     )
+    avatar_renditions = ImageRenditionsField()
     images = serializers.SerializerMethodField()
     associated_establishment = serializers.SerializerMethodField()
     relations = serializers.SerializerMethodField()
@@ -238,6 +243,7 @@ class DoctorSerializer(FlexFieldsModelSerializer):
             "alternative_number",
             "clinic_no",
             "avatar",
+            "avatar_renditions",
             "gender",
             "email",
             "specializations",
@@ -271,66 +277,73 @@ class DoctorSerializer(FlexFieldsModelSerializer):
         )
         expandable_fields = {"user": UserSerializer, "address": DoctorAddressSerializer}
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Everything the serializer reads, so a page of doctors costs a fixed
+        # number of queries
+        return queryset.select_related(
+            "user", "address", "rating_summary"
+        ).prefetch_related(
+            "specializations",
+            "doctor_images",
+            Prefetch(
+                "associated_doctors",
+                queryset=DoctorEstablishment.objects.select_related(
+                    "establishment__address"
+                ).prefetch_related("establishment__specializations"),
+            ),
+        )
+
     def get_images(self, obj):
         request = self.context.get('request')
-        images = DoctorImages.objects.filter(doctor=obj)
+        images = obj.doctor_images.all()
         return DoctorImagesSerializer(images, many=True, context={'request': request}).data
     
     def get_associated_establishment(self, obj):
-        doctor_establishments = DoctorEstablishment.objects.filter(doctor=obj)
+        doctor_establishments = obj.associated_doctors.all()
         associated_establishment = []
-        total_rating = 0
-        num_doctors = 0
-   
-        for doctor_establishment in doctor_establishments:
-            average_rating = doctor_establishment.doctor.doctor_feedbacks.aggregate(
-                Avg("rating")
-            )["rating__avg"]
-            if average_rating:
-                total_rating += average_rating
-                num_doctors += 1
-        average_rating_for_establishment = (
-            total_rating / num_doctors if num_doctors > 0 else 0
-        )
+        average_rating = get_doctor_average_rating(obj)
 
         for doctor_establishment in doctor_establishments:
+            establishment = doctor_establishment.establishment
             establishment_data = {
-                "id": doctor_establishment.establishment.id,
-                "name": doctor_establishment.establishment.name,
-                "slug": doctor_establishment.establishment.slug,
-                "email": doctor_establishment.establishment.email,
-                "phone": doctor_establishment.establishment.phone,
-                "summary": doctor_establishment.establishment.summary,
-                "tagline": doctor_establishment.establishment.tagline,
-                "website": doctor_establishment.establishment.website,
+                "id": establishment.id,
+                "name": establishment.name,
+                "slug": establishment.slug,
+                "email": establishment.email,
+                "phone": establishment.phone,
+                "summary": establishment.summary,
+                "tagline": establishment.tagline,
+                "website": establishment.website,
                 "logo": (
-                    self.context["request"].build_absolute_uri(
-                        doctor_establishment.establishment.logo.url
-                    )
-                    if doctor_establishment.establishment.logo
+                    self.context["request"].build_absolute_uri(establishment.logo.url)
+                    if establishment.logo
                     else None
                 ),
+                "logo_renditions": image_sources(
+                    establishment.logo_renditions,
+                    ("thumbnail",),
+                    self.context["request"],
+                ),
                 "specializations": [
                     specialization.name
-                    for specialization in doctor_establishment.establishment.specializations.all()
+                    for specialization in establishment.specializations.all()
                 ],
-                "address": EstablishmentAddressSerializer(
-                    doctor_establishment.establishment.address
-                ).data,
-                "average_rating": round(average_rating_for_establishment, 1) if average_rating_for_establishment else 0,
+                "address": EstablishmentAddressSerializer(establishment.address).data,
+                "average_rating": average_rating,
                 "is_owner": doctor_establishment.is_owner,
-                "timings": doctor_establishment.establishment.timings,
+                "timings": establishment.timings,
             }
             associated_establishment.append(establishment_data)
         return associated_establishment
         
     def get_relations(self, obj):
-        doctor_establishments = DoctorEstablishment.objects.filter(doctor=obj)
+        doctor_establishments = obj.associated_doctors.all()
         relations = []
         for doctor_establishment in doctor_establishments:
             relation_data = {
-                "doctor_id": doctor_establishment.doctor.id,
-                "establishment_id": doctor_establishment.establishment.id,
+                "doctor_id": doctor_establishment.doctor_id,
+                "establishment_id": doctor_establishment.establishment_id,
                 "timings":doctor_establishment.establishment.timings if doctor_establishment.timings is None and doctor_establishment.is_owner else doctor_establishment.timings,
             }
             relations.append(relation_data)
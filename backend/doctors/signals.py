@@ -1,62 +1,39 @@
 # signals.py
-import os
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from safedelete.signals import pre_softdelete
 
-from .models import Doctor
+from core.tasks import enqueue_renditions
+from .models import Doctor, DoctorEstablishment, DoctorImages
+from .tasks import enqueue_next_available_slot_refresh
 
 
-@receiver(pre_save, sender=Doctor)
-def resize_avatar(sender, instance, **kwargs):
-    if instance.avatar and (
-        not instance.pk or instance.avatar != Doctor.objects.get(pk=instance.pk).avatar
-    ):
-        image = Image.open(instance.avatar)
+@receiver(post_save, sender=Doctor)
+def generate_avatar_renditions(sender, instance, **kwargs):
+    enqueue_renditions(instance, "avatar", "avatar_renditions")
 
-        if image.mode == "RGBA":
-            image = image.convert("RGB")
 
-        max_width = 300
-        max_height = 300
-
-        width_ratio = max_width / image.width
-        height_ratio = max_height / image.height
-
-        ratio = min(width_ratio, height_ratio)
-
-        new_width = int(image.width * ratio)
-        new_height = int(image.height * ratio)
-        image = image.resize((new_width, new_height), Image.LANCZOS)
-
-        max_size_mb = 1
-        max_size_bytes = max_size_mb * 1024 * 1024
-        if instance.avatar.size > max_size_bytes:
-            output = BytesIO()
-            image.save(output, format="JPEG", quality=70)
-            output.seek(0)
-            instance.avatar = InMemoryUploadedFile(
-                output,
-                "ImageField",
-                "%s.jpg" % instance.avatar.name.split(".")[0],
-                "image/jpeg",
-                output.getbuffer().nbytes,
-                None,
-            )
-
-        new_filename = f"{instance.full_name}_{instance.pk}.jpg"
-
-        image_io = BytesIO()
-        image.save(image_io, format="JPEG")
-        image_io.seek(0)
-
-        instance.avatar.save(os.path.basename(new_filename), image_io, save=False)
+@receiver(post_save, sender=DoctorImages)
+def generate_image_renditions(sender, instance, **kwargs):
+    enqueue_renditions(instance, "image", "image_renditions")
 
 
 @receiver(pre_softdelete, sender=Doctor)
 def delete_doctor_address(sender, instance, **kwargs):
     if instance.address:
         instance.address.delete()
+
+
+@receiver(post_save, sender=Doctor)
+def refresh_next_slots_on_duration_change(sender, instance, created, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if created or (update_fields is not None and "time_duration" not in update_fields):
+        return
+    if instance.time_duration_changed():
+        enqueue_next_available_slot_refresh(instance.pk)
+
+
+@receiver(post_save, sender=DoctorEstablishment)
+@receiver(post_delete, sender=DoctorEstablishment)
+def refresh_next_slots_on_timings_change(sender, instance, **kwargs):
+    enqueue_next_available_slot_refresh(instance.doctor_id)
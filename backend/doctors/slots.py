@@ -0,0 +1,284 @@
+"""Appointment slot calendar for doctors.
+
+A doctor's weekly ``DoctorEstablishment.timings`` are compiled into sorted
+slot start minutes per weekday. Compiled schedules are cached on the content
+of the timings and the doctor's ``time_duration``, so editing either of them
+invalidates the cached schedule in every worker without any signalling.
+
+Active (not rejected or cancelled) appointments are fetched with one query
+for the whole date range and subtracted from the slots with a sorted interval
+sweep.
+"""
+import json
+from collections import defaultdict
+from datetime import time, timedelta
+from functools import lru_cache
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from appointments.booking import active_appointments
+from .models import Doctor, DoctorEstablishment, DoctorNextAvailableSlot
+
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+# (name, first minute, last minute exclusive) of the slot buckets returned
+# to clients; slots outside of these periods are not offered.
+DAY_PERIODS = (
+    ("morning", 6 * 60, 12 * 60),
+    ("afternoon", 12 * 60, 15 * 60),
+    ("evening", 15 * 60, 21 * 60),
+)
+
+# How many days ahead DoctorNextAvailableSlot looks for a free slot
+NEXT_AVAILABLE_SLOT_DAYS = 14
+
+
+def parse_minutes(value):
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def parse_duration(time_duration):
+    try:
+        return parse_minutes(time_duration)
+    except (ValueError, AttributeError):
+        return 0
+
+
+def bucket_slots(slots):
+    """Split sorted slot minutes into the morning/afternoon/evening buckets."""
+    return {
+        name: [format_minutes(slot) for slot in slots if start <= slot < end]
+        for name, start, end in DAY_PERIODS
+    }
+
+
+def empty_buckets():
+    return {name: [] for name, _, _ in DAY_PERIODS}
+
+
+def is_offered(slot):
+    return any(start <= slot < end for _, start, end in DAY_PERIODS)
+
+
+class WeeklySchedule:
+    """Slot start minutes for each weekday (Monday first)."""
+
+    __slots__ = ("duration", "days")
+
+    def __init__(self, duration, days):
+        self.duration = duration
+        self.days = days
+
+    def slots_on(self, date):
+        return self.days[date.weekday()]
+
+
+@lru_cache(maxsize=4096)
+def _compile_schedule(timings_key, duration):
+    timings = json.loads(timings_key)
+    days = []
+    for weekday in WEEKDAYS:
+        starts = set()
+        if duration > 0:
+            for window in timings.get(weekday) or ():
+                try:
+                    current = parse_minutes(window.get("start_time", ""))
+                    end = parse_minutes(window.get("end_time", ""))
+                except (ValueError, AttributeError):
+                    continue
+                starts.update(range(current, end, duration))
+        days.append(tuple(sorted(starts)))
+    return WeeklySchedule(duration, tuple(days))
+
+
+def compile_schedule(timings, time_duration):
+    if not isinstance(timings, dict):
+        timings = {}
+    return _compile_schedule(
+        json.dumps(timings, sort_keys=True), parse_duration(time_duration)
+    )
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def subtract_booked(slots, duration, booked):
+    """Drop the slots overlapping any of the merged, sorted booked intervals."""
+    free = []
+    index = 0
+    for slot in slots:
+        while index < len(booked) and booked[index][1] <= slot:
+            index += 1
+        if index == len(booked) or booked[index][0] >= slot + duration:
+            free.append(slot)
+    return free
+
+
+class SlotCalendar:
+    """Free slots of one doctor across all of its establishments."""
+
+    def __init__(self, doctor, doctor_establishments=None):
+        if doctor_establishments is None:
+            doctor_establishments = DoctorEstablishment.objects.filter(doctor=doctor)
+        self.doctor = doctor
+        self.duration = parse_duration(doctor.time_duration)
+        self.doctor_establishments = list(doctor_establishments)
+        self.schedules = {
+            doctor_establishment.establishment_id: compile_schedule(
+                doctor_establishment.timings, doctor.time_duration
+            )
+            for doctor_establishment in self.doctor_establishments
+            if doctor_establishment.timings is not None
+        }
+
+    def booked_intervals(self, start_date, end_date):
+        """Merged booked minute intervals per date, fetched in one query."""
+        appointments = (
+            active_appointments()
+            .filter(doctor=self.doctor, date__range=(start_date, end_date))
+            .order_by()
+            .values_list("date", "start_time", "end_time")
+        )
+
+        intervals = defaultdict(list)
+        for date, start_time, end_time in appointments:
+            start = start_time.hour * 60 + start_time.minute
+            end = end_time.hour * 60 + end_time.minute if end_time else start
+            if end <= start:
+                end = start + max(self.duration, 1)
+            intervals[date].append((start, end))
+        return {date: merge_intervals(values) for date, values in intervals.items()}
+
+    def free_slots(self, start_date, end_date=None):
+        """``{date: {establishment_id: [slot minutes]}}`` for the date range."""
+        end_date = end_date or start_date
+        booked = self.booked_intervals(start_date, end_date)
+
+        days = {}
+        date = start_date
+        while date <= end_date:
+            booked_today = booked.get(date, [])
+            days[date] = {
+                establishment_id: subtract_booked(
+                    schedule.slots_on(date), schedule.duration, booked_today
+                )
+                for establishment_id, schedule in self.schedules.items()
+            }
+            date += timedelta(days=1)
+        return days
+
+    def day_buckets(self, establishment_slots):
+        """Shape one day of ``free_slots`` the way ``time_slots`` returns it."""
+        if len(self.doctor_establishments) == 1:
+            establishment_id = self.doctor_establishments[0].establishment_id
+            slots = establishment_slots.get(establishment_id)
+            return bucket_slots(slots) if slots else empty_buckets()
+
+        buckets = {
+            establishment_id: bucket_slots(slots)
+            for establishment_id, slots in establishment_slots.items()
+        }
+        return buckets or empty_buckets()
+
+
+def refresh_next_available_slots(doctor):
+    """Recompute the DoctorNextAvailableSlot rows of one doctor."""
+    now = timezone.localtime()
+    today = now.date()
+    current_minute = now.hour * 60 + now.minute
+
+    calendar = SlotCalendar(doctor)
+    free_slots = calendar.free_slots(
+        today, today + timedelta(days=NEXT_AVAILABLE_SLOT_DAYS - 1)
+    )
+
+    next_slots = {
+        doctor_establishment.establishment_id: DoctorNextAvailableSlot(
+            doctor=doctor, establishment_id=doctor_establishment.establishment_id
+        )
+        for doctor_establishment in calendar.doctor_establishments
+    }
+    for date, establishment_slots in free_slots.items():
+        for establishment_id, slots in establishment_slots.items():
+            next_slot = next_slots[establishment_id]
+            if next_slot.date is not None:
+                continue
+            for slot in slots:
+                if is_offered(slot) and (date > today or slot > current_minute):
+                    next_slot.date = date
+                    next_slot.start_time = time(slot // 60, slot % 60)
+                    break
+
+    DoctorNextAvailableSlot.objects.filter(doctor=doctor).exclude(
+        establishment_id__in=next_slots
+    ).delete()
+    DoctorNextAvailableSlot.objects.bulk_create(
+        next_slots.values(),
+        update_conflicts=True,
+        unique_fields=["doctor", "establishment"],
+        update_fields=["date", "start_time", "refreshed_at"],
+    )
+
+
+def doctors_with_stale_next_slots(now=None):
+    """Doctors whose next available slots went stale as time passed.
+
+    Timings, duration and booking changes already refresh a doctor, so only
+    doctors never refreshed, whose next slot is now in the past, or whose
+    empty horizon has moved on since they were refreshed are returned.
+    """
+    now = now or timezone.localtime()
+    today = now.date()
+    start_of_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    next_slots = DoctorNextAvailableSlot.objects.filter(doctor=OuterRef("pk"))
+    stale_slots = next_slots.filter(
+        Q(date__lt=today)
+        | Q(date=today, start_time__lte=now.time())
+        | Q(date__isnull=True, refreshed_at__lt=start_of_today)
+    )
+    return Doctor.objects.filter(
+        Exists(DoctorEstablishment.objects.filter(doctor=OuterRef("pk"))),
+        Exists(stale_slots) | ~Exists(next_slots),
+    )
+
+
+def next_available_slot_data(next_slots, establishment_id=None):
+    """Earliest of the (prefetched) next slots, optionally for one establishment."""
+    candidates = [
+        next_slot
+        for next_slot in next_slots
+        if next_slot.date is not None
+        and (establishment_id is None or next_slot.establishment_id == establishment_id)
+    ]
+    if not candidates:
+        return None
+    next_slot = min(candidates, key=lambda item: (item.date, item.start_time))
+    return {
+        "establishment": next_slot.establishment_id,
+        "date": next_slot.date.isoformat(),
+        "start_time": format_minutes(
+            next_slot.start_time.hour * 60 + next_slot.start_time.minute
+        ),
+    }
@@ -0,0 +1,36 @@
+from django.db import transaction
+from huey import crontab
+from huey.contrib.djhuey import db_periodic_task, db_task
+
+from core.queues import DEFAULT_LANE, SLOW_LANE
+from .models import Doctor
+from .slots import doctors_with_stale_next_slots, refresh_next_available_slots
+
+# Doctors refreshed by one task of the periodic refresh
+NEXT_AVAILABLE_SLOT_BATCH = 100
+
+
+@db_task(priority=DEFAULT_LANE)
+def refresh_next_available_slots_task(doctor_id):
+    doctor = Doctor.objects.filter(pk=doctor_id).first()
+    if doctor:
+        refresh_next_available_slots(doctor)
+
+
+@db_task(priority=SLOW_LANE)
+def refresh_next_available_slots_batch_task(doctor_ids):
+    for doctor in Doctor.objects.filter(pk__in=doctor_ids):
+        refresh_next_available_slots(doctor)
+
+
+@db_periodic_task(crontab(minute="*/15"), priority=SLOW_LANE)
+def refresh_stale_next_available_slots_task():
+    doctor_ids = list(doctors_with_stale_next_slots().values_list("pk", flat=True))
+    for offset in range(0, len(doctor_ids), NEXT_AVAILABLE_SLOT_BATCH):
+        refresh_next_available_slots_batch_task(
+            doctor_ids[offset : offset + NEXT_AVAILABLE_SLOT_BATCH]
+        )
+
+
+def enqueue_next_available_slot_refresh(doctor_id):
+    transaction.on_commit(lambda: refresh_next_available_slots_task(doctor_id))
@@ -0,0 +1,498 @@
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from appointments.models import Appointment
+from core.pagination import StandardResultsSetPagination
+from doctors.models import Doctor, DoctorEstablishment, DoctorNextAvailableSlot
+from doctors.slots import (
+    SlotCalendar,
+    compile_schedule,
+    doctors_with_stale_next_slots,
+    merge_intervals,
+    refresh_next_available_slots,
+    subtract_booked,
+)
+from doctors.tasks import refresh_stale_next_available_slots_task
+from doctors.views import AVAILABILITY_DEFAULT_DAYS, AVAILABILITY_MAX_DAYS
+from establishments.models import Establishment
+from feedbacks.models import DoctorRatingSummary
+from users.models import User
+
+# A Monday
+MONDAY = date(2030, 1, 7)
+MORNING_AND_AFTERNOON = {
+    "Monday": [
+        {"start_time": "09:00", "end_time": "12:30"},
+        {"start_time": "14:00", "end_time": "15:30"},
+    ]
+}
+
+
+def create_scheduled_doctor(phone="9000000097", timings=MORNING_AND_AFTERNOON):
+    """Doctor with 30 minute slots, owner of an establishment open on
+    ``timings``."""
+    user = User.objects.create(phone=phone, is_active=True)
+    doctor = Doctor.objects.create(
+        full_name="Dr. Scheduled",
+        user=user,
+        phone=user.phone,
+        gender="M",
+        time_duration="00:30",
+    )
+    establishment = Establishment.objects.create(
+        name=f"Clinic {phone}",
+        establishment_category=Establishment.EstablishmentCategory.GENERAL,
+    )
+    DoctorEstablishment.objects.create(
+        doctor=doctor, establishment=establishment, is_owner=True, timings=timings
+    )
+    return doctor, establishment
+
+
+def book(doctor, day, start, end=None, status="confirmed"):
+    return Appointment.objects.create(
+        doctor=doctor, date=day, start_time=start, end_time=end, status=status
+    )
+
+
+@contextmanager
+def count_doctor_rows():
+    """Count the Doctor instances built from query results inside the block."""
+    rows = []
+
+    def count(sender, instance, **kwargs):
+        rows.append(instance)
+
+    post_init.connect(count, sender=Doctor)
+    try:
+        yield rows
+    finally:
+        post_init.disconnect(count, sender=Doctor)
+
+
+class DoctorListRowGuardTests(APITestCase):
+    """The doctors endpoints must not load more doctors than one page."""
+
+    page_size = StandardResultsSetPagination.page_size
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sale_user = User.objects.create(
+            phone="9000000001", is_active=True, is_sale=True
+        )
+        users = User.objects.bulk_create(
+            User(phone=f"8{index:09d}", is_active=True) for index in range(50)
+        )
+        cls.doctors = Doctor.objects.bulk_create(
+            Doctor(
+                full_name=f"Dr. Guard Doctor {index}",
+                slug=f"guard-doctor-{index}",
+                user=user,
+                phone=user.phone,
+                gender=Doctor.GenderChoices.FEMALE,
+                fee=100 * (index % 10),
+                is_verified=True,
+                onboarded_by=cls.sale_user if index % 2 else None,
+            )
+            for index, user in enumerate(users)
+        )
+        DoctorRatingSummary.objects.bulk_create(
+            DoctorRatingSummary(
+                doctor=doctor,
+                rating_count=1,
+                rating_sum=index % 5 + 1,
+                average_rating=index % 5 + 1,
+            )
+            for index, doctor in enumerate(cls.doctors)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertLoadsAtMost(self, url, limit, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        with count_doctor_rows() as rows:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(rows), limit, f"{url} loaded {len(rows)} doctors, expected {limit}"
+        )
+        return response
+
+    def test_list_loads_one_page(self):
+        response = self.assertLoadsAtMost("/api/doctors/", self.page_size)
+        self.assertEqual(response.data["count"], len(self.doctors))
+
+    def test_filtered_list_loads_one_page(self):
+        self.assertLoadsAtMost(
+            "/api/doctors/?average_rating=3&ordering=-Experience&gender=F",
+            self.page_size,
+        )
+
+    def test_sale_user_list_loads_one_page(self):
+        response = self.assertLoadsAtMost(
+            "/api/doctors/", self.page_size, user=self.sale_user
+        )
+        self.assertEqual(response.data["count"], len(self.doctors) // 2)
+
+    def test_sale_list_doctor_loads_one_page(self):
+        self.assertLoadsAtMost(
+            "/api/doctors/sale_list_doctor/", self.page_size, user=self.sale_user
+        )
+
+    def test_retrieve_loads_one_doctor(self):
+        response = self.assertLoadsAtMost(f"/api/doctors/{self.doctors[0].slug}/", 1)
+        self.assertEqual(response.data["average_rating"], "1.00")
+
+
+def slot_refreshes(callbacks):
+    return [
+        callback
+        for callback in callbacks
+        if callback.__qualname__.startswith("enqueue_next_available_slot_refresh.")
+    ]
+
+
+class SlotRefreshTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(phone="9000000098", is_active=True)
+        Doctor.objects.create(
+            full_name="Dr. Slots", user=user, phone=user.phone, gender="M"
+        )
+
+    def setUp(self):
+        self.doctor = Doctor.objects.get(phone="9000000098")
+
+    def save(self, **changes):
+        for field, value in changes.items():
+            setattr(self.doctor, field, value)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.save()
+        return slot_refreshes(callbacks)
+
+    def test_profile_edits_do_not_refresh_slots(self):
+        self.assertEqual(self.save(bio="New bio", is_verified=True), [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.doctor.delete()
+        self.assertEqual(slot_refreshes(callbacks), [])
+
+    def test_duration_change_refreshes_slots_once(self):
+        self.assertEqual(len(self.save(time_duration="00:15")), 1)
+        self.assertEqual(self.save(fee=500), [])
+
+
+class SlotEngineTests(SimpleTestCase):
+    def test_overlapping_and_touching_intervals_are_merged(self):
+        self.assertEqual(
+            merge_intervals([(200, 210), (80, 120), (60, 90), (120, 150), (205, 208)]),
+            [[60, 150], [200, 210]],
+        )
+        self.assertEqual(merge_intervals([]), [])
+
+    def test_booked_intervals_remove_overlapping_slots(self):
+        slots = [540, 570, 600, 630, 660, 690]
+        # A slot ending where a booking starts, or starting where one ends, is free
+        self.assertEqual(
+            subtract_booked(slots, 30, [[570, 600], [630, 700]]), [540, 600]
+        )
+        # A booking inside a slot takes it
+        self.assertEqual(subtract_booked(slots, 30, [[545, 550]]), slots[1:])
+        self.assertEqual(subtract_booked(slots, 30, []), slots)
+
+    def test_malformed_windows_are_skipped(self):
+        schedule = compile_schedule(
+            {
+                "Monday": [
+                    {"start_time": "9am", "end_time": "10:00"},
+                    {"start_time": "10:00"},
+                    {"end_time": "10:00"},
+                    "10:00-11:00",
+                    {"start_time": "10:00", "end_time": "11:00"},
+                ],
+                "Tuesday": "closed",
+                "Wednesday": None,
+            },
+            "00:30",
+        )
+        self.assertEqual(schedule.slots_on(MONDAY), (600, 630))
+        self.assertEqual(schedule.days[1:], ((),) * 6)
+        self.assertEqual(
+            compile_schedule(["not", "a", "dict"], "00:30").days, ((),) * 7
+        )
+
+    def test_no_slots_without_a_duration(self):
+        for duration in ("00:00", "", None, "half an hour"):
+            with self.subTest(duration=duration):
+                schedule = compile_schedule(MORNING_AND_AFTERNOON, duration)
+                self.assertEqual(schedule.duration, 0)
+                self.assertEqual(schedule.days, ((),) * 7)
+
+    def test_compiled_schedule_follows_timings_and_duration(self):
+        schedule = compile_schedule(MORNING_AND_AFTERNOON, "00:30")
+        self.assertIs(compile_schedule(dict(MORNING_AND_AFTERNOON), "00:30"), schedule)
+        self.assertEqual(
+            schedule.slots_on(MONDAY),
+            (540, 570, 600, 630, 660, 690, 720, 840, 870, 900),
+        )
+
+        longer = compile_schedule(MORNING_AND_AFTERNOON, "01:00")
+        self.assertEqual(longer.slots_on(MONDAY), (540, 600, 660, 720, 840, 900))
+
+        edited = compile_schedule(
+            {"Monday": [{"start_time": "09:00", "end_time": "10:00"}]}, "00:30"
+        )
+        self.assertEqual(edited.slots_on(MONDAY), (540, 570))
+
+
+class TimeSlotsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.establishment = create_scheduled_doctor()
+        book(cls.doctor, MONDAY, time(10, 0), time(10, 30))
+
+    def time_slots(self):
+        response = self.client.get(
+            f"/api/doctors/{self.doctor.pk}/time_slots/?date={MONDAY}"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_buckets_are_the_same_as_before(self):
+        # What the view returned before the slot calendar
+        self.assertEqual(
+            self.time_slots(),
+            {
+                "morning": ["9:00", "9:30", "10:30", "11:00", "11:30"],
+                "afternoon": ["12:00", "14:00", "14:30"],
+                "evening": ["15:00"],
+            },
+        )
+
+    def test_buckets_per_establishment(self):
+        establishment = Establishment.objects.create(
+            name="Evening Clinic",
+            establishment_category=Establishment.EstablishmentCategory.GENERAL,
+        )
+        DoctorEstablishment.objects.create(
+            doctor=self.doctor,
+            establishment=establishment,
+            timings={"Monday": [{"start_time": "16:00", "end_time": "17:00"}]},
+        )
+
+        self.assertEqual(
+            self.time_slots(),
+            {
+                str(self.establishment.pk): {
+                    "morning": ["9:00", "9:30", "10:30", "11:00", "11:30"],
+                    "afternoon": ["12:00", "14:00", "14:30"],
+                    "evening": ["15:00"],
+                },
+                str(establishment.pk): {
+                    "morning": [],
+                    "afternoon": [],
+                    "evening": ["16:00", "16:30"],
+                },
+            },
+        )
+
+    def test_appointments_without_end_take_one_slot(self):
+        book(self.doctor, MONDAY, time(11, 0))
+        book(self.doctor, MONDAY, time(9, 0), status="cancelled")
+
+        free = SlotCalendar(self.doctor).free_slots(MONDAY)[MONDAY]
+        self.assertEqual(
+            free[self.establishment.pk], [540, 570, 630, 690, 720, 840, 870, 900]
+        )
+
+
+class AvailabilityTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.establishment = create_scheduled_doctor(
+            timings={
+                **MORNING_AND_AFTERNOON,
+                "Tuesday": [{"start_time": "09:00", "end_time": "10:00"}],
+            }
+        )
+        cls.url = f"/api/doctors/{cls.doctor.pk}/availability/"
+
+    def test_defaults_to_a_week_from_today(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        today = timezone.now().date()
+        self.assertEqual(
+            list(response.json()),
+            [
+                (today + timedelta(days=offset)).isoformat()
+                for offset in range(AVAILABILITY_DEFAULT_DAYS)
+            ],
+        )
+
+    def test_invalid_ranges_are_rejected(self):
+        too_far = MONDAY + timedelta(days=AVAILABILITY_MAX_DAYS)
+        for query in (
+            "from=07-01-2030",
+            "from=2030-01-07&to=tomorrow",
+            "from=2030-02-30",
+            "from=2030-01-07&to=2030-01-06",
+            f"from=2030-01-07&to={too_far}",
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(f"{self.url}?{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+        longest = MONDAY + timedelta(days=AVAILABILITY_MAX_DAYS - 1)
+        response = self.client.get(f"{self.url}?from={MONDAY}&to={longest}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), AVAILABILITY_MAX_DAYS)
+
+    def test_booked_slots_are_removed_per_day(self):
+        tuesday = MONDAY + timedelta(days=1)
+        next_monday = MONDAY + timedelta(days=7)
+        book(self.doctor, MONDAY, time(9, 0), time(10, 0))
+        book(self.doctor, tuesday, time(9, 30), time(10, 0))
+
+        response = self.client.get(f"{self.url}?from={MONDAY}&to={next_monday}")
+
+        self.assertEqual(response.status_code, 200)
+        days = response.json()
+        self.assertEqual(len(days), 8)
+        self.assertEqual(
+            days[MONDAY.isoformat()]["morning"],
+            ["10:00", "10:30", "11:00", "11:30"],
+        )
+        self.assertEqual(days[tuesday.isoformat()]["morning"], ["9:00"])
+        self.assertEqual(
+            days[next_monday.isoformat()]["morning"],
+            ["9:00", "9:30", "10:00", "10:30", "11:00", "11:30"],
+        )
+        # Closed on the other days
+        self.assertEqual(
+            days[(MONDAY + timedelta(days=2)).isoformat()],
+            {"morning": [], "afternoon": [], "evening": []},
+        )
+
+    def test_queries_do_not_grow_with_the_range(self):
+        book(self.doctor, MONDAY, time(9, 0), time(10, 0))
+
+        def count_queries(days):
+            end = MONDAY + timedelta(days=days - 1)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"{self.url}?from={MONDAY}&to={end}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), days)
+            return len(queries)
+
+        self.assertEqual(count_queries(1), count_queries(AVAILABILITY_MAX_DAYS))
+
+
+def at(moment):
+    """Freeze the clock at the local ``moment``."""
+    return mock.patch(
+        "django.utils.timezone.now", return_value=timezone.make_aware(moment)
+    )
+
+
+class NextAvailableSlotTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.establishment = create_scheduled_doctor()
+
+    def next_slots(self, doctor=None):
+        return {
+            next_slot.establishment_id: (next_slot.date, next_slot.start_time)
+            for next_slot in DoctorNextAvailableSlot.objects.filter(
+                doctor=doctor or self.doctor
+            )
+        }
+
+    def test_past_and_booked_slots_are_skipped(self):
+        book(self.doctor, MONDAY, time(10, 30), time(11, 0))
+
+        with at(datetime(2030, 1, 7, 10, 10)):
+            refresh_next_available_slots(self.doctor)
+        self.assertEqual(self.next_slots(), {self.establishment.pk: (MONDAY, time(11))})
+
+        # Nothing left today, the next one is on the following Monday
+        with at(datetime(2030, 1, 7, 15, 0)):
+            refresh_next_available_slots(self.doctor)
+        self.assertEqual(
+            self.next_slots(),
+            {self.establishment.pk: (MONDAY + timedelta(days=7), time(9))},
+        )
+
+    def test_rows_of_dropped_establishments_are_removed(self):
+        establishment = Establishment.objects.create(
+            name="Evening Clinic",
+            establishment_category=Establishment.EstablishmentCategory.GENERAL,
+        )
+        doctor_establishment = DoctorEstablishment.objects.create(
+            doctor=self.doctor, establishment=establishment, timings={}
+        )
+        with at(datetime(2030, 1, 7, 8, 0)):
+            refresh_next_available_slots(self.doctor)
+        self.assertEqual(
+            self.next_slots(),
+            {
+                self.establishment.pk: (MONDAY, time(9)),
+                establishment.pk: (None, None),
+            },
+        )
+
+        doctor_establishment.delete()
+        with at(datetime(2030, 1, 7, 8, 0)):
+            refresh_next_available_slots(self.doctor)
+        self.assertEqual(self.next_slots(), {self.establishment.pk: (MONDAY, time(9))})
+
+    def test_periodic_refresh_batches_only_stale_doctors(self):
+        never_refreshed, _ = create_scheduled_doctor("9000000096")
+        in_the_past, _ = create_scheduled_doctor("9000000095")
+        closed, _ = create_scheduled_doctor("9000000094", timings={})
+        # Never refreshed either, but has nowhere to be booked
+        user = User.objects.create(phone="9000000093", is_active=True)
+        Doctor.objects.create(
+            full_name="Dr. Nowhere", user=user, phone=user.phone, gender="M"
+        )
+        with at(datetime(2030, 1, 7, 9, 0)):
+            for doctor in (self.doctor, in_the_past, closed):
+                refresh_next_available_slots(doctor)
+        DoctorNextAvailableSlot.objects.filter(doctor=in_the_past).update(
+            date=MONDAY - timedelta(days=1)
+        )
+
+        with at(datetime(2030, 1, 7, 9, 10)):
+            self.assertCountEqual(
+                doctors_with_stale_next_slots(), [never_refreshed, in_the_past]
+            )
+        # The 9:30 slot has passed and the horizon of closed doctors moved on
+        with at(datetime(2030, 1, 8, 0, 5)):
+            self.assertCountEqual(
+                doctors_with_stale_next_slots(),
+                [self.doctor, never_refreshed, in_the_past, closed],
+            )
+
+        with at(datetime(2030, 1, 7, 9, 10)), mock.patch(
+            "doctors.tasks.NEXT_AVAILABLE_SLOT_BATCH", 1
+        ), mock.patch(
+            "doctors.tasks.refresh_next_available_slots_batch_task"
+        ) as batch_task:
+            refresh_stale_next_available_slots_task.call_local()
+        self.assertCountEqual(
+            [call.args for call in batch_task.call_args_list],
+            [([never_refreshed.pk],), ([in_the_past.pk],)],
+        )
@@ -7,21 +7,24 @@ from rest_framework.decorators import action
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg
+from django.db.models import FloatField, Value
+from django.db.models.functions import Coalesce, Round
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import ValidationError
 
-from appointments.models import Appointment
-
 # from .filters import DoctorFilter
 from doctors.filters import DoctorFilter
 from .models import Doctor, DoctorEstablishment
+from .slots import SlotCalendar
 from .serializers import (
     DoctorSerializer,
     DoctorUpdateSerializer,
     DoctorCreateSerializer,
 )
 from users.models import User
+from core.cache import cache_response
+from core.conditional import ConditionalRetrieveMixin
+from core.pagination import CursorSelectablePagination
 from .permission import (
     DoctorPermission,
     OnboardEstablishmentPermission,
@@ -29,10 +32,14 @@ from .permission import (
 from establishments.models import Establishment, EstablishmentRequestStaff
 from establishments.serializers import EstablishmentRequestStaffSerializer
 
+AVAILABILITY_DEFAULT_DAYS = 7
+AVAILABILITY_MAX_DAYS = 31
+
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.select_related("user").order_by("-created_at")
     permission_classes = [DoctorPermission]
+    pagination_class = CursorSelectablePagination
     serializer_class = DoctorSerializer
     filter_backends = (
         DjangoFilterBackend,
@@ -44,6 +51,21 @@ class DoctorViewSet(viewsets.ModelViewSet):
         "email",
         "phone",
     )
+    last_modified_lookups = (
+        "updated_at",
+        "address__updated_at",
+        "specializations__updated_at",
+        "doctor_images__updated_at",
+        "rating_summary__updated_at",
+        "associated_doctors__establishment__updated_at",
+        "associated_doctors__establishment__address__updated_at",
+        "associated_doctors__establishment__specializations__updated_at",
+    )
+    etag_lookups = (
+        "associated_doctors__establishment_id",
+        "associated_doctors__is_owner",
+        "associated_doctors__timings",
+    )
 
     def get_object(self):
         queryset = self.filter_queryset(self.get_queryset())
@@ -70,33 +92,34 @@ class DoctorViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         if hasattr(user, "doctor"):
             queryset = queryset.filter(user=user)
-        queryset = queryset.annotate(average_rating=Avg("doctor_feedbacks__rating"))
-        for doctor in queryset:
-            average_rating = doctor.doctor_feedbacks.aggregate(Avg("rating"))[
-                "rating__avg"
-            ]
-            if average_rating is not None:
-                doctor.average_rating = round(average_rating, 1)
-            else:
-                doctor.average_rating = 0
+        queryset = queryset.annotate(
+            average_rating=Coalesce(
+                Round("rating_summary__average_rating", 1),
+                Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        if self.action in ("list", "retrieve"):
+            queryset = DoctorSerializer.setup_eager_loading(queryset)
         return queryset
 
     def get_authenticators(self):
-        if self.action in ("list", "retrieve", "time_slots"):
+        if self.action in ("list", "retrieve", "time_slots", "availability"):
             return []
         return super().get_authenticators()
 
+    @cache_response("doctors")
     def list(self, request, *args, **kwargs):
-        if request.user.is_authenticated:
-            if request.user.is_sale:
-                self.queryset = Doctor.objects.filter(onboarded_by=request.user)
-            else:
-                self.queryset = self.get_queryset()
-        else:
-            self.queryset = self.get_queryset()
+        # get_queryset() builds on self.queryset, so only swap the base here
+        if request.user.is_authenticated and request.user.is_sale:
+            self.queryset = Doctor.objects.filter(onboarded_by=request.user)
 
         return super().list(request, *args, **kwargs)
 
+    @cache_response("doctors")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     
     def create(self, request, *args, **kwargs):
         if not self.request.user.is_superuser and not request.user.is_sale:
@@ -133,216 +156,72 @@ class DoctorViewSet(viewsets.ModelViewSet):
             new_instance.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def format_slot(self, slot):
-        hour = slot // 100
-        minute = slot % 100
-        return f"{hour}:{minute:02d}"
-    
     @action(methods=["GET"], detail=True)
     def time_slots(self, request, pk=None):
-        try:
-            doctor = self.get_object()
-            requested_date_str = request.query_params.get("date", None)
-            if requested_date_str:
+        doctor = self.get_object()
+        requested_date_str = request.query_params.get("date", None)
+        if requested_date_str:
+            try:
                 date = datetime.strptime(requested_date_str, "%Y-%m-%d").date()
-            else:
-                date = timezone.now().date()
-            time_slots = {}
-            doctor_establishments = DoctorEstablishment.objects.filter(doctor=doctor)
-            if doctor_establishments.count() == 1:
-                try:
-                    doctor_establishment = doctor_establishments.first()
-                    if doctor_establishment.is_owner:
-                        establishment_timings = doctor_establishment.timings
-                        if establishment_timings:
-                            day_timings = establishment_timings.get(date.strftime("%A"), "")
-                            if day_timings:
-                                time_slots = self.filter_time_slots(
-                                    day_timings,
-                                    doctor.time_duration,
-                                    "00:00",
-                                    "23:59",
-                                    None,
-                                    doctor,
-                                    date,
-                                )
-
-                        time_slots = [int(slot.replace(":", "")) for slot in time_slots]
-                        morning_slots = [slot for slot in time_slots if 600 <= slot < 1200]
-                        afternoon_slots = [slot for slot in time_slots if 1200 <= slot < 1500]
-                        evening_slots = [slot for slot in time_slots if 1500 <= slot < 2100]
-
-                        time_slots = {
-                            "morning": [self.format_slot(slot) for slot in morning_slots],
-                            "afternoon": [self.format_slot(slot) for slot in afternoon_slots],
-                            "evening": [self.format_slot(slot) for slot in evening_slots],
-                        }
-                    else:
-                        doctor_day_timings = doctor_establishment.timings.get(date.strftime("%A"), "")
-
-                        time_slots = self.filter_time_slots(
-                            doctor_day_timings,
-                            doctor.time_duration,
-                            "00:00",
-                            "23:59",
-                            None,
-                            doctor,
-                            date,
-                        )
-                        time_slots = [int(slot.replace(":", "")) for slot in time_slots]
-
-                        morning_slots = [slot for slot in time_slots if 600 <= slot < 1200]
-                        afternoon_slots = [slot for slot in time_slots if 1200 <= slot < 1500]
-                        evening_slots = [slot for slot in time_slots if 1500 <= slot < 2100]
-
-                        time_slots = {
-                            "morning": [self.format_slot(slot) for slot in morning_slots],
-                            "afternoon": [self.format_slot(slot) for slot in afternoon_slots],
-                            "evening": [self.format_slot(slot) for slot in evening_slots],
-                        }
-
-                except Exception as e:
-                    return Response(
-                        {"error": "An error occurred while processing establishment timings"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    )
-
-                if not time_slots:
-                    time_slots = {
-                        "morning": [],
-                        "afternoon": [],
-                        "evening": [],
-                    }
+            except ValueError as ve:
+                return Response(
+                    {"error": f"Invalid date format: {ve}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            date = timezone.now().date()
 
-                return Response(time_slots, status=status.HTTP_200_OK)
-            else:
-                try:
-                    doctor_establishment_timings = self.get_doctor_establishment_timings(doctor)
-                    for establishment_id, establishment_timings in doctor_establishment_timings.items():
-                        try:
-                            day_timings = establishment_timings.get(date.strftime("%A"), "")
-                            establishment_slots = self.filter_time_slots(
-                                day_timings,
-                                doctor.time_duration,
-                                "00:00",
-                                "23:59",
-                                None,
-                                doctor,
-                                date,
-                            )
-
-                            establishment_slots = [int(slot.replace(":", "")) for slot in establishment_slots]
-                            morning_slots = [slot for slot in establishment_slots if 600 <= slot < 1200]
-                            afternoon_slots = [slot for slot in establishment_slots if 1200 <= slot < 1500]
-                            evening_slots = [slot for slot in establishment_slots if 1500 <= slot < 2100]
-
-                            time_slots[establishment_id] = {
-                                "morning": [self.format_slot(slot) for slot in morning_slots],
-                                "afternoon": [self.format_slot(slot) for slot in afternoon_slots],
-                                "evening": [self.format_slot(slot) for slot in evening_slots],
-                            }
-
-                        except Exception as e:
-                            continue
-
-                    if not time_slots:
-                        time_slots = {
-                            "morning": [],
-                            "afternoon": [],
-                            "evening": [],
-                        }
-
-                    return Response(time_slots, status=status.HTTP_200_OK)
-
-                except Exception as e:
-                    return Response(
-                        {"error": "An error occurred while retrieving doctor establishment timings"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    )
+        calendar = SlotCalendar(doctor)
+        free_slots = calendar.free_slots(date)
+        return Response(
+            calendar.day_buckets(free_slots[date]), status=status.HTTP_200_OK
+        )
 
+    @action(methods=["GET"], detail=True)
+    def availability(self, request, pk=None):
+        doctor = self.get_object()
+        try:
+            start_date = self.parse_date_param(
+                request, "from", timezone.now().date()
+            )
+            default_end_date = start_date + timedelta(
+                days=AVAILABILITY_DEFAULT_DAYS - 1
+            )
+            end_date = self.parse_date_param(request, "to", default_end_date)
         except ValueError as ve:
             return Response(
                 {"error": f"Invalid date format: {ve}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        except Exception as e:
-            return
-                
-    def get_doctor_establishment_timings(self, doctor):
-        doctor_establishments = DoctorEstablishment.objects.filter(doctor=doctor)
-        timings = {}
-        for doctor_establishment in doctor_establishments:
-            establishment = doctor_establishment.establishment
-            establishment_timings = doctor_establishment.timings
-            timings[establishment.id] = establishment_timings
-        return timings
-
-    def filter_time_slots(
-        self,
-        timings_list,
-        time_duration_str,
-        time_range_start,
-        time_range_end,
-        current_time_formatted,
-        doctor,
-        date,
-    ):
-
-
-        time_duration = self.parse_time_duration(time_duration_str)
-
-        time_slots = []
-
-        booked_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            date=date,
-            start_time__gte=time_range_start,
-            end_time__lte=time_range_end,
-        ).values_list("start_time", flat=True)
-
-        booked_time_slots = list(set())
-        for appointment in booked_appointments:
-            start_time = appointment.strftime("%H:%M")
-            booked_time_slots.append(start_time)
-
-        for slot in timings_list:
-            start_time = datetime.strptime(slot.get("start_time", ""), "%H:%M")
-            end_time = datetime.strptime(slot.get("end_time", ""), "%H:%M")
-
-            current_time = max(start_time, datetime.strptime(time_range_start, "%H:%M"))
-            end_time = min(end_time, datetime.strptime(time_range_end, "%H:%M"))
-
-            while current_time < end_time:
-                time_slots.append(current_time.strftime("%H:%M"))
-                current_time += time_duration
-
-
-        if current_time_formatted is not None:
-            time_slots_current_day = []
-            for time in time_slots:
-                if current_time_formatted < time:
-                    if time not in booked_time_slots:
-                        time_slots_current_day.append(time)
-            return time_slots_current_day
-
-        time_slots_ = []
-        for time in time_slots:
-            if time not in booked_time_slots:
-                time_slots_.append(time)
-
-        return time_slots_
-    
+        if end_date < start_date:
+            return Response(
+                {"error": "'to' must not be before 'from'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if (end_date - start_date).days >= AVAILABILITY_MAX_DAYS:
+            return Response(
+                {
+                    "error": f"A maximum of {AVAILABILITY_MAX_DAYS} days can be requested."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    def parse_time_duration(self, time_duration_str):
-        try:
-            if not time_duration_str:
-                return None
+        calendar = SlotCalendar(doctor)
+        free_slots = calendar.free_slots(start_date, end_date)
+        return Response(
+            {
+                date.isoformat(): calendar.day_buckets(establishment_slots)
+                for date, establishment_slots in free_slots.items()
+            },
+            status=status.HTTP_200_OK,
+        )
 
-            hours, minutes = map(int, time_duration_str.split(":"))
-            return timedelta(hours=hours, minutes=minutes)
-        except (ValueError, AttributeError) as e:
-            return timedelta()
+    def parse_date_param(self, request, name, default):
+        value = request.query_params.get(name, None)
+        if not value:
+            return default
+        return datetime.strptime(value, "%Y-%m-%d").date()
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -361,7 +240,7 @@ class DoctorViewSet(viewsets.ModelViewSet):
 
     @action(methods=["GET"], detail=False, url_path="total_count")
     def total_count(self, request):
-        current_date = datetime.now()
+        current_date = timezone.now()
         one_month_ago = current_date - timedelta(days=30)
         total_users_count = self.queryset.count()
         last_month_users_count = self.queryset.filter(
@@ -390,10 +269,24 @@ class DoctorViewSet(viewsets.ModelViewSet):
         total_fields = sum(
             1
             for field in Doctor._meta.fields
-            if field.name not in ["id", "created_at", "updated_at", "deleting_reason"]
+            if field.name
+            not in [
+                "id",
+                "created_at",
+                "updated_at",
+                "deleting_reason",
+                "avatar_renditions",
+            ]
         )
         filled_fields = doctor.count_filled_fields(
-            exclude=["id", "created_at", "updated_at", "deleting_reason", "deleted_at"]
+            exclude=[
+                "id",
+                "created_at",
+                "updated_at",
+                "deleting_reason",
+                "deleted_at",
+                "avatar_renditions",
+            ]
         )
         completion_percentage = min(int((filled_fields / total_fields) * 100), 100)
 
@@ -419,6 +312,7 @@ class DoctorViewSet(viewsets.ModelViewSet):
                         )
                 else:
                     queryset = Doctor.objects.filter(onboarded_by=request.user)
+                queryset = DoctorSerializer.setup_eager_loading(queryset)
 
                 page = self.paginate_queryset(queryset)
                 if page is not None:
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("establishments", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="establishmentstaffinvitation",
+            index=models.Index(fields=["token"], name="staff_invitation_token_idx"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "establishments",
+            "0003_establishmentstaffinvitation_staff_invitation_token_idx",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="establishmentimage",
+            name="image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("establishments", "0004_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="establishment",
+            name="logo_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
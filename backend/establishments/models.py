@@ -46,6 +46,7 @@ class Establishment(BaseModel):
     logo = models.ImageField(
         upload_to="images/establishments/logos", null=True, blank=True
     )
+    logo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     tagline = models.CharField(max_length=255, null=True, blank=True)
     summary = models.TextField(null=True, blank=True)
     website = models.URLField(max_length=255, null=True, blank=True)
@@ -107,6 +108,7 @@ class Establishment(BaseModel):
 
 class EstablishmentImage(BaseModel):
     image = models.ImageField(upload_to="images/establishments")
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     establishment = models.ForeignKey(
         Establishment, on_delete=models.CASCADE, related_name="establishment_images"
     )
@@ -150,6 +152,9 @@ class EstablishmentStaffInvitation(BaseModel):
     class Meta:
         verbose_name_plural = "Establishment Staff Invitation"
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["token"], name="staff_invitation_token_idx"),
+        ]
 
     def __str__(self):
         return f"{self.establishment.name} invited {self.doctor.full_name}"
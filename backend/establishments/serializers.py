@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from django.db.models import Avg, Min, Max
+from django.db.models import Min, Max, Prefetch
 from rest_framework.exceptions import ValidationError
 from rest_flex_fields import FlexFieldsModelSerializer
 from .models import (
@@ -10,8 +10,15 @@ from .models import (
     EstablishmentAddress,
     EstablishmentRequestStaff,
 )
+from core.images import ImageRenditionsField, image_sources
 from doctors.models import Doctor, DoctorEstablishment
+from doctors.slots import next_available_slot_data
+from feedbacks.models import DoctorRatingSummary
 from feedbacks.serializers import FeedbackSerializer
+from feedbacks.utils import (
+    get_doctor_average_rating,
+    get_establishment_average_rating,
+)
 from specializations.models import Specialization
 from specializations.serializers import SpecializationSerializer
 
@@ -32,9 +39,11 @@ class EstablishmentAddressSerializer(serializers.ModelSerializer):
 
 # Establishment Image Seralizer
 class EstablishmentImageSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(uses=("card", "hero"))
+
     class Meta:
         model = EstablishmentImage
-        fields = ["id", "image"]
+        fields = ["id", "image", "image_renditions"]
 
 
 # Establishment Services Seralizer
@@ -71,6 +80,7 @@ class EstablishmentSerializer(FlexFieldsModelSerializer):
         choices=Establishment.EstablishmentCategory.choices
     )
     specializations = SpecializationSerializer(many=True)
+    logo_renditions = ImageRenditionsField(uses=("thumbnail", "card"))
     establishment_images = EstablishmentImageSerializer(many=True, read_only=True)
     establishment_services = EstablishmentServiceSerializer(many=True, read_only=True)
     address = EstablishmentAddressSerializer()
@@ -85,6 +95,7 @@ class EstablishmentSerializer(FlexFieldsModelSerializer):
             "name",
             "slug",
             "logo",
+            "logo_renditions",
             "establishment_category",
             "tagline",
             "summary",
@@ -113,20 +124,7 @@ class EstablishmentSerializer(FlexFieldsModelSerializer):
         ]
 
     def get_average_establishment_rating(self, obj):
-        doctor_establishments = DoctorEstablishment.objects.filter(establishment=obj)
-        total_rating = 0
-        num_doctors = 0
-        for doctor_establishment in doctor_establishments:
-            average_rating = doctor_establishment.doctor.doctor_feedbacks.aggregate(
-                Avg("rating")
-            )["rating__avg"]
-            if average_rating:
-                total_rating += average_rating
-                num_doctors += 1
-        average_rating_for_establishment = (
-            total_rating / num_doctors if num_doctors > 0 else 0
-        )
-        return round(average_rating_for_establishment, 1)
+        return round(get_establishment_average_rating(obj), 1)
 
     def get_fee_range(self, obj):
         fees = DoctorEstablishment.objects.filter(establishment=obj).values_list(
@@ -156,7 +154,7 @@ class EstablishmentSearchSerializer(serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
     doctor_count = serializers.SerializerMethodField()
     specializations = SpecializationSerializer(many=True)
-    
+    logo_renditions = ImageRenditionsField(uses=("card",))
 
     class Meta:
         model = Establishment
@@ -166,6 +164,7 @@ class EstablishmentSearchSerializer(serializers.ModelSerializer):
             "name",
             "slug",
             "logo",
+            "logo_renditions",
             "establishment_category",
             "specializations",
             "tagline",
@@ -182,77 +181,89 @@ class EstablishmentSearchSerializer(serializers.ModelSerializer):
             "doctor_count",
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Everything the serializer reads, so a page of establishments costs a
+        # fixed number of queries
+        return queryset.select_related("address").prefetch_related(
+            "specializations",
+            Prefetch(
+                "associated_establishments",
+                queryset=DoctorEstablishment.objects.select_related(
+                    "doctor__user", "doctor__address", "doctor__rating_summary"
+                ).prefetch_related(
+                    "doctor__specializations", "doctor__next_available_slots"
+                ),
+            ),
+        )
+
     def get_associated_doctors(self, obj):
-        doctor_establishments = DoctorEstablishment.objects.filter(establishment=obj)
         associated_doctors = []
         from doctors.serializers import DoctorAddressSerializer
-        for doctor_establishment in doctor_establishments:
-            average_rating = doctor_establishment.doctor.doctor_feedbacks.aggregate(
-                Avg("rating")
-            )["rating__avg"]
-
+        for doctor_establishment in obj.associated_establishments.all():
+            doctor = doctor_establishment.doctor
             doctor_data = {
-                "id": doctor_establishment.doctor.id,
-                "full_name": doctor_establishment.doctor.full_name,
-                "slug": doctor_establishment.doctor.slug,
-                "bio": doctor_establishment.doctor.bio,
-                "gender": doctor_establishment.doctor.gender,
-                "email": doctor_establishment.doctor.user.email,
-                "phone": doctor_establishment.doctor.phone,
+                "id": doctor.id,
+                "full_name": doctor.full_name,
+                "slug": doctor.slug,
+                "bio": doctor.bio,
+                "gender": doctor.gender,
+                "email": doctor.user.email,
+                "phone": doctor.phone,
                 "avatar": (
-                    self.context["request"].build_absolute_uri(
-                        doctor_establishment.doctor.avatar.url
-                    )
-                    if doctor_establishment.doctor.avatar
+                    self.context["request"].build_absolute_uri(doctor.avatar.url)
+                    if doctor.avatar
                     else None
                 ),
+                "avatar_renditions": image_sources(
+                    doctor.avatar_renditions, ("thumbnail",), self.context["request"]
+                ),
                 "specializations": [
                     specialization.name
-                    for specialization in doctor_establishment.doctor.specializations.all()
+                    for specialization in doctor.specializations.all()
                 ],
-                "address": DoctorAddressSerializer(
-                    doctor_establishment.doctor.address
-                ).data,
-                "experience_years": doctor_establishment.doctor.experience_years,
-                "fee": doctor_establishment.doctor.fee,
-                "is_verified": doctor_establishment.doctor.is_verified,
-                "average_rating": round(average_rating, 1) if average_rating else 0,
+                "address": DoctorAddressSerializer(doctor.address).data,
+                "experience_years": doctor.experience_years,
+                "fee": doctor.fee,
+                "is_verified": doctor.is_verified,
+                "average_rating": get_doctor_average_rating(doctor),
                 "is_owner": doctor_establishment.is_owner,
+                "next_available_slot": next_available_slot_data(
+                    doctor.next_available_slots.all(),
+                    establishment_id=obj.id,
+                ),
             }
             associated_doctors.append(doctor_data)
         return associated_doctors
 
     def get_fee_range(self, obj):
-        fees = DoctorEstablishment.objects.filter(establishment=obj).values_list(
-            "doctor__fee", flat=True
-        )
-        min_fee = fees.aggregate(Min("doctor__fee"))["doctor__fee__min"]
-        max_fee = fees.aggregate(Max("doctor__fee"))["doctor__fee__max"]
+        fees = [
+            doctor_establishment.doctor.fee
+            for doctor_establishment in obj.associated_establishments.all()
+            if doctor_establishment.doctor.fee is not None
+        ]
+        min_fee = min(fees, default=None)
+        max_fee = max(fees, default=None)
         if min_fee == max_fee:
             return f"₹{min_fee}"
         return f"₹{min_fee} - ₹{max_fee}"
 
     def get_average_doctors_rating(self, obj):
-        doctor_establishments = DoctorEstablishment.objects.filter(establishment=obj)
-        total_rating = 0
-        num_doctors = 0
-        for doctor_establishment in doctor_establishments:
-            average_rating = doctor_establishment.doctor.doctor_feedbacks.aggregate(
-                Avg("rating")
-            )["rating__avg"]
-            if average_rating:
-                total_rating += average_rating
-                num_doctors += 1
-        average_rating_for_establishment = (
-            total_rating / num_doctors if num_doctors > 0 else 0
-        )
-        return round(average_rating_for_establishment, 1)
+        ratings = []
+        for doctor_establishment in obj.associated_establishments.all():
+            try:
+                summary = doctor_establishment.doctor.rating_summary
+            except DoctorRatingSummary.DoesNotExist:
+                continue
+            if summary.rating_count > 0:
+                ratings.append(summary.average_rating)
+        return round(sum(ratings) / len(ratings), 1) if ratings else 0
 
     def get_type(self, obj):
         return "establishment"
 
     def get_doctor_count(self, obj):
-        return DoctorEstablishment.objects.filter(establishment=obj).count()
+        return len(obj.associated_establishments.all())
 
 
 class EstablishmentCreateUpdateSerializer(serializers.ModelSerializer):
@@ -1,10 +1,22 @@
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from safedelete.signals import pre_softdelete
 
-from establishments.models import Establishment
+from core.tasks import enqueue_renditions
+from establishments.models import Establishment, EstablishmentImage
 
 
 @receiver(pre_softdelete, sender=Establishment)
 def delete_establishment_address(sender, instance, **kwargs):
     if instance.address:
         instance.address.delete()
+
+
+@receiver(post_save, sender=Establishment)
+def generate_logo_renditions(sender, instance, **kwargs):
+    enqueue_renditions(instance, "logo", "logo_renditions")
+
+
+@receiver(post_save, sender=EstablishmentImage)
+def generate_image_renditions(sender, instance, **kwargs):
+    enqueue_renditions(instance, "image", "image_renditions")
@@ -27,18 +27,23 @@ from .serializers import (
     EstablishmentSerializer,
     EstablishmentStaffInvitationSerializer,
 )
+from core.cache import cache_response
+from core.conditional import ConditionalRetrieveMixin
+from core.tasks import enqueue_emails
+from core.pagination import CursorSelectablePagination
 from .permissions import EstablishmentPermission
 from users.models import User
 from doctors.models import DoctorEstablishment, Doctor
 from doctors.serializers import DoctorSerializer
-from .invite import _send_establishment_staff_invitation
+from .invite import staff_invitation_message
 from specializations.models import Specialization
 
 
-class EstablishmentViewSet(viewsets.ModelViewSet):
+class EstablishmentViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Establishment.objects.order_by("-created_at")
     serializer_class = EstablishmentSerializer
     permission_classes = [EstablishmentPermission]
+    pagination_class = CursorSelectablePagination
     filter_backends = (
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -48,6 +53,20 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
         "email",
         "phone",
     )
+    last_modified_lookups = (
+        "updated_at",
+        "address__updated_at",
+        "specializations__updated_at",
+        "establishment_images__updated_at",
+        "establishment_services__updated_at",
+        "associated_establishments__doctor__updated_at",
+        "associated_establishments__doctor__rating_summary__updated_at",
+        "associated_establishments__doctor__doctor_feedbacks__updated_at",
+    )
+    etag_lookups = (
+        "associated_establishments__doctor_id",
+        "associated_establishments__is_owner",
+    )
 
     def get_object(self):
         queryset = self.filter_queryset(self.get_queryset())
@@ -73,6 +92,7 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
             return EstablishmentCreateUpdateSerializer
         return super().get_serializer_class()
 
+    @cache_response("establishments")
     def list(self, request, *args, **kwargs):
         if request.user.is_authenticated:
             if request.user.is_sale:
@@ -84,6 +104,10 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
 
         return super().list(request, *args, **kwargs)
 
+    @cache_response("establishments")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(methods=["GET"], detail=False)
     def sale_list_establishment(self, request, *args, **kwargs):
         sale_user_id = request.query_params.get("sale_user_id")
@@ -165,6 +189,7 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
             )
 
         # Create invitations for staff doctors
+        invitations = []
         for staff_doctor in staffs:
             token = jwt.encode(
                 {
@@ -177,11 +202,10 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
             EstablishmentStaffInvitation.objects.create(
                 doctor=staff_doctor, establishment=establishment, token=token
             )
-            _send_establishment_staff_invitation(
-                staff_doctor,
-                token,
-                establishment,
+            invitations.append(
+                staff_invitation_message(staff_doctor, token, establishment)
             )
+        enqueue_emails(invitations)
         data = EstablishmentSerializer(
             establishment, context={"request": self.request}
         ).data
@@ -254,6 +278,7 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                     establishment=instance, doctor=owner, is_owner=True
                 )
 
+        invitations = []
         if staffs:
             DoctorEstablishment.objects.filter(
                 establishment=instance, is_owner=False
@@ -273,7 +298,8 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                 EstablishmentStaffInvitation.objects.create(
                     doctor=doctor, establishment=instance, token=token
                 )
-                _send_establishment_staff_invitation(doctor, token, instance)
+                invitations.append(staff_invitation_message(doctor, token, instance))
+        enqueue_emails(invitations)
 
         data = EstablishmentSerializer(instance, context={"request": self.request}).data
         return Response(data)
@@ -304,10 +330,14 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                 .exclude(id=owner_id)
             )
             existing_serializer = DoctorSerializer(
-                existing_doctor_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(existing_doctor_objs),
+                many=True,
+                context={"request": request},
             )
             available_serializer = DoctorSerializer(
-                available_doctor_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(available_doctor_objs),
+                many=True,
+                context={"request": request},
             )
             response_data = {
                 "existing_doctors": existing_serializer.data,
@@ -316,7 +346,9 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
         else:
             all_doctor_objs = Doctor.objects.filter(is_verified=True)
             serializer = DoctorSerializer(
-                all_doctor_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(all_doctor_objs),
+                many=True,
+                context={"request": request},
             )
             response_data = {"all_doctors": serializer.data}
 
@@ -337,10 +369,14 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                 id__in=existing_owners
             )
             existing_serializer = DoctorSerializer(
-                existing_owner_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(existing_owner_objs),
+                many=True,
+                context={"request": request},
             )
             available_serializer = DoctorSerializer(
-                available_doctor_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(available_doctor_objs),
+                many=True,
+                context={"request": request},
             )
             response_data = {
                 "existing_doctors": existing_serializer.data,
@@ -357,10 +393,14 @@ class EstablishmentViewSet(viewsets.ModelViewSet):
                 id__in=existing_owner
             )
             existing_serializer = DoctorSerializer(
-                existing_owner_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(existing_owner_objs),
+                many=True,
+                context={"request": request},
             )
             available_serializer = DoctorSerializer(
-                available_doctor_objs, many=True, context={"request": request}
+                DoctorSerializer.setup_eager_loading(available_doctor_objs),
+                many=True,
+                context={"request": request},
             )
             response_data = {
                 "existing_doctors": existing_serializer.data,
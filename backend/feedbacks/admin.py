@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Feedback
+from .models import Feedback, DoctorRatingSummary
 
-admin.site.register(Feedback)
\ No newline at end of file
+admin.site.register(Feedback)
+admin.site.register(DoctorRatingSummary)
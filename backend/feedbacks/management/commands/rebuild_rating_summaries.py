@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from feedbacks.models import DoctorRatingSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-doctor rating summaries from the feedback table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--doctor",
+            type=int,
+            action="append",
+            dest="doctor_ids",
+            help="Only rebuild the summary of this doctor id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        summaries = DoctorRatingSummary.rebuild(doctor_ids=options["doctor_ids"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(summaries)} doctor rating summaries.")
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doctors", "0003_initial"),
+        ("feedbacks", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorRatingSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rating_count", models.PositiveIntegerField(default=0)),
+                ("rating_sum", models.PositiveIntegerField(default=0)),
+                ("average_rating", models.FloatField(default=0)),
+                ("one_star_count", models.PositiveIntegerField(default=0)),
+                ("two_star_count", models.PositiveIntegerField(default=0)),
+                ("three_star_count", models.PositiveIntegerField(default=0)),
+                ("four_star_count", models.PositiveIntegerField(default=0)),
+                ("five_star_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "doctor",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_summary",
+                        to="doctors.doctor",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Doctor Rating Summaries",
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+STAR_FIELDS = {
+    1: "one_star_count",
+    2: "two_star_count",
+    3: "three_star_count",
+    4: "four_star_count",
+    5: "five_star_count",
+}
+
+
+def populate_rating_summaries(apps, schema_editor):
+    Feedback = apps.get_model("feedbacks", "Feedback")
+    DoctorRatingSummary = apps.get_model("feedbacks", "DoctorRatingSummary")
+
+    rows = (
+        Feedback.objects.filter(deleted_at__isnull=True)
+        .order_by()
+        .values("doctor_id")
+        .annotate(
+            rating_count=Count("id"),
+            rating_sum=Sum("rating"),
+            **{
+                field: Count("id", filter=Q(rating=rating))
+                for rating, field in STAR_FIELDS.items()
+            },
+        )
+    )
+    DoctorRatingSummary.objects.bulk_create(
+        [
+            DoctorRatingSummary(
+                average_rating=row["rating_sum"] / row["rating_count"], **row
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feedbacks", "0003_doctorratingsummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rating_summaries, migrations.RunPython.noop),
+    ]
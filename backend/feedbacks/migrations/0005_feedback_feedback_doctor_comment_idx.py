@@ -0,0 +1,20 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feedbacks", "0004_populate_doctorratingsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="feedback",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=["doctor", "-comment_at"],
+                name="feedback_doctor_comment_idx",
+            ),
+        ),
+    ]
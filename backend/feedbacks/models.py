@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
 from django.utils.translation import gettext_lazy as _
 
 from core.models import BaseModel
@@ -29,6 +31,119 @@ class Feedback(BaseModel):
 
     class Meta:
         ordering = ["-comment_at"]
+        indexes = [
+            models.Index(
+                fields=["doctor", "-comment_at"],
+                name="feedback_doctor_comment_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not {"doctor_id", "rating", "deleted_at"} & instance.get_deferred_fields():
+            instance._rating_state = instance.rating_state()
+        return instance
+
+    def rating_state(self):
+        """(doctor_id, rating) this feedback currently counts towards, if any."""
+        if self.deleted_at:
+            return None
+        return (self.doctor_id, self.rating)
 
     def __str__(self):
         return f"{self.id} - Feedback for {self.doctor.full_name} by {self.patient.full_name}"
+
+
+class DoctorRatingSummary(models.Model):
+    STAR_FIELDS = {
+        Feedback.Rating.ONE: "one_star_count",
+        Feedback.Rating.TWO: "two_star_count",
+        Feedback.Rating.THREE: "three_star_count",
+        Feedback.Rating.FOUR: "four_star_count",
+        Feedback.Rating.FIVE: "five_star_count",
+    }
+
+    doctor = models.OneToOneField(
+        Doctor, on_delete=models.CASCADE, related_name="rating_summary"
+    )
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    one_star_count = models.PositiveIntegerField(default=0)
+    two_star_count = models.PositiveIntegerField(default=0)
+    three_star_count = models.PositiveIntegerField(default=0)
+    four_star_count = models.PositiveIntegerField(default=0)
+    five_star_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Doctor Rating Summaries"
+
+    @property
+    def rounded_average(self):
+        return round(self.average_rating, 1) if self.rating_count else 0
+
+    @property
+    def histogram(self):
+        return {
+            int(rating): getattr(self, field)
+            for rating, field in self.STAR_FIELDS.items()
+        }
+
+    @classmethod
+    def add_rating(cls, doctor_id, rating):
+        cls.objects.get_or_create(doctor_id=doctor_id)
+        cls._apply(doctor_id, rating, 1)
+
+    @classmethod
+    def remove_rating(cls, doctor_id, rating):
+        cls._apply(doctor_id, rating, -1)
+
+    @classmethod
+    def _apply(cls, doctor_id, rating, delta):
+        star_field = cls.STAR_FIELDS[rating]
+        new_count = F("rating_count") + delta
+        new_sum = F("rating_sum") + rating * delta
+        cls.objects.filter(doctor_id=doctor_id).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            average_rating=Case(
+                When(rating_count=-delta, then=Value(0.0)),
+                default=Cast(new_sum, FloatField()) / Cast(new_count, FloatField()),
+                output_field=FloatField(),
+            ),
+            **{star_field: F(star_field) + delta},
+        )
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, doctor_ids=None):
+        feedbacks = Feedback.objects.all()
+        summaries = cls.objects.all()
+        if doctor_ids is not None:
+            feedbacks = feedbacks.filter(doctor_id__in=doctor_ids)
+            summaries = summaries.filter(doctor_id__in=doctor_ids)
+
+        star_counts = {
+            field: Count("id", filter=Q(rating=rating))
+            for rating, field in cls.STAR_FIELDS.items()
+        }
+        rows = (
+            feedbacks.order_by()
+            .values("doctor_id")
+            .annotate(rating_count=Count("id"), rating_sum=Sum("rating"), **star_counts)
+        )
+
+        summaries.delete()
+        return cls.objects.bulk_create(
+            [
+                cls(average_rating=row["rating_sum"] / row["rating_count"], **row)
+                for row in rows
+            ],
+            batch_size=500,
+        )
+
+    def __str__(self):
+        return f"{self.doctor} - {self.rounded_average} ({self.rating_count})"
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DoctorRatingSummary, Feedback
+
+
+@receiver(post_save, sender=Feedback)
+def update_rating_summary(sender, instance, created, **kwargs):
+    current = instance.rating_state()
+    if created:
+        previous = None
+    elif hasattr(instance, "_rating_state"):
+        previous = instance._rating_state
+    else:
+        # Instance was not loaded from the database, so its previous
+        # contribution is unknown; recompute the doctor from scratch.
+        DoctorRatingSummary.rebuild(doctor_ids=[instance.doctor_id])
+        instance._rating_state = current
+        return
+
+    if previous != current:
+        if previous:
+            DoctorRatingSummary.remove_rating(*previous)
+        if current:
+            DoctorRatingSummary.add_rating(*current)
+    instance._rating_state = current
+
+
+@receiver(post_delete, sender=Feedback)
+def remove_deleted_rating(sender, instance, **kwargs):
+    previous = getattr(instance, "_rating_state", instance.rating_state())
+    if previous:
+        DoctorRatingSummary.remove_rating(*previous)
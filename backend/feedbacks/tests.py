@@ -0,0 +1,139 @@
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+from safedelete import HARD_DELETE
+
+from doctors.models import Doctor
+from patients.models import Patient
+from users.models import User
+from .models import DoctorRatingSummary, Feedback
+
+
+def create_doctor(phone):
+    user = User.objects.create(phone=phone, is_active=True)
+    return Doctor.objects.create(
+        full_name="Dr. Rated", user=user, phone=user.phone, gender="M"
+    )
+
+
+class RatingSummaryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor("9000000001")
+        cls.other_doctor = create_doctor("9000000002")
+        user = User.objects.create(phone="8000000001", is_active=True)
+        cls.patient = Patient.objects.create(
+            full_name="Rating Patient", user=user, phone=user.phone, gender="M", age=30
+        )
+
+    def feedback(self, rating, doctor=None):
+        return Feedback.objects.create(
+            doctor=doctor or self.doctor,
+            patient=self.patient,
+            rating=rating,
+            comment="Feedback",
+        )
+
+    def assertSummary(self, doctor, histogram):
+        """The doctor's summary matches ``histogram`` and a fresh aggregate."""
+        ratings = Counter(
+            Feedback.objects.filter(doctor=doctor).values_list("rating", flat=True)
+        )
+        self.assertEqual(ratings, Counter({k: v for k, v in histogram.items() if v}))
+
+        summary = DoctorRatingSummary.objects.filter(doctor=doctor).first()
+        count = sum(histogram.values())
+        if summary is None:
+            self.assertEqual(count, 0)
+            return
+        total = sum(rating * number for rating, number in histogram.items())
+        self.assertEqual(summary.rating_count, count)
+        self.assertEqual(summary.rating_sum, total)
+        self.assertAlmostEqual(summary.average_rating, total / count if count else 0)
+        self.assertEqual(
+            summary.histogram,
+            {rating: histogram.get(rating, 0) for rating in range(1, 6)},
+        )
+
+    def test_create_and_rating_change(self):
+        self.feedback(5)
+        feedback = self.feedback(3)
+        self.assertSummary(self.doctor, {5: 1, 3: 1})
+
+        feedback.rating = 1
+        feedback.save()
+        self.assertSummary(self.doctor, {5: 1, 1: 1})
+
+        # Saving a loaded feedback unchanged does not count it again
+        Feedback.objects.get(pk=feedback.pk).save()
+        self.assertSummary(self.doctor, {5: 1, 1: 1})
+
+    def test_moving_a_feedback_to_another_doctor(self):
+        self.feedback(4)
+        feedback = self.feedback(2)
+
+        feedback = Feedback.objects.get(pk=feedback.pk)
+        feedback.doctor = self.other_doctor
+        feedback.save()
+
+        self.assertSummary(self.doctor, {4: 1})
+        self.assertSummary(self.other_doctor, {2: 1})
+
+    def test_soft_and_hard_delete(self):
+        self.feedback(5)
+        soft = self.feedback(4)
+        hard = self.feedback(1)
+
+        soft.delete()
+        self.assertSummary(self.doctor, {5: 1, 1: 1})
+
+        Feedback.objects.get(pk=hard.pk).delete(force_policy=HARD_DELETE)
+        self.assertSummary(self.doctor, {5: 1})
+
+        # The last rating gone, the average is back to 0
+        Feedback.objects.get(doctor=self.doctor).delete()
+        summary = DoctorRatingSummary.objects.get(doctor=self.doctor)
+        self.assertEqual((summary.rating_count, summary.average_rating), (0, 0))
+
+    def test_unloaded_instance_rebuilds_the_summary(self):
+        feedback = self.feedback(2)
+        self.feedback(4)
+
+        # Built by hand, so its previous rating is unknown
+        Feedback(
+            pk=feedback.pk,
+            doctor=self.doctor,
+            patient=self.patient,
+            rating=5,
+            comment="Edited",
+            comment_at=feedback.comment_at,
+            created_at=feedback.created_at,
+        ).save()
+
+        self.assertSummary(self.doctor, {5: 1, 4: 1})
+
+    def test_rebuild_command_matches_a_fresh_aggregate(self):
+        for rating in (5, 5, 4, 1):
+            self.feedback(rating)
+        self.feedback(3, doctor=self.other_doctor)
+        self.feedback(2).delete()
+        # Summaries drifted, e.g. after a bulk update bypassing signals
+        DoctorRatingSummary.objects.update(rating_count=99, five_star_count=0)
+
+        stdout = StringIO()
+        call_command("rebuild_rating_summaries", stdout=stdout)
+
+        self.assertIn("Rebuilt 2 doctor rating summaries", stdout.getvalue())
+        self.assertSummary(self.doctor, {5: 2, 4: 1, 1: 1})
+        self.assertSummary(self.other_doctor, {3: 1})
+
+        DoctorRatingSummary.objects.update(rating_count=99)
+        call_command(
+            "rebuild_rating_summaries", "--doctor", str(self.doctor.pk), stdout=stdout
+        )
+        self.assertSummary(self.doctor, {5: 2, 4: 1, 1: 1})
+        self.assertEqual(
+            DoctorRatingSummary.objects.get(doctor=self.other_doctor).rating_count, 99
+        )
@@ -0,0 +1,21 @@
+from django.db.models import Avg
+
+from .models import DoctorRatingSummary
+
+
+def get_doctor_average_rating(doctor):
+    """Rounded average rating of a doctor, read from its rating summary."""
+    try:
+        summary = doctor.rating_summary
+    except DoctorRatingSummary.DoesNotExist:
+        return 0
+    return summary.rounded_average
+
+
+def get_establishment_average_rating(establishment):
+    """Average of the rated doctors' averages within an establishment."""
+    average_rating = DoctorRatingSummary.objects.filter(
+        doctor__associated_doctors__establishment=establishment,
+        rating_count__gt=0,
+    ).aggregate(Avg("average_rating"))["average_rating__avg"]
+    return average_rating or 0
@@ -8,7 +8,8 @@ from django.utils import timezone
 from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Feedback
+from core.pagination import CursorSelectablePagination
+from .models import Feedback, DoctorRatingSummary
 from .serializers import FeedbackSerializer
 from .permissions import CanAddFeedbackOnlyWithAppointment
 
@@ -17,6 +18,7 @@ class FeedbackViewSet(viewsets.ModelViewSet):
     queryset = Feedback.objects.select_related("doctor", "patient").all()
     serializer_class = FeedbackSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorSelectablePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('doctor', 'patient',)
 
@@ -62,14 +64,15 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         doctor_ratings = Feedback.objects.filter(doctor=pk).values_list(
             "rating", flat=True
         )
-        average_rating = Feedback.objects.filter(doctor=pk).aggregate(
-            avg_rating=Avg("rating")
-        )["avg_rating"]
+        summary = DoctorRatingSummary.objects.filter(
+            doctor=pk, rating_count__gt=0
+        ).first()
 
         return Response(
             {
                 "doctor_id": pk,
                 "ratings": list(doctor_ratings),
-                "average_rating": average_rating,
+                "average_rating": summary.average_rating if summary else None,
+                "histogram": summary.histogram if summary else {},
             }
         )
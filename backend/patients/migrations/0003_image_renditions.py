@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("patients", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="avatar_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -58,6 +58,8 @@ class Patient(BaseModel):
     full_name = models.CharField(max_length=255)
     slug = models.CharField(max_length=255, unique=True, null=True, blank=True)
     avatar = models.ImageField(upload_to="images/avatar", null=True, blank=True)
+    # Written by core.images, not part of the profile
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     email = models.EmailField(null=True, blank=True)
     phone = models.CharField(max_length=10, validators=[phone_validator])
     gender = models.CharField(choices=GenderChoices.choices, max_length=50)
@@ -2,6 +2,7 @@ from rest_flex_fields import FlexFieldsModelSerializer
 from rest_framework import serializers
 from users.serializers import UserSerializer
 from users.models import User
+from core.images import ImageRenditionsField
 from .models import Patient, PatientAddress
 
 
@@ -22,6 +23,7 @@ class PatientAddressSerializer(serializers.ModelSerializer):
 
 class PatientSerializer(FlexFieldsModelSerializer):
     age = serializers.IntegerField(read_only=True)
+    avatar_renditions = ImageRenditionsField(uses=("thumbnail",))
 
     class Meta:
         model = Patient
@@ -32,6 +34,7 @@ class PatientSerializer(FlexFieldsModelSerializer):
             "slug",
             "phone",
             "avatar",
+            "avatar_renditions",
             "email",
             "gender",
             "secondary_phone",
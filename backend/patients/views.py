@@ -3,7 +3,8 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from django.db import transaction
 from django.shortcuts import get_object_or_404
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.utils import timezone
 
 from .models import Patient
 from .serializers import (
@@ -93,7 +94,7 @@ class PatientViewSet(viewsets.ModelViewSet):
 
     @action(methods=["GET"], detail=False, url_path="total_count")
     def total_count(self, request):
-        current_date = datetime.now()
+        current_date = timezone.now()
         one_month_ago = current_date - timedelta(days=30)
         total_patients_count = self.queryset.count()
         last_month_patients_count = self.queryset.filter(
@@ -122,9 +123,18 @@ class PatientViewSet(viewsets.ModelViewSet):
         total_fields = sum(
             1
             for field in Patient._meta.fields
-            if field.name not in ["id", "created_at", "updated_at", "deleting_reason"]
+            if field.name
+            not in [
+                "id",
+                "created_at",
+                "updated_at",
+                "deleting_reason",
+                "avatar_renditions",
+            ]
+        )
+        filled_fields = patient.count_filled_fields(
+            exclude=["deleting_reason", "avatar_renditions"]
         )
-        filled_fields = patient.count_filled_fields(exclude=["deleting_reason"])
         completion_percentage = min(int((filled_fields / total_fields) * 100), 100)
 
         return Response(
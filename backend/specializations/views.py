@@ -1,6 +1,7 @@
 from rest_framework import viewsets, filters
 from django.shortcuts import get_object_or_404
 
+from core.cache import cache_response
 from .models import Specialization
 from .serializers import SpecializationSerializer
 
@@ -20,4 +21,12 @@ class SpecializationViewSet(viewsets.ModelViewSet):
             self.check_object_permissions(self.request, obj)
             return obj
 
-        return super().get_object()
\ No newline at end of file
+        return super().get_object()
+
+    @cache_response("specializations")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response("specializations")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
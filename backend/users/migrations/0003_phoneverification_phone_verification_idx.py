@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0002_delete_emailverification"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="phoneverification",
+            index=models.Index(
+                fields=["phone", "-created_at"], name="phone_verification_idx"
+            ),
+        ),
+    ]
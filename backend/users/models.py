@@ -115,5 +115,12 @@ class PhoneVerification(models.Model):
     verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["phone", "-created_at"], name="phone_verification_idx"
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.phone} - {self.verified}"
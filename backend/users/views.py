@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from django.utils import timezone
 from datetime import timedelta
 from django.utils import timezone
+from django.conf import settings
+from django.core.mail import EmailMessage
 from django.db import transaction
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import ValidationError
@@ -27,7 +29,8 @@ from doctors.models import Doctor
 
 from patients.models import Patient
 from core.utils import generate_verification_code
-from core.tasks import send_email_task
+from core.queues import FAST_LANE
+from core.tasks import enqueue_emails
 from .permissions import UserPermissions
 
 
@@ -193,7 +196,10 @@ class UserViewSet(viewsets.ModelViewSet):
         subject = "Password Reset Request"
         body = f"Your OTP for password reset is {otp}."
 
-        send_email_task(subject, body, [user.email])
+        enqueue_emails(
+            [EmailMessage(subject, body, settings.EMAIL_DEFAULT_FROM, [user.email])],
+            priority=FAST_LANE,
+        )
         EmailVerification.objects.create(email=email, code=otp)
         return Response({"message": "OTP sent to your email."})
 